@@ -35,3 +35,7 @@ if __name__ == "__main__":
         ContextMenu()
     except Exception as error:
         log.exception(error)
+    finally:
+        # The script exits right after, send the queued hits now
+        if 'ga_client' in sys.modules:
+            sys.modules['ga_client'].Telemetry.stop()
@@ -2,6 +2,7 @@
 
 #################################################################################################
 
+import importlib
 import logging
 import os
 import sys
@@ -19,11 +20,8 @@ sys.path.append(_BASE_LIB)
 
 #################################################################################################
 
-import entrypoint
 import loghandler
 from utils import window, dialog, language as lang
-from ga_client import GoogleAnalytics
-import database
 
 #################################################################################################
 
@@ -52,12 +50,14 @@ class Main(object):
 
         if "/extrafanart" in base_url:
 
+            import entrypoint
             emby_path = path[1:]
             emby_id = params.get('id', [""])[0]
             entrypoint.getExtraFanArt(emby_id, emby_path)
 
         elif "/Extras" in base_url or "/VideoFiles" in base_url:
 
+            import entrypoint
             emby_path = path[1:]
             emby_id = params.get('id', [""])[0]
             entrypoint.getVideoFiles(emby_id, emby_path)
@@ -74,35 +74,38 @@ class Main(object):
                 import artwork
                 artwork.Artwork().texture_cache_sync()
             else:
+                import entrypoint
                 entrypoint.doMainListing()
 
     @classmethod
     def _modes(cls, mode, params):
-        import utils
+        # Modules are only imported for the mode requested
         modes = {
 
-            'reset': database.db_reset,
-            'resetauth': entrypoint.resetAuth,
-            'play': entrypoint.doPlayback,
-            'passwords': utils.passwordsXML,
-            'adduser': entrypoint.addUser,
-            'thememedia': entrypoint.getThemeMedia,
-            'channels': entrypoint.BrowseChannels,
-            'channelsfolder': entrypoint.BrowseChannels,
-            'browsecontent': entrypoint.BrowseContent,
-            'getsubfolders': entrypoint.GetSubFolders,
-            'nextup': entrypoint.getNextUpEpisodes,
-            'inprogressepisodes': entrypoint.getInProgressEpisodes,
-            'recentepisodes': entrypoint.getRecentEpisodes,
-            'refreshplaylist': entrypoint.refreshPlaylist,
-            'deviceid': entrypoint.resetDeviceId,
-            'delete': entrypoint.deleteItem,
-            'connect': entrypoint.emby_connect,
-            'backup': entrypoint.emby_backup
+            'reset': ("database", "db_reset"),
+            'resetauth': ("entrypoint", "resetAuth"),
+            'play': ("entrypoint", "doPlayback"),
+            'passwords': ("utils", "passwordsXML"),
+            'adduser': ("entrypoint", "addUser"),
+            'thememedia': ("entrypoint", "getThemeMedia"),
+            'channels': ("entrypoint", "BrowseChannels"),
+            'channelsfolder': ("entrypoint", "BrowseChannels"),
+            'browsecontent': ("entrypoint", "BrowseContent"),
+            'getsubfolders': ("entrypoint", "GetSubFolders"),
+            'nextup': ("entrypoint", "getNextUpEpisodes"),
+            'inprogressepisodes': ("entrypoint", "getInProgressEpisodes"),
+            'recentepisodes': ("entrypoint", "getRecentEpisodes"),
+            'refreshplaylist': ("entrypoint", "refreshPlaylist"),
+            'deviceid': ("entrypoint", "resetDeviceId"),
+            'delete': ("entrypoint", "deleteItem"),
+            'connect': ("entrypoint", "emby_connect"),
+            'backup': ("entrypoint", "emby_backup"),
+            'dumplog': ("entrypoint", "dump_log")
         }
         if mode in modes:
             # Simple functions
-            action = modes[mode]
+            module, function = modes[mode]
+            action = getattr(importlib.import_module(module), function)
             item_id = params.get('id')
             if item_id:
                 item_id = item_id[0]
@@ -119,7 +122,8 @@ class Main(object):
                 action(item_id)
 
             elif mode == 'browsecontent':
-                action(item_id, params.get('type', [""])[0], params.get('folderid', [""])[0])
+                action(item_id, params.get('type', [""])[0], params.get('folderid', [""])[0],
+                       int(params.get('startindex', [0])[0]))
 
             elif mode == 'channelsfolder':
                 folderid = params['folderid'][0]
@@ -143,14 +147,20 @@ class Main(object):
 
         elif window('emby_dbScan') != "true":
             import librarysync
+            from utils import cancel_token
             library_sync = librarysync.LibrarySync()
 
-            if mode == 'manualsync':
-                librarysync.ManualSync().sync()
-            elif mode == 'fastsync':
-                library_sync.startSync()
-            else:
-                library_sync.fullSync(repair=True)
+            # Stop when Kodi exits or the service cancels the sync
+            cancel_token.start_watch()
+            try:
+                if mode == 'manualsync':
+                    librarysync.ManualSync().sync()
+                elif mode == 'fastsync':
+                    library_sync.startSync()
+                else:
+                    library_sync.fullSync(repair=True)
+            finally:
+                cancel_token.stop_watch()
         else:
             log.warn("Database scan is already running")
 
@@ -163,10 +173,15 @@ if __name__ == "__main__":
         Main()
     except Exception as error:
         if not (hasattr(error, 'quiet') and error.quiet):
+            from ga_client import GoogleAnalytics
             ga = GoogleAnalytics()
             errStrings = ga.formatException()
             ga.sendEventData("Exception", errStrings[0], errStrings[1])
         log.exception(error)
         raise
+    finally:
+        # The plugin exits right after, send the queued hits now
+        if 'ga_client' in sys.modules:
+            sys.modules['ga_client'].Telemetry.stop()
 
     log.info("plugin.video.emby stopped")
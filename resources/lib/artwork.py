@@ -14,7 +14,7 @@ import requests
 
 import image_cache_thread
 from utils import window, settings, dialog, language as lang, JSONRPC
-from database import DatabaseConn
+from database import DatabaseConn, texture_database
 
 ##################################################################################################
 
@@ -33,6 +33,17 @@ class Artwork(object):
     image_cache_threads = []
     image_cache_limit = 0
 
+    # Max width, max height requested per emby image type for a 1080 lines display
+    art_sizes = {
+
+        'Primary': (1000, 1500),
+        'Backdrop': (1920, 1080),
+        'Thumb': (1280, 720),
+        'Banner': (1000, 185),
+        'Logo': (800, 310),
+        'Art': (1000, 562),
+        'Disc': (1000, 1000)
+    }
 
     def __init__(self):
 
@@ -45,6 +56,41 @@ class Artwork(object):
 
         self.user_id = window('emby_currUser')
         self.server = window('emby_server%s' % self.user_id)
+        self.art_scale = self._get_art_scale()
+
+    @classmethod
+    def _get_art_scale(cls):
+        # artworkSize: Auto|Original|1080p|720p
+        # Returns the factor applied to art_sizes, None to request the original image
+        profile = settings('artworkSize') or "0"
+
+        if profile == "1":
+            return None
+        elif profile == "2":
+            return 1.0
+        elif profile == "3":
+            return 720 / 1080.0
+
+        try:
+            screen_height = int(xbmc.getInfoLabel('System.ScreenHeight'))
+        except ValueError:
+            screen_height = 1080
+
+        if (xbmc.getCondVisibility('System.Platform.Linux.RaspberryPi') or
+                xbmc.getCondVisibility('System.Platform.Android')):
+            # Low power devices, textures are expensive to decode
+            screen_height = min(screen_height, 720)
+
+        log.debug("artwork sized for a screen height of: %s", screen_height)
+        return max(screen_height, 480) / 1080.0
+
+    def _get_art_size(self, image_type):
+
+        if self.art_scale is None or image_type not in self.art_sizes:
+            return 10000, 10000
+
+        max_width, max_height = self.art_sizes[image_type]
+        return int(max_width * self.art_scale), int(max_height * self.art_scale)
 
 
     def _double_urlencode(self, text):
@@ -145,10 +191,10 @@ class Artwork(object):
             log.info("Resetting all cache data first")
             self.delete_cache()
 
-        # Cache all entries in video DB
-        self._cache_all_video_entries(pdialog)
-        # Cache all entries in music DB
-        self._cache_all_music_entries(pdialog)
+        # Only cache what is missing from the texture cache
+        self._cache_missing_entries('video', pdialog)
+        if not pdialog.iscanceled():
+            self._cache_missing_entries('music', pdialog)
 
         pdialog.update(100, "%s %s" % (lang(33046), len(self.image_cache_threads)))
         log.info("Waiting for all threads to exit")
@@ -163,49 +209,46 @@ class Artwork(object):
 
         pdialog.close()
 
-    def _cache_all_video_entries(self, pdialog):
-
-        with DatabaseConn('video') as cursor_video:
-
-            cursor_video.execute("SELECT url FROM art WHERE media_type != 'actor'") # dont include actors
-            result = cursor_video.fetchall()
-            total = len(result)
-            log.info("Image cache sync about to process %s images", total)
-            cursor_video.close()
-
-            count = 0
-            for url in result:
+    @classmethod
+    def _get_missing_textures(cls, media):
+        # Distinct art urls not yet in Textures13, posters and fanart first, actors last
+        query = ' '.join((
 
-                if pdialog.iscanceled():
-                    break
+            "SELECT url",
+            "FROM art",
+            "WHERE url != ''",
+            "AND url NOT IN (SELECT url FROM texture_db.texture)",
+            "GROUP BY url",
+            "ORDER BY MIN(CASE",
+                "WHEN type IN ('poster', 'fanart') THEN 0",
+                "WHEN media_type = 'actor' THEN 2",
+                "ELSE 1 END)"
+        ))
+        with DatabaseConn(media, commit_on_close=False) as cursor:
+            cursor.execute("ATTACH DATABASE ? AS texture_db", (texture_database(),))
+            cursor.execute(query)
+            urls = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DETACH DATABASE texture_db")
 
-                percentage = int((float(count) / float(total))*100)
-                message = "%s of %s (%s)" % (count, total, len(self.image_cache_threads))
-                pdialog.update(percentage, "%s %s" % (lang(33045), message))
-                self.cache_texture(url[0])
-                count += 1
+        return urls
 
-    def _cache_all_music_entries(self, pdialog):
+    def _cache_missing_entries(self, media, pdialog):
 
-        with DatabaseConn('music') as cursor_music:
-        
-            cursor_music.execute("SELECT url FROM art")
-            result = cursor_music.fetchall()
-            total = len(result)
-            
-            log.info("Image cache sync about to process %s images", total)
+        result = self._get_missing_textures(media)
+        total = len(result)
+        log.info("Image cache sync about to process %s %s images", total, media)
 
-            count = 0
-            for url in result:
+        count = 0
+        for url in result:
 
-                if pdialog.iscanceled():
-                    break
+            if pdialog.iscanceled():
+                break
 
-                percentage = int((float(count) / float(total))*100)
-                message = "%s of %s" % (count, total)
-                pdialog.update(percentage, "%s %s" % (lang(33045), message))
-                self.cache_texture(url[0])
-                count += 1
+            percentage = int((float(count) / float(total))*100)
+            message = "%s of %s (%s)" % (count, total, len(self.image_cache_threads))
+            pdialog.update(percentage, "%s %s" % (lang(33045), message))
+            self.cache_texture(url)
+            count += 1
 
     @classmethod
     def delete_cache(cls):
@@ -302,63 +345,107 @@ class Artwork(object):
             'Backdrop': "fanart",
             'BoxRear': "poster"
         }
-        # Artwork is a dictionary
+        # Artwork is a dictionary, flatten it to the kodi types
+        new_art = {}
         for artwork_type in artwork:
 
             if artwork_type == 'Backdrop':
                 # Backdrop entry is a list
                 # Process extra fanart for artwork downloader (fanart, fanart1, fanart2...)
-                backdrops = artwork[artwork_type]
-                backdrops_number = len(backdrops)
-
-                query = ' '.join((
-
-                    "SELECT url",
-                    "FROM art",
-                    "WHERE media_id = ?",
-                    "AND media_type = ?",
-                    "AND type LIKE ?"
-                ))
-                cursor.execute(query, (kodi_id, media_type, "fanart%",))
-                rows = cursor.fetchall()
-
-                if len(rows) > backdrops_number:
-                    # More backdrops in database. Delete extra fanart.
-                    query = ' '.join((
-
-                        "DELETE FROM art",
-                        "WHERE media_id = ?",
-                        "AND media_type = ?",
-                        "AND type LIKE ?"
-                    ))
-                    cursor.execute(query, (kodi_id, media_type, "fanart_",))
-
-                # Process backdrops and extra fanart
-                for index, backdrop in enumerate(backdrops):
-
-                    self.add_update_art(image_url=backdrop,
-                                        kodi_id=kodi_id,
-                                        media_type=media_type,
-                                        image_type=("fanart" if not index else "%s%s"
-                                                    % ("fanart", index)),
-                                        cursor=cursor)
+                for index, backdrop in enumerate(artwork[artwork_type]):
+                    new_art["fanart%s" % index if index else "fanart"] = backdrop
 
             elif artwork_type == 'Primary':
                 # Primary art is processed as thumb and poster for Kodi.
                 for art_type in kodi_artwork[artwork_type]:
-                    self.add_update_art(image_url=artwork[artwork_type],
-                                        kodi_id=kodi_id,
-                                        media_type=media_type,
-                                        image_type=art_type,
-                                        cursor=cursor)
+                    new_art[art_type] = artwork[artwork_type]
 
             elif artwork_type in kodi_artwork:
                 # Process the rest artwork type that Kodi can use
-                self.add_update_art(image_url=artwork[artwork_type],
-                                    kodi_id=kodi_id,
-                                    media_type=media_type,
-                                    image_type=kodi_artwork[artwork_type],
-                                    cursor=cursor)
+                new_art[kodi_artwork[artwork_type]] = artwork[artwork_type]
+
+        query = ' '.join((
+
+            "SELECT type, url",
+            "FROM art",
+            "WHERE media_id = ?",
+            "AND media_type = ?"
+        ))
+        cursor.execute(query, (kodi_id, media_type,))
+        current_art = dict(cursor.fetchall())
+
+        inserts = []
+        updates = []
+        deletes = []
+        cache_images = []
+
+        if 'Backdrop' in artwork:
+            # More backdrops in database. Delete extra fanart.
+            for image_type in current_art:
+                if (image_type.startswith("fanart") and image_type != "fanart" and
+                        image_type not in new_art):
+                    deletes.append((kodi_id, media_type, image_type))
+
+        for image_type, image_url in new_art.items():
+            # Possible that the imageurl is an empty string
+            if not image_url:
+                continue
+
+            url = current_art.get(image_type)
+            if url is None:
+                log.debug("Adding Art Link for kodiId: %s (%s)", kodi_id, image_url)
+                inserts.append((kodi_id, media_type, image_type, image_url))
+
+            elif url != image_url:
+                # Only for the main backdrop, poster
+                if (window('emby_initialScan') != "true" and
+                        image_type in ("fanart", "poster")):
+                    # Delete current entry before updating with the new one
+                    self.delete_cached_artwork(url)
+
+                log.info("Updating Art url for %s kodiId: %s (%s) -> (%s)",
+                         image_type, kodi_id, url, image_url)
+                updates.append((image_url, kodi_id, media_type, image_type))
+            else:
+                continue
+
+            # Cache fanart and poster in Kodi texture cache
+            if image_type in ("fanart", "poster"):
+                cache_images.append(image_url)
+
+        if deletes:
+            query = ' '.join((
+
+                "DELETE FROM art",
+                "WHERE media_id = ?",
+                "AND media_type = ?",
+                "AND type = ?"
+            ))
+            cursor.executemany(query, deletes)
+
+        if inserts:
+            query = (
+                '''
+                INSERT INTO art(media_id, media_type, type, url)
+
+                VALUES (?, ?, ?, ?)
+                '''
+            )
+            cursor.executemany(query, inserts)
+
+        if updates:
+            query = ' '.join((
+
+                "UPDATE art",
+                "SET url = ?",
+                "WHERE media_id = ?",
+                "AND media_type = ?",
+                "AND type = ?"
+            ))
+            cursor.executemany(query, updates)
+
+        for image_url in cache_images:
+            self.cache_texture(image_url)
 
     def add_update_art(self, image_url, kodi_id, media_type, image_type, cursor):
         # Possible that the imageurl is an empty string
@@ -482,14 +569,9 @@ class Artwork(object):
         # Load user information set by UserClient
         return "%s/emby/Users/%s/Images/%s?Format=original" % (self.server, item_id, item_type)
 
-    def get_all_artwork(self, item, parent_info=False):
-
-        item_id = item['Id']
-        artworks = item['ImageTags']
-        backdrops = item.get('BackdropImageTags', [])
+    @classmethod
+    def _get_custom_query(cls):
 
-        max_height = 10000
-        max_width = 10000
         custom_query = ""
 
         if settings('compressArt') == "true":
@@ -498,6 +580,35 @@ class Artwork(object):
         if settings('enableCoverArt') == "false":
             custom_query += "&EnableImageEnhancers=false"
 
+        return custom_query
+
+    def _get_backdrop_urls(self, item_id, tags, custom_query):
+        # (tag, url) of each backdrop, the index in the url follows the tags order
+        max_width, max_height = self._get_art_size('Backdrop')
+        return [(tag, "%s/emby/Items/%s/Images/Backdrop/%s?"
+                      "MaxWidth=%s&MaxHeight=%s&Format=original&Tag=%s%s"
+                      % (self.server, item_id, index, max_width, max_height, tag, custom_query))
+                for index, tag in enumerate(tags)]
+
+    def get_backdrops(self, item, parent_info=False):
+        # (tag, url) pairs taken from the same item, the parent's if the item has none
+        custom_query = self._get_custom_query()
+        backdrops = self._get_backdrop_urls(item['Id'], item.get('BackdropImageTags') or [],
+                                            custom_query)
+        if not backdrops and parent_info and 'ParentBackdropItemId' in item:
+            backdrops = self._get_backdrop_urls(item['ParentBackdropItemId'],
+                                                item.get('ParentBackdropImageTags') or [],
+                                                custom_query)
+        return backdrops
+
+    def get_all_artwork(self, item, parent_info=False):
+
+        item_id = item['Id']
+        artworks = item['ImageTags']
+        backdrops = item.get('BackdropImageTags', [])
+
+        custom_query = self._get_custom_query()
+
         all_artwork = {
 
             'Primary': "",
@@ -511,15 +622,12 @@ class Artwork(object):
 
         def get_backdrops(item_id, backdrops):
 
-            for index, tag in enumerate(backdrops):
-                artwork = ("%s/emby/Items/%s/Images/Backdrop/%s?"
-                           "MaxWidth=%s&MaxHeight=%s&Format=original&Tag=%s%s"
-                           % (self.server, item_id, index, max_width, max_height,
-                              tag, custom_query))
+            for tag, artwork in self._get_backdrop_urls(item_id, backdrops, custom_query):
                 all_artwork['Backdrop'].append(artwork)
 
         def get_artwork(item_id, type_, tag):
 
+            max_width, max_height = self._get_art_size(type_)
             artwork = ("%s/emby/Items/%s/Images/%s/0?"
                        "MaxWidth=%s&MaxHeight=%s&Format=original&Tag=%s%s"
                        % (self.server, item_id, type_, max_width, max_height, tag, custom_query))
@@ -10,7 +10,6 @@ import xbmcaddon
 import api
 import read_embyserver as embyserver
 import embydb_functions as embydb
-import musicutils as musicutils
 from utils import settings, dialog, language as lang
 from dialogs import context
 from database import DatabaseConn
@@ -180,6 +179,7 @@ class ContextMenu(object):
                         new_value = 5
 
                     if settings('enableUpdateSongRating') == "true":
+                        import musicutils # mutagen is only needed here
                         musicutils.updateRatingToFile(new_value, self.api.get_file_path())
 
                     query = "UPDATE song SET rating = ? WHERE idSong = ?"
@@ -12,8 +12,7 @@ import xbmcgui
 import xbmcplugin
 import xbmcvfs
 
-from views import Playlist, VideoNodes
-from utils import window, should_stop, settings, language
+from utils import window, settings, language, cancel_token
 
 #################################################################################################
 
@@ -65,7 +64,7 @@ def kodi_commit():
             log.info("flag still active, but will try to commit")
             window('emby_kodiScan', clear=True)
 
-        elif should_stop() or xbmc.Monitor().waitForAbort(1):
+        elif cancel_token.wait(1):
             log.info("commit unsuccessful. sync terminating")
             return False
 
@@ -152,6 +151,7 @@ def verify_emby_database(cursor):
     cursor.execute("CREATE TABLE IF NOT EXISTS version(idVersion TEXT)")
 
 def db_reset():
+    from views import Playlist, VideoNodes
 
     dialog = xbmcgui.Dialog()
 
@@ -160,7 +160,7 @@ def db_reset():
 
     # first stop any db sync
     window('emby_online', value="reset")
-    window('emby_shouldStop', value="true")
+    cancel_token.cancel()
     count = 10
     while window('emby_dbScan') == "true":
         log.info("Sync is running, will retry: %s..." % count)
@@ -10,6 +10,7 @@ import xbmcgui
 
 import clientinfo
 import connect.connectionmanager as connectionmanager
+from loghandler import Payload
 from utils import window, settings, language as lang
 
 ##################################################################################################
@@ -221,7 +222,7 @@ class DownloadUtils(object):
                 requires_server = True
 
             if requires_server and (not server or not server.get("Server") or not server.get("UserId")):
-                log.info("Aborting download, Server Details Error: %s url=%s" % (server, url))
+                log.info("Aborting download, Server Details Error: %s url=%s", server, url)
                 exc = Exception("Aborting download, Server Details Error: %s url=%s" % (server, url))
                 exc.quiet = True
                 raise exc
@@ -255,7 +256,7 @@ class DownloadUtils(object):
             })
 
             ##### THE RESPONSE #####
-            log.debug(kwargs)
+            log.debug("Request: %s", Payload(kwargs))
             response = self._requests(action_type, session, **kwargs)
             #response = requests.get('http://httpbin.org/status/400')
 
@@ -274,7 +275,7 @@ class DownloadUtils(object):
                 # UNICODE - JSON object
                 json_data = response.json()
                 log.debug("====== 200 Success ======")
-                log.debug("Response: %s", json_data)
+                log.debug("Response: %s", Payload(json_data))
                 return json_data
 
             else: # Bad status code
@@ -2,7 +2,6 @@
 
 #################################################################################################
 
-import json
 import logging
 import os
 import ntpath
@@ -16,20 +15,7 @@ import xbmcgui
 import xbmcvfs
 import xbmcplugin
 
-import artwork
-import utils
-import clientinfo
-import connectmanager
-import database
-import downloadutils
-import librarysync
-import read_embyserver as embyserver
-import embydb_functions as embydb
-import playlist
-import playbackutils as pbutils
-import playutils
-import api
-from views import Playlist, VideoNodes
+import ipc
 from utils import window, settings, dialog, language as lang
 
 #################################################################################################
@@ -40,10 +26,18 @@ log = logging.getLogger("EMBY."+__name__)
 
 
 def doPlayback(itemId, dbId):
-
-    emby = embyserver.Read_EmbyServer()
-    item = emby.getItem(itemId)
-    pbutils.PlaybackUtils(item).play(itemId, dbId)
+    import playback_prep
+    import playbackutils as pbutils
+    import read_embyserver as embyserver
+
+    timer = playback_prep.PlaybackTimer()
+    # The service may have fetched the item already (focused or next in playlist)
+    item = playback_prep.Prefetch.get_item(itemId)
+    if item is None:
+        emby = embyserver.Read_EmbyServer()
+        item = emby.getItem(itemId)
+    timer.stage("item")
+    pbutils.PlaybackUtils(item, timer).play(itemId, dbId)
 
 ##### DO RESET AUTH #####
 def resetAuth():
@@ -123,6 +117,7 @@ def doMainListing():
     xbmcplugin.endOfDirectory(int(sys.argv[1]))
 
 def emby_connect():
+    import connectmanager
 
     # Login user to emby connect
     connect = connectmanager.ConnectManager()
@@ -144,6 +139,8 @@ def emby_connect():
         settings('connectUsername', value=username)
 
 def emby_backup():
+    import database
+
     # Create a backup at specified location
     path = settings('backupPath')
 
@@ -203,8 +200,26 @@ def emby_backup():
            heading="{emby}",
            line1="%s: %s" % (lang(33091), backup))
 
+##### Save the memory log of the service
+def dump_log():
+
+    try:
+        path = ipc.call('dumplog', reason="request")
+    except ipc.IPCError:
+        path = None
+
+    if path:
+        dialog(type_="ok",
+               heading="{emby}",
+               line1="%s: %s" % (lang(33098), path))
+    else:
+        dialog(type_="ok",
+               heading="{emby}",
+               line1=lang(33099))
+
 ##### Generate a new deviceId
 def resetDeviceId():
+    import clientinfo
 
     dialog = xbmcgui.Dialog()
 
@@ -226,6 +241,9 @@ def resetDeviceId():
 
 ##### Delete Item
 def deleteItem():
+    import database
+    import embydb_functions as embydb
+    import read_embyserver as embyserver
 
     # Serves as a keymap action
     if xbmc.getInfoLabel('ListItem.Property(embyid)'): # If we already have the embyid
@@ -270,6 +288,9 @@ def deleteItem():
 
 ##### ADD ADDITIONAL USERS #####
 def addUser():
+    import artwork
+    import clientinfo
+    import downloadutils
 
     if window('emby_online') != "true":
         log.info("server is offline")
@@ -401,8 +422,8 @@ def addUser():
 
 ##### THEME MUSIC/VIDEOS #####
 def getThemeMedia():
+    import theme_media
 
-    doUtils = downloadutils.DownloadUtils()
     dialog = xbmcgui.Dialog()
     playback = None
 
@@ -415,14 +436,10 @@ def getThemeMedia():
     else:
         return
 
-    library = xbmc.translatePath(
-                "special://profile/addon_data/plugin.video.emby/library/").decode('utf-8')
-    # Create library directory
-    if not xbmcvfs.exists(library):
-        xbmcvfs.mkdir(library)
-
     # Set custom path for user
     if xbmc.getCondVisibility('System.HasAddon(script.tvtunes)'):
+        library = xbmc.translatePath(
+                    "special://profile/addon_data/plugin.video.emby/library/").decode('utf-8')
         tvtunes = xbmcaddon.Addon(id="script.tvtunes")
         tvtunes.setSetting('custom_path_enable', "true")
         tvtunes.setSetting('custom_path', library)
@@ -433,113 +450,9 @@ def getThemeMedia():
         dialog.ok(heading=lang(29999), line1=lang(33073))
         xbmc.executebuiltin('Addon.OpenSettings(script.tvtunes)')
         return
-        
-    # Get every user view Id
-    with database.DatabaseConn('emby') as cursor:
-        emby_db = embydb.Embydb_Functions(cursor)
-        viewids = emby_db.getViews()
-
-    # Get Ids with Theme Videos
-    itemIds = {}
-    for view in viewids:
-        url = "{server}/emby/Users/{UserId}/Items?HasThemeVideo=True&ParentId=%s&format=json" % view
-        result = doUtils.downloadUrl(url)
-        if result['TotalRecordCount'] != 0:
-            for item in result['Items']:
-                itemId = item['Id']
-                folderName = item['Name']
-                folderName = utils.normalize_string(folderName.encode('utf-8'))
-                itemIds[itemId] = folderName
-
-    # Get paths for theme videos
-    for itemId in itemIds:
-        nfo_path = xbmc.translatePath(
-            "special://profile/addon_data/plugin.video.emby/library/%s/" % itemIds[itemId])
-        # Create folders for each content
-        if not xbmcvfs.exists(nfo_path):
-            xbmcvfs.mkdir(nfo_path)
-        # Where to put the nfos
-        nfo_path = "%s%s" % (nfo_path, "tvtunes.nfo")
-
-        url = "{server}/emby/Items/%s/ThemeVideos?format=json" % itemId
-        result = doUtils.downloadUrl(url)
 
-        # Create nfo and write themes to it
-        nfo_file = xbmcvfs.File(nfo_path, 'w')
-        pathstowrite = ""
-        # May be more than one theme
-        for theme in result['Items']:
-            putils = playutils.PlayUtils(theme)
-            if playback == "DirectPlay":
-                playurl = putils.directPlay()
-            else:
-                playurl = putils.directStream()
-            pathstowrite += ('<file>%s</file>' % playurl.encode('utf-8'))
-        
-        # Check if the item has theme songs and add them   
-        url = "{server}/emby/Items/%s/ThemeSongs?format=json" % itemId
-        result = doUtils.downloadUrl(url)
-
-        # May be more than one theme
-        for theme in result['Items']: 
-            if playback == "DirectPlay":
-                playurl = api.API(theme).get_file_path()
-            else:
-                playurl = playutils.PlayUtils(theme).directStream()
-            pathstowrite += ('<file>%s</file>' % playurl.encode('utf-8'))
-
-        nfo_file.write(
-            '<tvtunes>%s</tvtunes>' % pathstowrite
-        )
-        # Close nfo file
-        nfo_file.close()
-
-    # Get Ids with Theme songs
-    musicitemIds = {}
-    for view in viewids:
-        url = "{server}/emby/Users/{UserId}/Items?HasThemeSong=True&ParentId=%s&format=json" % view
-        result = doUtils.downloadUrl(url)
-        if result['TotalRecordCount'] != 0:
-            for item in result['Items']:
-                itemId = item['Id']
-                folderName = item['Name']
-                folderName = utils.normalize_string(folderName.encode('utf-8'))
-                musicitemIds[itemId] = folderName
-
-    # Get paths
-    for itemId in musicitemIds:
-        
-        # if the item was already processed with video themes back out
-        if itemId in itemIds:
-            continue
-        
-        nfo_path = xbmc.translatePath(
-            "special://profile/addon_data/plugin.video.emby/library/%s/" % musicitemIds[itemId])
-        # Create folders for each content
-        if not xbmcvfs.exists(nfo_path):
-            xbmcvfs.mkdir(nfo_path)
-        # Where to put the nfos
-        nfo_path = "%s%s" % (nfo_path, "tvtunes.nfo")
-        
-        url = "{server}/emby/Items/%s/ThemeSongs?format=json" % itemId
-        result = doUtils.downloadUrl(url)
-
-        # Create nfo and write themes to it
-        nfo_file = xbmcvfs.File(nfo_path, 'w')
-        pathstowrite = ""
-        # May be more than one theme
-        for theme in result['Items']: 
-            if playback == "DirectPlay":
-                playurl = api.API(theme).get_file_path()
-            else:
-                playurl = playutils.PlayUtils(theme).directStream()
-            pathstowrite += ('<file>%s</file>' % playurl.encode('utf-8'))
-
-        nfo_file.write(
-            '<tvtunes>%s</tvtunes>' % pathstowrite
-        )
-        # Close nfo file
-        nfo_file.close()
+    # Write the tvtunes.nfo files, unchanged ones are skipped
+    theme_media.ThemeMedia(playback).export()
 
     dialog.notification(
             heading=lang(29999),
@@ -550,6 +463,8 @@ def getThemeMedia():
 
 ##### REFRESH EMBY PLAYLISTS #####
 def refreshPlaylist():
+    import librarysync
+    from views import Playlist, VideoNodes
 
     if window('emby_online') != "true":
         log.info("server is offline")
@@ -590,12 +505,26 @@ def GetSubFolders(nodeindex):
             addDirectoryItem(title, path)
     xbmcplugin.endOfDirectory(int(sys.argv[1]))
               
+##### READ EMBY SERVER THROUGH THE SERVICE #####
+def _embyServer(method, *args, **kwargs):
+    import read_embyserver as embyserver
+
+    try: # The service has a warm server session
+        return ipc.call('emby', method=method, args=args, kwargs=kwargs)
+    except ipc.IPCError:
+        return getattr(embyserver.Read_EmbyServer(), method)(*args, **kwargs)
+
 ##### BROWSE EMBY NODES DIRECTLY #####    
-def BrowseContent(viewname, browse_type="", folderid=""):
+def BrowseContent(viewname, browse_type="", folderid="", startindex=0):
+    import artwork
+    import downloadutils
+    import listing_cache
+    import livetv
     
-    emby = embyserver.Read_EmbyServer()
     art = artwork.Artwork()
     doUtils = downloadutils.DownloadUtils()
+    prefetch = None
+    next_page = None
     
     #folderid used as filter ?
     if folderid in ["recent","recentepisodes","inprogress","inprogressepisodes","unwatched","nextepisodes","sets","genres","random","recommended"]:
@@ -607,7 +536,7 @@ def BrowseContent(viewname, browse_type="", folderid=""):
     xbmcplugin.setPluginCategory(int(sys.argv[1]), viewname)
     #get views for root level
     if not folderid:
-        views = emby.getViews(browse_type)
+        views = _embyServer("getViews", browse_type)
         for view in views:
             if view.get("name") == viewname.decode('utf-8'):
                 folderid = view.get("id")
@@ -629,34 +558,50 @@ def BrowseContent(viewname, browse_type="", folderid=""):
         
         #get the actual listing
         if browse_type == "recordings":
-            listing = emby.getTvRecordings(folderid)
+            listing = livetv.LiveTV(_embyServer).get_recordings(folderid)
         elif browse_type == "tvchannels":
-            listing = emby.getTvChannels()
+            listing = livetv.LiveTV(_embyServer).get_channels()
         elif filter_type == "recent":
-            listing = emby.getFilteredSection(folderid, itemtype=itemtype.split(",")[0], sortby="DateCreated", recursive=True, limit=25, sortorder="Descending")
+            listing = _embyServer("getFilteredSection", folderid, itemtype=itemtype.split(",")[0], sortby="DateCreated", recursive=True, limit=25, sortorder="Descending")
         elif filter_type == "random":
-            listing = emby.getFilteredSection(folderid, itemtype=itemtype.split(",")[0], sortby="Random", recursive=True, limit=150, sortorder="Descending")
+            listing = _embyServer("getFilteredSection", folderid, itemtype=itemtype.split(",")[0], sortby="Random", recursive=True, limit=150, sortorder="Descending")
         elif filter_type == "recommended":
-            listing = emby.getFilteredSection(folderid, itemtype=itemtype.split(",")[0], sortby="SortName", recursive=True, limit=25, sortorder="Ascending", filter_type="IsFavorite")
+            listing = _embyServer("getFilteredSection", folderid, itemtype=itemtype.split(",")[0], sortby="SortName", recursive=True, limit=25, sortorder="Ascending", filter_type="IsFavorite")
         elif folderid == "favepisodes":
             xbmcplugin.setContent(int(sys.argv[1]), 'episodes')
-            listing = emby.getFilteredSection(None, itemtype="Episode", sortby="SortName", recursive=True, limit=25, sortorder="Ascending", filter_type="IsFavorite")
+            listing = _embyServer("getFilteredSection", None, itemtype="Episode", sortby="SortName", recursive=True, limit=25, sortorder="Ascending", filter_type="IsFavorite")
         elif filter_type == "sets":
-            listing = emby.getFilteredSection(folderid, itemtype=itemtype.split(",")[1], sortby="SortName", recursive=True, limit=25, sortorder="Ascending", filter_type="IsFavorite")
+            listing = _embyServer("getFilteredSection", folderid, itemtype=itemtype.split(",")[1], sortby="SortName", recursive=True, limit=25, sortorder="Ascending", filter_type="IsFavorite")
         else:
-            listing = emby.getFilteredSection(folderid, itemtype=itemtype, recursive=False)
+            #plain folders are browsed one page at a time, the next page is fetched in the background
+            cache = listing_cache.ListingCache(_embyServer)
+            listing = cache.get(folderid, itemtype, startindex)
+            if listing and startindex + cache.page_size < listing.get("TotalRecordCount", 0):
+                next_page = startindex + cache.page_size
+                prefetch = cache.prefetch(folderid, itemtype, next_page)
         
         #process the listing
         if listing:
+            items = []
             for item in listing.get("Items"):
                 li = createListItemFromEmbyItem(item,art,doUtils)
                 if item.get("IsFolder") == True:
                     #for folders we add an additional browse request, passing the folderId
                     path = "%s?id=%s&mode=browsecontent&type=%s&folderid=%s" % (sys.argv[0].decode('utf-8'), viewname.decode('utf-8'), browse_type.decode('utf-8'), item.get("Id").decode('utf-8'))
-                    xbmcplugin.addDirectoryItem(handle=int(sys.argv[1]), url=path, listitem=li, isFolder=True)
+                    items.append((path, li, True))
                 else:
                     #playable item, set plugin path and mediastreams
-                    xbmcplugin.addDirectoryItem(handle=int(sys.argv[1]), url=li.getProperty("path"), listitem=li)
+                    items.append((li.getProperty("path"), li, False))
+
+            if next_page is not None:
+                label = "%s (%s/%s)" % (lang(33096), next_page / cache.page_size + 1,
+                                        (listing["TotalRecordCount"] - 1) / cache.page_size + 1)
+                li = xbmcgui.ListItem(label)
+                li.setProperty("SpecialSort", "bottom")
+                path = "%s?id=%s&mode=browsecontent&type=%s&folderid=%s&startindex=%s" % (sys.argv[0].decode('utf-8'), viewname.decode('utf-8'), browse_type.decode('utf-8'), folderid.decode('utf-8'), next_page)
+                items.append((path, li, True))
+
+            xbmcplugin.addDirectoryItems(int(sys.argv[1]), items, len(items))
 
 
     if filter_type == "recent":
@@ -669,8 +614,19 @@ def BrowseContent(viewname, browse_type="", folderid=""):
 
     xbmcplugin.endOfDirectory(handle=int(sys.argv[1]))
 
+    if prefetch is not None:
+        prefetch.join()
+
 ##### CREATE LISTITEM FROM EMBY METADATA #####
-def createListItemFromEmbyItem(item,art=artwork.Artwork(),doUtils=downloadutils.DownloadUtils()):
+def createListItemFromEmbyItem(item,art=None,doUtils=None):
+    import api
+    import artwork
+    import downloadutils
+    import playbackutils as pbutils
+
+    art = art or artwork.Artwork()
+    doUtils = doUtils or downloadutils.DownloadUtils()
+
     API = api.API(item)
     itemid = item['Id']
     
@@ -686,16 +642,26 @@ def createListItemFromEmbyItem(item,art=artwork.Artwork(),doUtils=downloadutils.
     li.setProperty("embyid",itemid)
     
     allart = art.get_all_artwork(item)
+
+    if item["Type"] == "TvChannel":
+        #guide data, see livetv
+        for program in ("CurrentProgram", "NextProgram"):
+            if item.get(program):
+                li.setProperty(program, item[program].get("Name"))
     
     if item["Type"] == "Photo":
         #listitem setup for pictures...
         img_path = allart.get('Primary')
         li.setProperty("path",img_path)
-        try:
-            picture = doUtils.downloadUrl("{server}/Items/%s/Images" %itemid)
-        except Exception as error:
-            lof.info("Error getting images from server: " + str(error))
-            picture = None
+        if item.get("Width") and item.get("Height"):
+            #dimensions are already in the listing, saves a request per photo
+            picture = [item]
+        else:
+            try:
+                picture = doUtils.downloadUrl("{server}/Items/%s/Images" %itemid)
+            except Exception as error:
+                lof.info("Error getting images from server: " + str(error))
+                picture = None
 
         if picture is not None:
             picture = picture[0]
@@ -768,6 +734,8 @@ def createListItemFromEmbyItem(item,art=artwork.Artwork(),doUtils=downloadutils.
     
 ##### BROWSE EMBY CHANNELS #####    
 def BrowseChannels(itemid, folderid=None):
+    import artwork
+    import downloadutils
     
     _addon_id   =   int(sys.argv[1])
     _addon_url  =   sys.argv[0]
@@ -887,245 +855,47 @@ def createListItem(item):
 
 ##### GET NEXTUP EPISODES FOR TAGNAME #####    
 def getNextUpEpisodes(tagname, limit):
-    
-    count = 0
+
     # if the addon is called with nextup parameter,
     # we return the nextepisodes list of the given tagname
-    xbmcplugin.setContent(int(sys.argv[1]), 'episodes')
-    # First we get a list of all the TV shows - filtered by tag
-    query = {
-
-        'jsonrpc': "2.0",
-        'id': "libTvShows",
-        'method': "VideoLibrary.GetTVShows",
-        'params': {
-
-            'sort': {'order': "descending", 'method': "lastplayed"},
-            'filter': {
-                'and': [
-                    {'operator': "true", 'field': "inprogress", 'value': ""},
-                    {'operator': "is", 'field': "tag", 'value': "%s" % tagname}
-                ]},
-            'properties': ['title', 'studio', 'mpaa', 'file', 'art']
-        }
-    }
-    result = xbmc.executeJSONRPC(json.dumps(query))
-    result = json.loads(result)
-    # If we found any, find the oldest unwatched show for each one.
-    try:
-        items = result['result']['tvshows']
-    except (KeyError, TypeError):
-        pass
-    else:
-        for item in items:
-            if settings('ignoreSpecialsNextEpisodes') == "true":
-                query = {
-
-                    'jsonrpc': "2.0",
-                    'id': 1,
-                    'method': "VideoLibrary.GetEpisodes",
-                    'params': {
-
-                        'tvshowid': item['tvshowid'],
-                        'sort': {'method': "episode"},
-                        'filter': {
-                            'and': [
-                                {'operator': "lessthan", 'field': "playcount", 'value': "1"},
-                                {'operator': "greaterthan", 'field': "season", 'value': "0"}
-                        ]},
-                        'properties': [
-                            "title", "playcount", "season", "episode", "showtitle",
-                            "plot", "file", "rating", "resume", "tvshowid", "art",
-                            "streamdetails", "firstaired", "runtime", "writer",
-                            "dateadded", "lastplayed"
-                        ],
-                        'limits': {"end": 1}
-                    }
-                }
-            else:
-                query = {
-
-                    'jsonrpc': "2.0",
-                    'id': 1,
-                    'method': "VideoLibrary.GetEpisodes",
-                    'params': {
-
-                        'tvshowid': item['tvshowid'],
-                        'sort': {'method': "episode"},
-                        'filter': {'operator': "lessthan", 'field': "playcount", 'value': "1"},
-                        'properties': [
-                            "title", "playcount", "season", "episode", "showtitle",
-                            "plot", "file", "rating", "resume", "tvshowid", "art",
-                            "streamdetails", "firstaired", "runtime", "writer",
-                            "dateadded", "lastplayed"
-                        ],
-                        'limits': {"end": 1}
-                    }
-                }
-
-            result = xbmc.executeJSONRPC(json.dumps(query))
-            result = json.loads(result)
-            try:
-                episodes = result['result']['episodes']
-            except (KeyError, TypeError):
-                pass
-            else:
-                for episode in episodes:
-                    li = createListItem(episode)
-                    xbmcplugin.addDirectoryItem(
-                                handle=int(sys.argv[1]),
-                                url=episode['file'],
-                                listitem=li)
-                    count += 1
-
-            if count == limit:
-                break
-
-    xbmcplugin.endOfDirectory(handle=int(sys.argv[1]))
+    _addEpisodes('next_up', tagname.decode('utf-8'), limit)
 
 ##### GET INPROGRESS EPISODES FOR TAGNAME #####    
 def getInProgressEpisodes(tagname, limit):
-    
-    count = 0
+
     # if the addon is called with inprogressepisodes parameter,
     # we return the inprogressepisodes list of the given tagname
-    xbmcplugin.setContent(int(sys.argv[1]), 'episodes')
-    # First we get a list of all the in-progress TV shows - filtered by tag
-    query = {
-
-        'jsonrpc': "2.0",
-        'id': "libTvShows",
-        'method': "VideoLibrary.GetTVShows",
-        'params': {
-
-            'sort': {'order': "descending", 'method': "lastplayed"},
-            'filter': {
-                'and': [
-                    {'operator': "true", 'field': "inprogress", 'value': ""},
-                    {'operator': "is", 'field': "tag", 'value': "%s" % tagname}
-                ]},
-            'properties': ['title', 'studio', 'mpaa', 'file', 'art']
-        }
-    }
-    result = xbmc.executeJSONRPC(json.dumps(query))
-    result = json.loads(result)
-    # If we found any, find the oldest unwatched show for each one.
-    try:
-        items = result['result']['tvshows']
-    except (KeyError, TypeError):
-        pass
-    else:
-        for item in items:
-            query = {
-
-                'jsonrpc': "2.0",
-                'id': 1,
-                'method': "VideoLibrary.GetEpisodes",
-                'params': {
-
-                    'tvshowid': item['tvshowid'],
-                    'sort': {'method': "episode"},
-                    'filter': {'operator': "true", 'field': "inprogress", 'value': ""},
-                    'properties': [
-                        "title", "playcount", "season", "episode", "showtitle", "plot",
-                        "file", "rating", "resume", "tvshowid", "art", "cast",
-                        "streamdetails", "firstaired", "runtime", "writer",
-                        "dateadded", "lastplayed"
-                    ]
-                }
-            }
-            result = xbmc.executeJSONRPC(json.dumps(query))
-            result = json.loads(result)
-            try:
-                episodes = result['result']['episodes']
-            except (KeyError, TypeError):
-                pass
-            else:
-                for episode in episodes:
-                    li = createListItem(episode)
-                    xbmcplugin.addDirectoryItem(
-                                handle=int(sys.argv[1]),
-                                url=episode['file'],
-                                listitem=li)
-                    count += 1
-
-            if count == limit:
-                break
-
-    xbmcplugin.endOfDirectory(handle=int(sys.argv[1]))
+    _addEpisodes('in_progress', tagname.decode('utf-8'), limit)
 
 ##### GET RECENT EPISODES FOR TAGNAME #####    
 def getRecentEpisodes(tagname, limit):
-    
-    count = 0
+
     # if the addon is called with recentepisodes parameter,
     # we return the recentepisodes list of the given tagname
-    xbmcplugin.setContent(int(sys.argv[1]), 'episodes')
-    # First we get a list of all the TV shows - filtered by tag
-    query = {
+    _addEpisodes('recent', tagname.decode('utf-8'), limit)
 
-        'jsonrpc': "2.0",
-        'id': "libTvShows",
-        'method': "VideoLibrary.GetTVShows",
-        'params': {
+def _addEpisodes(widget, tagname, limit):
+    import widgets
 
-            'sort': {'order': "descending", 'method': "dateadded"},
-            'filter': {'operator': "is", 'field': "tag", 'value': "%s" % tagname},
-            'properties': ["title","sorttitle"]
-        }
-    }
-    result = xbmc.executeJSONRPC(json.dumps(query))
-    result = json.loads(result)
-    # If we found any, find the oldest unwatched show for each one.
-    try:
-        items = result['result']['tvshows']
-    except (KeyError, TypeError):
-        pass
-    else:
-        allshowsIds = set()
-        for item in items:
-            allshowsIds.add(item['tvshowid'])
-
-        query = {
-
-            'jsonrpc': "2.0",
-            'id': 1,
-            'method': "VideoLibrary.GetEpisodes",
-            'params': {
-
-                'sort': {'order': "descending", 'method': "dateadded"},
-                'filter': {'operator': "lessthan", 'field': "playcount", 'value': "1"},
-                'properties': [
-                    "title", "playcount", "season", "episode", "showtitle", "plot",
-                    "file", "rating", "resume", "tvshowid", "art", "streamdetails",
-                    "firstaired", "runtime", "cast", "writer", "dateadded", "lastplayed"
-                ],
-                "limits": {"end": limit}
-            }
-        }
-        result = xbmc.executeJSONRPC(json.dumps(query))
-        result = json.loads(result)
-        try:
-            episodes = result['result']['episodes']
-        except (KeyError, TypeError):
-            pass
-        else:
-            for episode in episodes:
-                if episode['tvshowid'] in allshowsIds:
-                    li = createListItem(episode)
-                    xbmcplugin.addDirectoryItem(
-                                handle=int(sys.argv[1]),
-                                url=episode['file'],
-                                listitem=li)
-                    count += 1
-
-                if count == limit:
-                    break
+    try: # Ask the service first
+        episodes = ipc.call('widget', widget=widget, tagname=tagname, limit=limit)
+    except ipc.IPCError:
+        episodes = widgets.Widgets().get(widget, tagname, limit)
+
+    xbmcplugin.setContent(int(sys.argv[1]), 'episodes')
+    for episode in episodes:
+        li = createListItem(episode)
+        xbmcplugin.addDirectoryItem(
+                    handle=int(sys.argv[1]),
+                    url=episode['file'],
+                    listitem=li)
 
     xbmcplugin.endOfDirectory(handle=int(sys.argv[1]))
 
 ##### GET VIDEO EXTRAS FOR LISTITEM #####
 def getVideoFiles(embyId,embyPath):
+    import playutils
+    import read_embyserver as embyserver
     #returns the video files for the item as plugin listing, can be used for browsing the actual files or videoextras etc.
     emby = embyserver.Read_EmbyServer()
     if not embyId:
@@ -1152,9 +922,7 @@ def getVideoFiles(embyId,embyPath):
     
 ##### GET EXTRAFANART FOR LISTITEM #####
 def getExtraFanArt(embyId,embyPath):
-    
-    emby = embyserver.Read_EmbyServer()
-    art = artwork.Artwork()
+    import image_cache
     
     # Get extrafanart for listitem 
     # will be called by skinhelper script to get the extrafanart
@@ -1170,41 +938,17 @@ def getExtraFanArt(embyId,embyPath):
 
             # We need to store the images locally for this to work
             # because of the caching system in xbmc
-            fanartDir = xbmc.translatePath("special://thumbnails/emby/%s/" % embyId).decode('utf-8')
-            
-            if not xbmcvfs.exists(fanartDir):
-                # Download the images to the cache directory
-                xbmcvfs.mkdirs(fanartDir)
-                item = emby.getItem(embyId)
-                if item:
-                    backdrops = art.get_all_artwork(item)['Backdrop']
-                    tags = item['BackdropImageTags']
-                    count = 0
-                    for backdrop in backdrops:
-                        # Same ordering as in artwork
-                        tag = tags[count]
-                        if os.path.supports_unicode_filenames:
-                            fanartFile = os.path.join(fanartDir, "fanart%s.jpg" % tag)
-                        else:
-                            fanartFile = os.path.join(fanartDir.encode("utf-8"), "fanart%s.jpg" % tag.encode("utf-8"))
-                        li = xbmcgui.ListItem(tag, path=fanartFile)
-                        xbmcplugin.addDirectoryItem(
-                                            handle=int(sys.argv[1]),
-                                            url=fanartFile,
-                                            listitem=li)
-                        xbmcvfs.copy(backdrop, fanartFile) 
-                        count += 1               
-            else:
-                log.debug("Found cached backdrop.")
-                # Use existing cached images
-                dirs, files = xbmcvfs.listdir(fanartDir)
-                for file in files:
-                    fanartFile = os.path.join(fanartDir, file.decode('utf-8'))
-                    li = xbmcgui.ListItem(file, path=fanartFile)
-                    xbmcplugin.addDirectoryItem(
-                                            handle=int(sys.argv[1]),
-                                            url=fanartFile,
-                                            listitem=li)
+            try:
+                fanartFiles = ipc.call('extrafanart', item_id=embyId)
+            except ipc.IPCError:
+                fanartFiles = image_cache.ImageCache().get_backdrops(embyId)
+
+            for fanartFile in fanartFiles:
+                li = xbmcgui.ListItem(os.path.basename(fanartFile), path=fanartFile)
+                xbmcplugin.addDirectoryItem(
+                                    handle=int(sys.argv[1]),
+                                    url=fanartFile,
+                                    listitem=li)
     except Exception as e:
         log.error("Error getting extrafanart: %s" % e)
     
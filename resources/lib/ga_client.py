@@ -5,8 +5,11 @@ import requests
 import logging
 import clientinfo
 import hashlib
+import threading
+import urllib
 import xbmc
 import time
+import Queue
 from utils import window, settings, language as lang
 
 log = logging.getLogger("EMBY."+__name__)
@@ -34,6 +37,118 @@ def log_error(errors=(Exception, )):
         return wrapper
     return decorator
 
+class Telemetry(threading.Thread):
+    # Sends the GA hits in the background, up to batch_size per request. Hits are dropped
+    # when the queue is full or for offline_time after a failed request, so the sync and
+    # playback threads never wait on the network. One per process, started on first use.
+
+    max_queue = 100
+    batch_size = 20 # GA limit for /batch
+    batch_delay = 2
+    offline_time = 300
+    timeout = (5, 10)
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+
+        self.queue = Queue.Queue(self.max_queue)
+        self.offline_until = 0
+        self.dropped = 0
+
+        threading.Thread.__init__(self)
+        # A plugin invocation does not wait for telemetry, see stop()
+        self.daemon = True
+
+    @classmethod
+    def get(cls):
+
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                cls._instance.start()
+
+            return cls._instance
+
+    @classmethod
+    def stop(cls, timeout=2):
+        # Sends what is queued, waiting at most timeout
+        with cls._lock:
+            instance, cls._instance = cls._instance, None
+
+        if instance is not None:
+            try:
+                instance.queue.put_nowait(None)
+            except Queue.Full:
+                pass
+            instance.join(timeout)
+
+    def put(self, data):
+
+        if time.time() < self.offline_until:
+            self.dropped += 1
+            return
+
+        try:
+            self.queue.put_nowait(data)
+        except Queue.Full:
+            self.dropped += 1
+
+    def run(self):
+
+        session = requests.Session()
+        while True:
+
+            # Wait for a hit, then give the next ones batch_delay to join it
+            hits = [self.queue.get()]
+            deadline = time.time() + self.batch_delay
+            while hits[-1] is not None and len(hits) < self.batch_size:
+                try:
+                    hits.append(self.queue.get(timeout=max(0, deadline - time.time())))
+                except Queue.Empty:
+                    break
+
+            stop = hits[-1] is None
+            hits = [hit for hit in hits if hit is not None]
+            if hits and time.time() >= self.offline_until:
+                self._send(session, hits)
+
+            if stop:
+                break
+
+    @classmethod
+    def _encode(cls, data):
+
+        return urllib.urlencode([(key, value.encode('utf-8') if isinstance(value, unicode) else value)
+                                 for key, value in data.items()])
+
+    def _send(self, session, hits):
+
+        try:
+            if GoogleAnalytics.testing:
+                # The debug endpoint validates one hit at a time
+                for hit in hits:
+                    r = session.post("https://www.google-analytics.com/debug/collect",
+                                     data=self._encode(hit), timeout=self.timeout)
+                    log.info("GA: " + r.text.encode('utf-8'))
+
+            elif len(hits) == 1:
+                session.post("https://www.google-analytics.com/collect",
+                             data=self._encode(hits[0]), timeout=self.timeout)
+            else:
+                session.post("https://www.google-analytics.com/batch",
+                             data="\n".join(self._encode(hit) for hit in hits),
+                             timeout=self.timeout)
+
+        except Exception as error:
+            self.offline_until = time.time() + self.offline_time
+            log.info("GA not reachable, hits dropped for %ss: %s", self.offline_time, error)
+        else:
+            log.debug("GA: sent %s hits, %s dropped", len(hits), self.dropped)
+            self.dropped = 0
+
+
 # main GA class
 class GoogleAnalytics():
 
@@ -209,20 +324,9 @@ class GoogleAnalytics():
 
         if (self.testing):
             log.info("GA: " + str(data))
-        
-        if(self.testing):
-            url = "https://www.google-analytics.com/debug/collect" # test URL
-        else:
-            url = "https://www.google-analytics.com/collect" # prod URL
 
-        try:
-            r = requests.post(url, data)
-        except Exception as error:
-            log.error(error)
-            r = None
-        
-        if(self.testing and r != None):
-            log.info("GA: " + r.text.encode('utf-8'))
+        # Does not block, sent in the background
+        Telemetry.get().put(data)
             
     
             
\ No newline at end of file
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import errno
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import Queue
+
+import xbmc
+import xbmcvfs
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+
+
+class ImageDownloadThread(threading.Thread):
+
+    def __init__(self, queue):
+
+        self.queue = queue
+        threading.Thread.__init__(self)
+
+    def run(self):
+
+        while True:
+            try:
+                url, path = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+
+            if not xbmcvfs.copy(url, path):
+                log.info("Failed to download image: %s", url)
+
+            self.queue.task_done()
+
+
+class IndexLock(object):
+    # Serializes the index updates of the service and of the plugin invocations, which run
+    # in separate processes. A lock file older than stale_time was left by a killed process.
+
+    timeout = 5
+    stale_time = 30
+
+
+    def __init__(self, path):
+
+        self.lock_file = "%s.lock" % path
+        self.locked = False
+
+    def __enter__(self):
+
+        deadline = time.time() + self.timeout
+        while not self.locked:
+            try:
+                os.close(os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                self.locked = True
+                break
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+
+            try:
+                if time.time() - os.path.getmtime(self.lock_file) > self.stale_time:
+                    log.info("Removing stale lock: %s", self.lock_file)
+                    os.remove(self.lock_file)
+                    continue
+            except OSError: # Released in the meantime
+                continue
+
+            if time.time() > deadline:
+                log.info("Timed out waiting for: %s", self.lock_file)
+                break
+            time.sleep(0.05)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        if self.locked:
+            try:
+                os.remove(self.lock_file)
+            except OSError:
+                pass
+            self.locked = False
+
+
+class ImageCache(object):
+    # Local copies of emby images, i.e. extrafanart for skins.
+    # Files are named after the image tag, so a changed image is a new file.
+    # index.json keeps {item_id: {tags, size, checked}}, it is only written when images are
+    # added. The mtime of the item folder is the last use, for LRU eviction.
+
+    max_size = 256 * 1024 * 1024
+    max_age = 24 * 60 * 60
+    download_limit = 4
+
+
+    def __init__(self, folder="emby", prefix="fanart"):
+
+        self.path = xbmc.translatePath("special://thumbnails/%s/" % folder).decode('utf-8')
+        self.index_file = os.path.join(self.path, "index.json")
+        self.prefix = prefix
+
+    def _load_index(self):
+
+        try:
+            with open(self.index_file, 'r') as index:
+                return json.load(index)
+        except (IOError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+
+        if not xbmcvfs.exists(self.path):
+            xbmcvfs.mkdirs(self.path)
+
+        # Unique name per writer, renamed over the index so readers see the old or new one
+        temp_file = "%s.%s.tmp" % (self.index_file, uuid.uuid4().hex)
+        with open(temp_file, 'w') as temp:
+            json.dump(index, temp)
+        try:
+            os.rename(temp_file, self.index_file)
+        except OSError:
+            # Windows does not replace an existing file, a reader in between gets a cache miss
+            os.remove(self.index_file)
+            os.rename(temp_file, self.index_file)
+
+    def _get_file(self, item_id, tag):
+        return os.path.join(self.path, item_id, "%s%s.jpg" % (self.prefix, tag))
+
+    def _get_size(self, item_path):
+        return sum(os.path.getsize(os.path.join(item_path, file_)) for file_ in os.listdir(item_path))
+
+    def get_cached(self, item_id):
+        # Returns the local files from the index, None if unknown or due for revalidation.
+        # Read only, the use is recorded on the item folder.
+        entry = self._load_index().get(item_id)
+
+        if entry is None or time.time() - entry['checked'] > self.max_age:
+            return None
+
+        try:
+            os.utime(os.path.join(self.path, item_id), None)
+        except OSError: # Evicted in the meantime
+            return None
+
+        return [self._get_file(item_id, tag) for tag in entry['tags']]
+
+    def add(self, item_id, images):
+        # images is a list of (tag, url). Returns the local files in the same order
+        item_path = os.path.join(self.path, item_id)
+        if not xbmcvfs.exists(item_path + "/"):
+            xbmcvfs.mkdirs(item_path)
+
+        tags = [tag for tag, url in images]
+        queue = Queue.Queue()
+        for tag, url in images:
+            image_file = self._get_file(item_id, tag)
+            if not os.path.exists(image_file):
+                queue.put((url, image_file))
+
+        if not queue.empty():
+            log.info("Downloading %s images for: %s", queue.qsize(), item_id)
+            threads = [ImageDownloadThread(queue)
+                       for i in range(min(self.download_limit, queue.qsize()))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        for file_ in os.listdir(item_path):
+            image_file = os.path.join(item_path, file_)
+            if file_[len(self.prefix):-len(".jpg")] not in tags:
+                # Image was replaced or removed on the server
+                log.debug("Removing stale image: %s", image_file)
+                os.remove(image_file)
+        os.utime(item_path, None)
+
+        entry = {
+
+            'tags': [tag for tag in tags if os.path.exists(self._get_file(item_id, tag))],
+            'size': self._get_size(item_path),
+            'checked': time.time()
+        }
+        with IndexLock(self.index_file) as lock:
+            if lock.locked:
+                index = self._load_index()
+                index[item_id] = entry
+                self._evict(index, keep=item_id)
+                self._save_index(index)
+
+        return [self._get_file(item_id, tag) for tag in entry['tags']]
+
+    def _evict(self, index, keep=None):
+        # Remove least recently used items until the cache fits in max_size. Goes by the
+        # folders on disk, so folders missing from the index are sized and evicted as well.
+        folders = []
+        for item_id in os.listdir(self.path):
+            item_path = os.path.join(self.path, item_id)
+            if os.path.isdir(item_path):
+                size = index[item_id]['size'] if item_id in index else self._get_size(item_path)
+                folders.append((os.path.getmtime(item_path), item_id, size))
+
+        for item_id in set(index) - set(item_id for used, item_id, size in folders):
+            # Folder removed by another process
+            del index[item_id]
+
+        total = sum(size for used, item_id, size in folders)
+        for used, item_id, size in sorted(folders):
+
+            if total <= self.max_size:
+                break
+            elif item_id == keep:
+                continue
+
+            log.info("Evicting cached images for: %s", item_id)
+            index.pop(item_id, None)
+            total -= size
+            shutil.rmtree(os.path.join(self.path, item_id), ignore_errors=True)
+
+    def get_backdrops(self, item_id):
+        # Extrafanart for an emby item, downloaded on the first request
+        files = self.get_cached(item_id)
+
+        if files is None:
+            import artwork
+            import read_embyserver as embyserver
+
+            item = embyserver.Read_EmbyServer().getItem(item_id)
+            if item:
+                files = self.add(item_id, artwork.Artwork().get_backdrops(item))
+
+        return files or []
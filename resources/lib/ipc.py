@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import BaseHTTPServer
+import SocketServer
+import json
+import logging
+import threading
+import urllib2
+import uuid
+
+from utils import window
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+# Plugin invocations call into the service over a loopback http server. The service answers
+# from its warm state (server session, caches) and the plugin falls back to doing the work
+# itself whenever the service can't be reached.
+
+
+class IPCError(Exception):
+    # The service endpoint is not available
+    pass
+
+
+def call(_endpoint, timeout=30, **params):
+    # Client side, used by the plugin. The params are sent as they are, they may use any
+    # name (i.e. method for the emby endpoint).
+    port = window('emby_ipc.port')
+    if not port:
+        raise IPCError("service endpoint not running")
+
+    request = urllib2.Request("http://127.0.0.1:%s/%s" % (port, _endpoint),
+                              data=json.dumps(params),
+                              headers={'X-Emby-Token': window('emby_ipc.token'),
+                                       'Content-Type': "application/json"})
+    try:
+        response = urllib2.urlopen(request, timeout=timeout)
+        return json.loads(response.read())
+    except Exception as error:
+        log.info("IPC %s failed, falling back: %s", _endpoint, error)
+        raise IPCError(error)
+
+#################################################################################################
+# Service side
+
+def _widget(widget, tagname, limit):
+
+    import widgets
+    return widgets.Widgets().get(widget, tagname, limit)
+
+def _emby(method, args=None, kwargs=None):
+
+    import read_embyserver as embyserver
+    if method not in ('getItem', 'getViews', 'getFilteredSection',
+                      'getTvChannels', 'getTvRecordings', 'getTvPrograms'):
+        raise ValueError("method not allowed: %s" % method)
+
+    return getattr(embyserver.Read_EmbyServer(), method)(*(args or []), **(kwargs or {}))
+
+def _extrafanart(item_id):
+
+    import image_cache
+    return image_cache.ImageCache().get_backdrops(item_id)
+
+def _dumplog(reason):
+
+    import loghandler
+    return loghandler.memory_log.dump(reason)
+
+
+class IPCHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    methods = {
+
+        'widget': _widget,
+        'emby': _emby,
+        'extrafanart': _extrafanart,
+        'dumplog': _dumplog
+    }
+
+    def log_message(self, format_, *args):
+        log.debug("IPC %s", format_ % args)
+
+    def do_POST(self):
+
+        if self.headers.get('X-Emby-Token') != self.server.token:
+            self.send_error(403)
+            return
+
+        method = self.path.strip("/")
+        if method not in self.methods:
+            self.send_error(404)
+            return
+
+        try:
+            params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            result = json.dumps(self.methods[method](**params))
+        except Exception as error:
+            log.exception(error)
+            self.send_error(500)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(result)))
+        self.end_headers()
+        self.wfile.write(result)
+
+
+class IPCHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    token = None
+
+
+class IPCServer(threading.Thread):
+    # Started by the service, the port and token are published as window properties
+
+    def __init__(self):
+
+        # Bind right away, a random free port on the loopback interface
+        self.server = IPCHTTPServer(('127.0.0.1', 0), IPCHandler)
+        self.server.token = str(uuid.uuid4())
+
+        threading.Thread.__init__(self)
+
+    def run(self):
+
+        window('emby_ipc.token', value=self.server.token)
+        window('emby_ipc.port', value=str(self.server.server_address[1]))
+        log.info("IPC endpoint listening on port: %s", self.server.server_address[1])
+
+        self.server.serve_forever(poll_interval=1)
+
+    def stop(self):
+
+        window('emby_ipc.port', clear=True)
+        window('emby_ipc.token', clear=True)
+
+        if self.is_alive():
+            self.server.shutdown()
+        self.server.server_close()
+
+        log.info("IPC endpoint stopped")
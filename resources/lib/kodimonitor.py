@@ -10,8 +10,11 @@ import xbmcgui
 
 import downloadutils
 import embydb_functions as embydb
+import loghandler
 import playbackutils as pbutils
-from utils import window, settings
+from playback_prep import Prefetch
+from player_state import PlayerState
+from utils import window, settings, Snapshot, cancel_token
 from ga_client import log_error
 from database import DatabaseConn
 
@@ -25,6 +28,10 @@ log = logging.getLogger("EMBY."+__name__)
 class KodiMonitor(xbmc.Monitor):
 
 
+    _focused = None
+    _prefetched = None
+
+
     def __init__(self):
 
         xbmc.Monitor.__init__(self)
@@ -47,11 +54,13 @@ class KodiMonitor(xbmc.Monitor):
 
     def onSettingsChanged(self):
         # Monitor emby settings
+        Snapshot.invalidate()
         current_log_level = settings('logLevel')
         if window('emby_logLevel') != current_log_level:
             # The log level changed, set new prop
             log.info("New log level: %s", current_log_level)
             window('emby_logLevel', value=current_log_level)
+            loghandler.set_level(current_log_level)
 
         current_context = "true" if settings('enableContext') == "true" else ""
         if window('emby_context') != current_context:
@@ -61,7 +70,8 @@ class KodiMonitor(xbmc.Monitor):
     @log_error()
     def onNotification(self, sender, method, data):
 
-        if method not in ('Playlist.OnAdd', 'Player.OnStop', 'Player.OnClear'):
+        if method not in ('Playlist.OnAdd', 'Player.OnStop', 'Player.OnClear',
+                          'Application.OnVolumeChanged'):
             log.info("Method: %s Data: %s", method, data)
 
         try:
@@ -77,6 +87,25 @@ class KodiMonitor(xbmc.Monitor):
         elif method == 'VideoLibrary.OnUpdate':
             self._video_update(data)
 
+        elif method == 'Player.OnStop':
+            # Prefetch the focused item again, its user data may have changed
+            self._prefetched = None
+
+        elif method == 'Application.OnVolumeChanged':
+            # Player state for the progress reports
+            PlayerState.set_volume(data['volume'], data['muted'])
+
+        elif method in ('Player.OnAVChange', 'Player.OnPropertyChanged'):
+            # Audio or subtitle stream changed
+            PlayerState.tracks_changed()
+
+        elif method in ('Player.OnSeek', 'Player.OnPause', 'Player.OnResume', 'Player.OnSpeedChanged'):
+            PlayerState.changed()
+
+        elif method == 'System.OnQuit':
+            # Stop any sync right away, before the service notices the abort
+            cancel_token.cancel()
+
         elif method == 'System.OnSleep':
             # Connection is going to sleep
             log.info("Marking the server as offline. System.OnSleep activated.")
@@ -102,8 +131,10 @@ class KodiMonitor(xbmc.Monitor):
                 # Set up properties for player
                 item_id = self._get_item_id(kodi_id, item_type)
                 if item_id:
-                    url = "{server}/emby/Users/{UserId}/Items/%s?format=json" % item_id
-                    result = self.download(url)
+                    result = Prefetch.get_item(item_id)
+                    if result is None:
+                        url = "{server}/emby/Users/{UserId}/Items/%s?format=json" % item_id
+                        result = self.download(url)
                     log.debug("Item: %s", result)
 
                     playurl = None
@@ -125,6 +156,28 @@ class KodiMonitor(xbmc.Monitor):
                             # Set properties for player.py
                             playback.setProperties(playurl, listitem)
 
+    def prefetch_focused(self):
+        # Called every second by the service. An item that stays focused is fetched ahead
+        # of playback, plugin listings set the embyid property, library items have a dbid.
+        focused = (xbmc.getInfoLabel('ListItem.Property(embyid)'),
+                   xbmc.getInfoLabel('ListItem.DBID'),
+                   xbmc.getInfoLabel('ListItem.DBTYPE'))
+
+        if focused != self._focused:
+            self._focused = focused
+            return
+
+        if focused == self._prefetched or xbmc.getCondVisibility('ListItem.IsFolder'):
+            return
+
+        self._prefetched = focused
+        item_id, kodi_id, item_type = focused
+        if not item_id and kodi_id and item_type in ("movie", "episode", "musicvideo"):
+            item_id = self._get_item_id(kodi_id, item_type)
+
+        if item_id:
+            Prefetch.prefetch(item_id)
+
     def _video_update(self, data):
         # Manually marking as watched/unwatched
         try:
@@ -137,6 +190,7 @@ class KodiMonitor(xbmc.Monitor):
             # Send notification to the server.
             item_id = self._get_item_id(kodi_id, item_type)
             if item_id:
+                Prefetch.forget([item_id])
                 # Stop from manually marking as watched unwatched, with actual playback.
                 if window('emby_skipWatched%s' % item_id) == "true":
                     # property is set in player.py
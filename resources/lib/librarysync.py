@@ -21,9 +21,11 @@ import embydb_functions as embydb
 import read_embyserver as embyserver
 import userclient
 import views
+import widgets
 from objects import Movies, MusicVideos, TVShows, Music
-from utils import window, settings, language as lang, should_stop
+from utils import window, settings, language as lang, cancel_token
 from ga_client import GoogleAnalytics
+from loghandler import Payload, memory_log
 
 ##################################################################################################
 
@@ -47,6 +49,8 @@ class LibrarySync(threading.Thread):
     removeItems = []
     forceLibraryUpdate = False
     refresh_views = False
+    # Changes missed while the websocket was disconnected, set in websocket_client.py
+    catch_up_since = None
 
 
     def __init__(self):
@@ -70,7 +74,7 @@ class LibrarySync(threading.Thread):
 
         dialog = xbmcgui.DialogProgressBG()
         dialog.create("Emby for Kodi", title)
-        log.debug("Show progress dialog: %s" % title)
+        log.debug("Show progress dialog: %s", title)
 
         return dialog
 
@@ -120,7 +124,7 @@ class LibrarySync(threading.Thread):
             lastSync = "2010-01-01T00:00:00Z"
 
         lastSyncTime = utils.convertDate(lastSync)
-        log.info("Last sync run: %s" % lastSyncTime)
+        log.info("Last sync run: %s", lastSyncTime)
 
         # get server RetentionDateTime
         try:
@@ -131,27 +135,15 @@ class LibrarySync(threading.Thread):
             retention_time = "2010-01-01T00:00:00Z"
 
         retention_time = utils.convertDate(retention_time)
-        log.info("RetentionDateTime: %s" % retention_time)
+        log.info("RetentionDateTime: %s", retention_time)
 
         # if last sync before retention time do a full sync
         if retention_time > lastSyncTime:
             log.info("Fast sync server retention insufficient, fall back to full sync")
             return False
 
-        params = {'LastUpdateDT': lastSync}
-        if settings('enableMusic') != "true":
-            params['filter'] = "music"
-        url = "{server}/emby/Emby.Kodi.SyncQueue/{UserId}/GetItems?format=json"
-
         try:
-            result = self.doUtils(url, parameters=params)
-            processlist = {
-
-                'added': result['ItemsAdded'],
-                'update': result['ItemsUpdated'],
-                'userdata': result['UserDataChanged'],
-                'remove': result['ItemsRemoved']
-            }
+            result, processlist = self._get_sync_queue(lastSync)
 
         except Exception as error: # To be reviewed to only catch specific errors.
             log.error(error)
@@ -160,11 +152,56 @@ class LibrarySync(threading.Thread):
             return False
 
         else:
-            log.info("Fast sync changes: %s" % result)
+            log.info("Fast sync changes: %s", Payload(result))
             for action in processlist:
                 self.triage_items(action, processlist[action])
             return True
 
+    def _get_sync_queue(self, lastSync):
+
+        params = {'LastUpdateDT': lastSync}
+        if settings('enableMusic') != "true":
+            params['filter'] = "music"
+        url = "{server}/emby/Emby.Kodi.SyncQueue/{UserId}/GetItems?format=json"
+
+        result = self.doUtils(url, parameters=params)
+        processlist = {
+
+            'added': result['ItemsAdded'],
+            'update': result['ItemsUpdated'],
+            'userdata': result['UserDataChanged'],
+            'remove': result['ItemsRemoved']
+        }
+        return result, processlist
+
+    def catch_up(self):
+        # Queue the changes made on the server while the websocket was disconnected.
+        # Without the server plugin, removed items are left for the next startup sync.
+        since = self.catch_up_since
+        self.catch_up_since = None
+        log.info("Catching up on changes since: %s", since)
+
+        if self.isFastSync:
+            try:
+                result, processlist = self._get_sync_queue(since)
+            except Exception as error:
+                log.error("Failed to retrieve changes from the sync queue: %s", error)
+            else:
+                for action in processlist:
+                    self.triage_items(action, processlist[action])
+                return
+
+        try:
+            updated = self.emby.getChangedItems(since)
+            userdata = self.emby.getChangedItems(since, userdata=True)
+        except Exception as error:
+            log.error("Failed to retrieve changed items: %s", error)
+            return
+
+        self.triage_items("update", updated)
+        self.triage_items("userdata", [{'ItemId': item_id} for item_id in userdata
+                                       if item_id not in updated])
+
     def saveLastSync(self):
 
         # Save last sync time
@@ -180,14 +217,14 @@ class LibrarySync(threading.Thread):
 
         except Exception as e:
             # If the server plugin is not installed or an error happened.
-            log.debug("An exception occurred: %s" % e)
+            log.debug("An exception occurred: %s", e)
             time_now = datetime.utcnow()-timedelta(minutes=overlap)
             lastSync = time_now.strftime('%Y-%m-%dT%H:%M:%SZ')
-            log.info("New sync time: client time -%s min: %s" % (overlap, lastSync))
+            log.info("New sync time: client time -%s min: %s", overlap, lastSync)
 
         else:
             lastSync = (server_time - timedelta(minutes=overlap)).strftime('%Y-%m-%dT%H:%M:%SZ')
-            log.info("New sync time: server time -%s min: %s" % (overlap, lastSync))
+            log.info("New sync time: server time -%s min: %s", overlap, lastSync)
 
         finally:
             settings('LastIncrementalSync', value=lastSync)
@@ -206,7 +243,7 @@ class LibrarySync(threading.Thread):
                 log.info("Flag still active, but will try to commit")
                 window('emby_kodiScan', clear=True)
 
-            if should_stop():
+            if cancel_token.cancelled:
                 log.info("Commit unsuccessful. Sync terminated.")
                 break
 
@@ -380,7 +417,7 @@ class LibrarySync(threading.Thread):
 
         views = emby_db.getView_byType('movies')
         views += emby_db.getView_byType('mixed')
-        log.info("Media folders: %s" % views)
+        log.info("Media folders: %s", Payload(views))
 
         ##### PROCESS MOVIES #####
         for view in views:
@@ -416,7 +453,7 @@ class LibrarySync(threading.Thread):
         mvideos = MusicVideos(embycursor, kodicursor, pdialog)
 
         views = emby_db.getView_byType('musicvideos')
-        log.info("Media folders: %s" % views)
+        log.info("Media folders: %s", Payload(views))
 
         for view in views:
             log.info("Processing: %s", view)
@@ -447,7 +484,7 @@ class LibrarySync(threading.Thread):
 
         views = emby_db.getView_byType('tvshows')
         views += emby_db.getView_byType('mixed')
-        log.info("Media folders: %s" % views)
+        log.info("Media folders: %s", Payload(views))
 
         for view in views:
 
@@ -503,7 +540,7 @@ class LibrarySync(threading.Thread):
                     itemids.append(item['ItemId'])
                 items = itemids
 
-            log.info("Queue %s: %s" % (process, items))
+            log.info("Queue %s: %s", process, Payload(items))
             processlist[process].extend(items)
 
     def incrementalSync(self):
@@ -593,10 +630,14 @@ class LibrarySync(threading.Thread):
         if pDialog:
             pDialog.close()
 
+        if totalUpdates > 0:
+            # Recompute the widgets served by the plugin
+            widgets.Widgets().refresh_cache()
+
 
     def compareDBVersion(self, current, minimum):
         # It returns True is database is up to date. False otherwise.
-        log.info("current: %s minimum: %s" % (current, minimum))
+        log.info("current: %s minimum: %s", current, minimum)
 
         try:
             currMajor, currMinor, currPatch = current.split(".")
@@ -629,6 +670,8 @@ class LibrarySync(threading.Thread):
                 ga.sendEventData("Exception", errStrings[0], errStrings[1])
             window('emby_dbScan', clear=True)
             log.exception(e)
+            # The records leading to the failure, whatever the log level
+            memory_log.dump("librarysync")
             xbmcgui.Dialog().ok(
                         heading=lang(29999),
                         line1=(
@@ -711,6 +754,7 @@ class LibrarySync(threading.Thread):
                 elapsedTime = datetime.now() - startTime
                 log.info("SyncDatabase (finished in: %s) %s"
                     % (str(elapsedTime).split('.')[0], librarySync))
+                widgets.Widgets().refresh_cache()
 
                 # Add other servers at this point
                 # TODO: re-add once plugin listing is created
@@ -721,7 +765,9 @@ class LibrarySync(threading.Thread):
                 startupComplete = True
 
             # Process updates
-            if window('emby_dbScan') != "true" and window('emby_shouldStop') != "true":
+            if window('emby_dbScan') != "true" and not cancel_token.cancelled:
+                if self.catch_up_since and startupComplete:
+                    self.catch_up()
                 self.incrementalSync()
 
             if window('emby_onWake') == "true" and window('emby_online') == "true":
@@ -731,7 +777,7 @@ class LibrarySync(threading.Thread):
                 if window('emby_syncRunning') != "true":
                     log.info("SyncDatabase onWake (started)")
                     librarySync = self.startSync()
-                    log.info("SyncDatabase onWake (finished) %s" % librarySync)
+                    log.info("SyncDatabase onWake (finished) %s", librarySync)
 
             if self.stop_thread:
                 # Set in service.py
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import xbmc
+import xbmcvfs
+
+from utils import window
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+
+
+class PrefetchThread(threading.Thread):
+
+    def __init__(self, cache, parent_id, item_type, start):
+
+        self.cache = cache
+        self.args = (parent_id, item_type, start)
+        threading.Thread.__init__(self)
+
+    def run(self):
+
+        try:
+            self.cache.get(*self.args)
+        except Exception as error:
+            log.error("Failed to prefetch page %s: %s", self.args, error)
+
+
+class ListingCache(object):
+    # Pages of plain folder listings for BrowseContent, kept on disk since every plugin
+    # invocation is a new interpreter. A page younger than max_age is served as is, an older
+    # one is revalidated with a light query returning only Etag and DateLastSaved of the page.
+
+    page_size = 200
+    max_age = 5 * 60
+    max_pages = 50
+
+    _lock = threading.Lock()
+
+
+    def __init__(self, fetch):
+
+        # fetch(method, *args, **kwargs) calls Read_EmbyServer, directly or through the service
+        self.fetch = fetch
+        self.path = xbmc.translatePath("special://temp/emby/browse/").decode('utf-8')
+
+    def _get_file(self, parent_id, item_type, start):
+
+        key = "%s.%s.%s.%s" % (window('emby_currUser'), parent_id, item_type, start)
+        return os.path.join(self.path, "%s.json" % hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    @classmethod
+    def _get_validator(cls, listing):
+        # Changes to any item of the page, its played state or the folder size
+        items = [(item['Id'], item.get('Etag'), item.get('DateLastSaved'),
+                  (item.get('UserData') or {}).get('Played'),
+                  (item.get('UserData') or {}).get('PlaybackPositionTicks'))
+                 for item in listing.get('Items') or []]
+
+        return hashlib.md5(json.dumps([listing.get('TotalRecordCount'), items])).hexdigest()
+
+    def _load(self, cache_file):
+
+        try:
+            with open(cache_file, 'r') as cached:
+                return json.load(cached)
+        except (IOError, ValueError):
+            return None
+
+    def _save(self, cache_file, page):
+        # Other plugin invocations may write the same page, failures only cost a cache miss
+        temp_file = "%s.%s.tmp" % (cache_file, uuid.uuid4().hex)
+        try:
+            with self._lock:
+                if not xbmcvfs.exists(self.path):
+                    xbmcvfs.mkdirs(self.path)
+
+                with open(temp_file, 'w') as temp:
+                    json.dump(page, temp)
+                try:
+                    os.rename(temp_file, cache_file)
+                except OSError:
+                    # Windows does not replace an existing file
+                    os.remove(cache_file)
+                    os.rename(temp_file, cache_file)
+
+                self._evict()
+        except (IOError, OSError) as error:
+            log.info("Failed to cache listing %s: %s", cache_file, error)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _evict(self):
+        # Keep the most recently written pages
+        files = []
+        for file_ in os.listdir(self.path):
+            if file_.endswith(".json"):
+                cache_file = os.path.join(self.path, file_)
+                try:
+                    files.append((os.path.getmtime(cache_file), cache_file))
+                except OSError: # Removed by another process
+                    pass
+
+        for used, cache_file in sorted(files, reverse=True)[self.max_pages:]:
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
+
+    def get(self, parent_id, item_type, start):
+
+        cache_file = self._get_file(parent_id, item_type, start)
+        page = self._load(cache_file)
+        params = {
+
+            'itemtype': item_type,
+            'recursive': False,
+            'limit': self.page_size,
+            'startindex': start
+        }
+        if page is not None:
+            if time.time() - page['time'] < self.max_age:
+                log.debug("Listing served from cache: %s/%s", parent_id, start)
+                return page['listing']
+
+            validation = self.fetch("getFilteredSection", parent_id, basic=True, **params)
+            if validation and self._get_validator(validation) == page['validator']:
+                log.debug("Listing revalidated: %s/%s", parent_id, start)
+                page['time'] = time.time()
+                self._save(cache_file, page)
+                return page['listing']
+
+        listing = self.fetch("getFilteredSection", parent_id, **params)
+        if listing:
+            self._save(cache_file, {
+
+                'time': time.time(),
+                'validator': self._get_validator(listing),
+                'listing': listing
+            })
+
+        return listing
+
+    def prefetch(self, parent_id, item_type, start):
+
+        thread = PrefetchThread(self, parent_id, item_type, start)
+        thread.start()
+
+        return thread
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import xbmc
+import xbmcvfs
+
+from utils import window
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+
+
+class LiveTV(object):
+    # Channel list with the current and next programme, and recordings, cached on disk.
+    # The plugin reads the cache, the service keeps every cached listing fresh (LiveTVThread).
+    # Listings are retrieved by pages with the trimmed field profile of read_embyserver.
+
+    page_size = 300
+    max_age = 60 * 60
+    guide_hours = 4
+
+    _lock = threading.Lock()
+    _refresh = threading.Event()
+
+
+    def __init__(self, fetch):
+
+        # fetch(method, *args, **kwargs) calls Read_EmbyServer, directly or through the service
+        self.fetch = fetch
+        self.path = xbmc.translatePath("special://temp/emby/livetv/").decode('utf-8')
+
+    @classmethod
+    def request_refresh(cls):
+        # Websocket events, picked up by LiveTVThread
+        cls._refresh.set()
+
+    def _get_file(self, listing, groupid=""):
+
+        key = "%s.%s.%s" % (window('emby_currUser'), listing, groupid)
+        return os.path.join(self.path, "%s.%s.json"
+                            % (listing, hashlib.md5(key.encode('utf-8')).hexdigest()))
+
+    def _load(self, cache_file):
+
+        try:
+            with open(cache_file, 'r') as cached:
+                return json.load(cached)
+        except (IOError, ValueError):
+            return None
+
+    def _save(self, cache_file, cache):
+        # The plugin writes the listings as well, failures only cost a cache miss
+        temp_file = "%s.%s.tmp" % (cache_file, uuid.uuid4().hex)
+        try:
+            with self._lock:
+                if not xbmcvfs.exists(self.path):
+                    xbmcvfs.mkdirs(self.path)
+
+                with open(temp_file, 'w') as temp:
+                    json.dump(cache, temp)
+                try:
+                    os.rename(temp_file, cache_file)
+                except OSError:
+                    # Windows does not replace an existing file
+                    os.remove(cache_file)
+                    os.rename(temp_file, cache_file)
+        except (IOError, OSError) as error:
+            log.info("Failed to cache live tv listing %s: %s", cache_file, error)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _get_pages(self, method, *args):
+
+        items = []
+        total = None
+        while total is None or len(items) < total:
+
+            result = self.fetch(method, *args, startindex=len(items), limit=self.page_size)
+            if not result or not result.get('Items'):
+                break
+
+            items.extend(result['Items'])
+            total = result.get('TotalRecordCount', len(items))
+
+        return {'Items': items, 'TotalRecordCount': len(items)}
+
+    def _get_cached(self, cache_file, update, *args):
+
+        cache = self._load(cache_file)
+        if cache is None or time.time() - cache['time'] > self.max_age:
+            return update(*args)
+
+        log.debug("Live tv listing served from cache: %s", cache_file)
+        return cache['listing']
+
+    def get_channels(self):
+        return self._get_cached(self._get_file("channels"), self.update_channels)
+
+    def get_recordings(self, groupid):
+        return self._get_cached(self._get_file("recordings", groupid),
+                                self.update_recordings, groupid)
+
+    def update_channels(self):
+
+        listing = self._get_pages("getTvChannels")
+        now = datetime.utcnow()
+        guide = self._get_pages("getTvPrograms", now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                                (now + timedelta(hours=self.guide_hours)).strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+        # Programs are sorted by start date, the first upcoming one is next
+        upcoming = {}
+        for program in guide['Items']:
+            upcoming.setdefault(program['ChannelId'], program)
+
+        for channel in listing['Items']:
+            if channel['Id'] in upcoming:
+                channel['NextProgram'] = upcoming[channel['Id']]
+
+        self._save(self._get_file("channels"), {'time': time.time(), 'listing': listing})
+        log.info("Live tv channels cached: %s", len(listing['Items']))
+
+        return listing
+
+    def update_recordings(self, groupid):
+
+        listing = self._get_pages("getTvRecordings", groupid)
+        self._save(self._get_file("recordings", groupid),
+                   {'time': time.time(), 'listing': listing, 'groupid': groupid})
+
+        return listing
+
+    def refresh(self):
+        # Update the listings that were cached by the plugin so far
+        if not xbmcvfs.exists(self.path):
+            return
+
+        for file_ in os.listdir(self.path):
+            cache_file = os.path.join(self.path, file_)
+
+            if cache_file == self._get_file("channels"):
+                self.update_channels()
+            elif file_.startswith("recordings.") and file_.endswith(".json"):
+                cache = self._load(cache_file)
+                # Skip the listings of other users
+                if cache and cache_file == self._get_file("recordings", cache['groupid']):
+                    self.update_recordings(cache['groupid'])
+
+    def advance(self):
+        # The programmes on air that ended are replaced by the next ones of the cached guide,
+        # without a server request. The following refresh fills in the next programmes.
+        cache_file = self._get_file("channels")
+        cache = self._load(cache_file)
+        if cache is None:
+            return
+
+        now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        ended = 0
+        for channel in cache['listing']['Items']:
+
+            end_date = (channel.get('CurrentProgram') or {}).get('EndDate')
+            if end_date and end_date[:19] <= now:
+                ended += 1
+                next_program = channel.pop('NextProgram', None)
+                if next_program:
+                    channel['CurrentProgram'] = next_program
+                else:
+                    del channel['CurrentProgram']
+
+        if ended:
+            self._save(cache_file, cache)
+            log.debug("Live tv programmes advanced: %s", ended)
+
+    def get_next_update(self):
+        # Seconds until the first programme on air ends, the current programmes change then
+        cache = self._load(self._get_file("channels"))
+        if cache is None:
+            return None
+
+        now = datetime.utcnow()
+        end_dates = [datetime.strptime(channel['CurrentProgram']['EndDate'][:19], "%Y-%m-%dT%H:%M:%S")
+                     for channel in cache['listing']['Items']
+                     if (channel.get('CurrentProgram') or {}).get('EndDate')]
+        end_dates = [end_date for end_date in end_dates if end_date > now]
+        if not end_dates:
+            return None
+
+        return (min(end_dates) - now).total_seconds()
+
+
+class LiveTVThread(threading.Thread):
+    # Service side, refreshes the cached listings from the server every refresh_interval and
+    # on websocket events. In between, the programmes on air advance from the cached guide.
+
+    refresh_interval = 15 * 60
+
+    _stop_thread = False
+
+
+    def __init__(self):
+
+        self.monitor = xbmc.Monitor()
+        threading.Thread.__init__(self)
+
+    def run(self):
+
+        import read_embyserver as embyserver
+
+        def fetch(method, *args, **kwargs):
+            return getattr(embyserver.Read_EmbyServer(), method)(*args, **kwargs)
+
+        livetv = LiveTV(fetch)
+        due = 0
+        advance_due = None
+
+        while not self.monitor.abortRequested() and not self._stop_thread:
+
+            if window('emby_online') == "true" and (LiveTV._refresh.is_set() or time.time() >= due):
+                LiveTV._refresh.clear()
+                try:
+                    livetv.refresh()
+                except Exception as error:
+                    log.error("Failed to refresh live tv listings: %s", error)
+
+                due = time.time() + self.refresh_interval
+                advance_due = self._get_advance_due(livetv)
+
+            elif advance_due is not None and time.time() >= advance_due:
+                try:
+                    livetv.advance()
+                except Exception as error:
+                    log.error("Failed to advance live tv programmes: %s", error)
+
+                advance_due = self._get_advance_due(livetv)
+
+            if self.monitor.waitForAbort(1):
+                break
+
+        log.info("##===---- LiveTVThread Stopped ----===##")
+
+    @classmethod
+    def _get_advance_due(cls, livetv):
+        # When the first programme on air ends
+        next_update = livetv.get_next_update()
+        return None if next_update is None else time.time() + next_update
+
+    def stop_thread(self):
+        self._stop_thread = True
@@ -2,19 +2,134 @@
 
 ##################################################################################################
 
+import collections
 import logging
+import os
+import sys
+import threading
+import time
+import traceback
 import xbmc
+import xbmcvfs
 
-from utils import window
+from utils import window, settings
 
 ##################################################################################################
 
+log = logging.getLogger("EMBY."+__name__)
+
+##################################################################################################
+
+
+def _is_emby(name):
+    return name == 'EMBY' or name.startswith('EMBY.')
 
 def config():
 
+    # The loggers of the modules imported so far and the ones to come keep
+    # every call in the memory log, see EmbyLogger
+    logging.setLoggerClass(EmbyLogger)
+    for name, logger in logging.Logger.manager.loggerDict.items():
+        if type(logger) is logging.Logger and _is_emby(name):
+            logger.__class__ = EmbyLogger
+            logger.memory = True
+
     logger = logging.getLogger('EMBY')
-    logger.addHandler(LogHandler())
-    logger.setLevel(logging.DEBUG)
+    handler = LogHandler()
+    handler.addFilter(SampleFilter())
+    logger.addHandler(handler)
+    set_level()
+
+def set_level(log_level=None):
+    # The emby log level (0, 1 or 2) decides the level of the logger, so disabled
+    # log calls return before a record is created or a message is formatted.
+    # Called again by the service and KodiMonitor when the setting changes.
+    levels = {
+        0: logging.WARNING,
+        1: logging.INFO,
+        2: logging.DEBUG
+    }
+    if log_level is None:
+        log_level = window('emby_logLevel') or settings('logLevel')
+    try:
+        log_level = int(log_level)
+    except ValueError:
+        log_level = 0
+
+    logging.getLogger('EMBY').setLevel(levels.get(log_level, logging.WARNING))
+
+
+class Payload(object):
+    # Log argument for large values, rendered only when the record is emitted
+    # and cut to limit characters.
+
+    limit = 2000
+
+    def __init__(self, value, limit=None):
+
+        self.value = value
+        if limit is not None:
+            self.limit = limit
+
+    def __str__(self):
+
+        text = self.value if isinstance(self.value, basestring) else repr(self.value)
+        if len(text) > self.limit:
+            text = "%s... (%s characters)" % (text[:self.limit], len(text))
+
+        return text if isinstance(text, str) else text.encode('utf-8')
+
+    def __unicode__(self):
+        return str(self).decode('utf-8', 'replace')
+
+    def summary(self, limit=200):
+        # Kept by the memory log instead of the value
+        if isinstance(self.value, basestring):
+            if len(self.value) > limit:
+                return "%s... (%s characters)" % (self.value[:limit], len(self.value))
+            return self.value
+        try:
+            return "<%s of %s>" % (type(self.value).__name__, len(self.value))
+        except TypeError:
+            return "<%s>" % type(self.value).__name__
+
+
+class SampleFilter(logging.Filter):
+    # Repeated debug and info messages, by logger and message template: the first burst
+    # records in each period are logged, then one in every rate records. The number of
+    # records left out is added to the next one logged. Warnings and errors always pass.
+
+    period = 60
+    burst = 20
+    rate = 100
+    max_keys = 1000
+
+    def __init__(self):
+
+        logging.Filter.__init__(self)
+        self.counters = {}
+
+    def filter(self, record):
+
+        if record.levelno > logging.INFO:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.time()
+        counter = self.counters.get(key)
+        if counter is None or now - counter[0] > self.period:
+            if len(self.counters) >= self.max_keys:
+                self.counters.clear()
+            counter = self.counters[key] = [now, 0, 0]
+
+        counter[1] += 1
+        if counter[1] > self.burst and counter[1] % self.rate:
+            counter[2] += 1
+            return False
+
+        record.skipped = counter[2]
+        counter[2] = 0
+        return True
 
 
 class LogHandler(logging.StreamHandler):
@@ -26,27 +141,159 @@ class LogHandler(logging.StreamHandler):
 
     def emit(self, record):
 
-        if self._get_log_level(record.levelno):
-            try:
-                xbmc.log(self.format(record), level=xbmc.LOGNOTICE)
-            except UnicodeEncodeError:
-                xbmc.log(self.format(record).encode('utf-8'), level=xbmc.LOGNOTICE)
+        try:
+            xbmc.log(self.format(record), level=xbmc.LOGNOTICE)
+        except UnicodeEncodeError:
+            xbmc.log(self.format(record).encode('utf-8'), level=xbmc.LOGNOTICE)
+
+
+class EmbyLogger(logging.Logger):
+    # Loggers of the add-on append every call to the memory log before the level check,
+    # the records for kodi.log are only created for the enabled levels.
+
+    def __init__(self, name, level=logging.NOTSET):
+
+        logging.Logger.__init__(self, name, level)
+        self.memory = _is_emby(name)
+
+    def _remember(self, level, msg, args, kwargs):
+        if self.memory:
+            memory_log.append(level, self.name, msg, args, kwargs.get('exc_info'))
+
+    def debug(self, msg, *args, **kwargs):
+
+        self._remember(logging.DEBUG, msg, args, kwargs)
+        if self.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, msg, args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+
+        self._remember(logging.INFO, msg, args, kwargs)
+        if self.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, msg, args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+
+        self._remember(logging.WARNING, msg, args, kwargs)
+        if self.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, msg, args, **kwargs)
+
+    warn = warning
+
+    def error(self, msg, *args, **kwargs):
+
+        self._remember(logging.ERROR, msg, args, kwargs)
+        if self.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, args, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+
+        self._remember(logging.CRITICAL, msg, args, kwargs)
+        if self.isEnabledFor(logging.CRITICAL):
+            self._log(logging.CRITICAL, msg, args, **kwargs)
+
+    fatal = critical
+
+
+class MemoryLog(object):
+    # The last calls of every level, whatever the log level. Written to a file on request
+    # (plugin mode dumplog) or when the library sync fails. A call is kept as a tuple
+    # (time, level, name, thread, msg, args, exception text) and only formatted in dump.
+    # Arguments other than numbers and short strings are summarized, so the memory log
+    # does not keep items or frames alive.
+
+    capacity = 5000
+    max_files = 5
+    max_length = 200
+
+    _plain = (int, long, float, bool, type(None))
+
+
+    def __init__(self):
+
+        self.records = collections.deque(maxlen=self.capacity)
+        self.path = xbmc.translatePath(
+            "special://profile/addon_data/plugin.video.emby/logs/").decode('utf-8')
+
+    def _summary(self, value):
+
+        if isinstance(value, Payload):
+            return value.summary(self.max_length)
+
+        if isinstance(value, basestring):
+            if len(value) > self.max_length:
+                return "%s... (%s characters)" % (value[:self.max_length], len(value))
+            return value
+
+        if isinstance(value, BaseException):
+            return repr(value)[:self.max_length]
+
+        return Payload(value).summary()
+
+    def append(self, level, name, msg, args, exc_info=None):
+        # Appending to the deque is thread safe, no lock needed
+        if args:
+            args = tuple([arg if isinstance(arg, self._plain) else self._summary(arg)
+                          for arg in args])
+        if not isinstance(msg, basestring):
+            msg = self._summary(msg)
+
+        exc_text = None
+        if exc_info:
+            if not isinstance(exc_info, tuple):
+                exc_info = sys.exc_info()
+            exc_text = "".join(traceback.format_exception(*exc_info))
+
+        self.records.append((time.time(), level, name, threading.current_thread().name,
+                             msg, args, exc_text))
 
     @classmethod
-    def _get_log_level(cls, level):
-
-        levels = {
-            logging.ERROR: 0,
-            logging.WARNING: 0,
-            logging.INFO: 1,
-            logging.DEBUG: 2
-        }
+    def _format(cls, record):
+
+        created, level, name, thread, msg, args, exc_text = record
+        prefix = "%s,%03d %s [%s] %s" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)),
+                                         created % 1 * 1000, logging.getLevelName(level), thread, name)
         try:
-            log_level = int(window('emby_logLevel'))
-        except ValueError:
-            log_level = 0
+            text = "%s: %s" % (prefix, msg % args if args else msg)
+        except Exception: # Wrong arguments, str and unicode mixed
+            text = "%s: %r %r" % (prefix, msg, args)
 
-        return log_level >= levels[level]
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        if exc_text:
+            if isinstance(exc_text, unicode):
+                exc_text = exc_text.encode('utf-8')
+            text = "%s\n%s" % (text, exc_text.rstrip())
+
+        return text
+
+    def _clean(self):
+        # Keep the latest dumps only, the file names start with the time
+        dumps = sorted(name for name in os.listdir(self.path) if name.startswith("emby_"))
+        for name in dumps[:-self.max_files]:
+            os.remove(os.path.join(self.path, name))
+
+    def dump(self, reason):
+        # Returns the path of the file written, None if it failed
+        records = list(self.records)
+        file_path = os.path.join(self.path, "emby_%s_%s.log" % (time.strftime("%Y%m%d-%H%M%S"),
+                                                                reason))
+        try:
+            if not xbmcvfs.exists(self.path):
+                xbmcvfs.mkdirs(self.path)
+
+            with open(file_path, 'w') as log_file:
+                log_file.write("Memory log, %s records, reason: %s\n" % (len(records), reason))
+                for record in records:
+                    log_file.write(self._format(record) + "\n")
+
+            self._clean()
+        except (IOError, OSError) as error:
+            log.error("Failed to save the memory log: %s", error)
+            return None
+
+        log.warn("Memory log saved to: %s", file_path)
+        return file_path
 
 
 class MyFormatter(logging.Formatter):
@@ -67,8 +314,13 @@ class MyFormatter(logging.Formatter):
 
         # Call the original formatter class to do the grunt work
         result = logging.Formatter.format(self, record)
+        if getattr(record, 'skipped', 0):
+            result += " (%s similar messages skipped)" % record.skipped
 
         # Restore the original format configured by the user
         self._fmt = format_orig
 
         return result
+
+
+memory_log = MemoryLog()
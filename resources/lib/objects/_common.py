@@ -14,7 +14,8 @@ import artwork
 import downloadutils
 import read_embyserver as embyserver
 from ga_client import GoogleAnalytics
-from utils import window, settings, dialog, language as lang, should_stop
+from utils import window, settings, dialog, language as lang, cancel_token
+from loghandler import Payload
 
 ##################################################################################################
 
@@ -57,7 +58,7 @@ class Items(object):
         self.artwork = artwork.Artwork()
         self.emby = embyserver.Read_EmbyServer()
         self.do_url = downloadutils.DownloadUtils().downloadUrl
-        self.should_stop = should_stop
+        self.cancel = cancel_token
 
         self.kodi_version = int(xbmc.getInfoLabel('System.BuildVersion')[:2])
         self.direct_path = settings('useDirectPaths') == "1"
@@ -75,7 +76,7 @@ class Items(object):
                       heading="{emby}",
                       line1="%s %s. %s" % (lang(33047), path, lang(33048))):
 
-                window('emby_shouldStop', value="true")
+                cancel_token.cancel()
                 return False
 
         return True
@@ -98,7 +99,7 @@ class Items(object):
 
     def add_all(self, item_type, items, view=None):
 
-        if self.should_stop():
+        if self.cancel.cancelled:
             return False
 
         total = items['TotalRecordCount'] if 'TotalRecordCount' in items else len(items)
@@ -115,7 +116,7 @@ class Items(object):
 
     def process_all(self, item_type, action, items, total=None, view=None):
 
-        log.debug("Processing %s: %s", action, items)
+        log.debug("Processing %s: %s", action, Payload(items))
 
         process = self._get_func(item_type, action)
         self.total = total or len(items)
@@ -123,7 +124,7 @@ class Items(object):
 
         for item in items:
 
-            if self.should_stop():
+            if self.cancel.cancelled:
                 return False
 
             if not process:
@@ -137,7 +138,7 @@ class Items(object):
 
     def remove_all(self, item_type, items):
 
-        log.debug("Processing removal: %s", items)
+        log.debug("Processing removal: %s", Payload(items))
 
         process = self._get_func(item_type, "remove")
         for item in items:
@@ -151,7 +152,7 @@ class Items(object):
 
         for item in items:
 
-            if self.should_stop():
+            if self.cancel.cancelled:
                 break
 
             self.title = item.get('Name', "unknown")
@@ -167,9 +168,9 @@ class Items(object):
         view_name = view['name'] if view else item_type
 
         update_list = self._compare_checksum(items, compare_to)
-        log.info("Update for %s: %s", view_name, update_list)
+        log.info("Update for %s: %s", view_name, Payload(update_list))
 
-        if self.should_stop():
+        if self.cancel.cancelled:
             return False
 
         emby_items = self.emby.getFullItems(update_list)
@@ -193,7 +194,7 @@ class Items(object):
 
         for item in items:
 
-            if self.should_stop():
+            if self.cancel.cancelled:
                 break
 
             item_id = item['Id']
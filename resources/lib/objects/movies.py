@@ -63,7 +63,7 @@ class Movies(Items):
         # Process movies
         for view in views:
 
-            if self.should_stop():
+            if self.cancel.cancelled:
                 return False
 
             if not self.compare_movies(view):
@@ -10,6 +10,7 @@ import embydb_functions as embydb
 import musicutils
 import _kodi_music
 from _common import Items, catch_except
+from loghandler import Payload
 from utils import window, settings, language as lang
 
 ##################################################################################################
@@ -96,7 +97,7 @@ class Music(Items):
 
         for item in emby_artists['Items']:
 
-            if self.should_stop():
+            if self.cancel.cancelled:
                     return False
 
             item_id = item['Id']
@@ -113,7 +114,7 @@ class Music(Items):
 
             #compare_to.pop(item_id, None)
 
-        log.info("Update for Artist: %s", update_list)
+        log.info("Update for Artist: %s", Payload(update_list))
 
         emby_items = self.emby.getFullItems(update_list)
         total = len(update_list)
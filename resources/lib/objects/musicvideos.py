@@ -55,7 +55,7 @@ class MusicVideos(Items):
 
         for view in views:
 
-            if self.should_stop():
+            if self.cancel.cancelled:
                 return False
 
             if not self.compare_mvideos(view):
@@ -10,6 +10,7 @@ import api
 import embydb_functions as embydb
 import _kodi_tvshows
 from _common import Items, catch_except
+from loghandler import Payload
 from utils import window, settings, language as lang
 
 ##################################################################################################
@@ -75,7 +76,7 @@ class TVShows(Items):
         except ValueError:
             all_koditvshows = {}
 
-        log.info("all_koditvshows = %s", all_koditvshows)
+        log.debug("all_koditvshows = %s", Payload(all_koditvshows))
 
         try:
             all_kodiepisodes = dict(self.emby_db.get_checksum('Episode'))
@@ -89,7 +90,7 @@ class TVShows(Items):
         # TODO: Review once series pooling is explicitely returned in api
         for view in views:
 
-            if self.should_stop():
+            if self.cancel.cancelled:
                 return False
 
             # Get items per view
@@ -104,7 +105,7 @@ class TVShows(Items):
             all_embytvshows = self.emby.getShows(viewId, basic=True, dialog=pdialog)
             for embytvshow in all_embytvshows['Items']:
 
-                if self.should_stop():
+                if self.cancel.cancelled:
                     return False
 
                 API = api.API(embytvshow)
@@ -116,7 +117,7 @@ class TVShows(Items):
                     # Only update if movie is not in Kodi or checksum is different
                     updatelist.append(itemid)
 
-            log.info("TVShows to update for %s: %s", viewName, updatelist)
+            log.info("TVShows to update for %s: %s", viewName, Payload(updatelist))
             embytvshows = self.emby.getFullItems(updatelist)
             self.total = len(updatelist)
             del updatelist[:]
@@ -128,7 +129,7 @@ class TVShows(Items):
             self.count = 0
             for embytvshow in embytvshows:
                 # Process individual show
-                if self.should_stop():
+                if self.cancel.cancelled:
                     return False
 
                 itemid = embytvshow['Id']
@@ -149,7 +150,7 @@ class TVShows(Items):
                 all_embyepisodes = self.emby.getEpisodes(viewId, basic=True, dialog=pdialog)
                 for embyepisode in all_embyepisodes['Items']:
 
-                    if self.should_stop():
+                    if self.cancel.cancelled:
                         return False
 
                     API = api.API(embyepisode)
@@ -162,7 +163,7 @@ class TVShows(Items):
                         # Only update if movie is not in Kodi or checksum is different
                         updatelist.append(itemid)
 
-                log.info("Episodes to update for %s: %s", viewName, updatelist)
+                log.info("Episodes to update for %s: %s", viewName, Payload(updatelist))
                 embyepisodes = self.emby.getFullItems(updatelist)
                 self.total = len(updatelist)
                 del updatelist[:]
@@ -171,7 +172,7 @@ class TVShows(Items):
                 for episode in embyepisodes:
 
                     # Process individual episode
-                    if self.should_stop():
+                    if self.cancel.cancelled:
                         return False
                     self.title = "%s - %s" % (episode.get('SeriesName', "Unknown"), episode['Name'])
                     self.add_updateEpisode(episode)
@@ -179,7 +180,7 @@ class TVShows(Items):
 
         ##### PROCESS DELETES #####
 
-        log.info("all_embytvshowsIds = %s ", all_embytvshowsIds)
+        log.debug("all_embytvshowsIds = %s ", Payload(all_embytvshowsIds))
 
         for koditvshow in all_koditvshows:
             if koditvshow not in all_embytvshowsIds:
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import logging
+import threading
+import time
+import urlparse
+
+from utils import window
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+
+
+class PrepTask(threading.Thread):
+    # One playback preparation step running in the background, collected with get()
+
+    def __init__(self, function, *args, **kwargs):
+
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+
+        threading.Thread.__init__(self)
+        self.start()
+
+    def run(self):
+
+        try:
+            self.result = self.function(*self.args, **self.kwargs)
+        except (Exception, SystemExit) as error:
+            # Raised again in the caller's thread
+            self.error = error
+
+    def get(self):
+
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+        return self.result
+
+
+class PlaybackTimer(object):
+    # Time spent in each stage between the play request and the first frame.
+    # The plugin saves its stages, player.py adds the time to the first frame and logs it.
+
+    def __init__(self):
+
+        self.start = time.time()
+        self.last = self.start
+        self.stages = []
+
+    def stage(self, name):
+
+        now = time.time()
+        self.stages.append([name, int((now - self.last) * 1000)])
+        self.last = now
+
+    def save(self):
+        window('emby_playbackTimer.json', value={'start': self.start, 'stages': self.stages})
+
+    @classmethod
+    def report(cls, playing_file):
+
+        timer = window('emby_playbackTimer.json')
+        if not timer:
+            return
+
+        window('emby_playbackTimer.json', clear=True)
+        log.info("Time to first frame: %sms %s for: %s",
+                 int((time.time() - timer['start']) * 1000),
+                 ", ".join("%s %sms" % (name, duration) for name, duration in timer['stages']),
+                 playing_file)
+
+
+class Prefetch(object):
+    # Emby items fetched by the service ahead of playback, for the next playlist entry and
+    # the focused item. The plugin uses them instead of requesting the item again.
+
+    max_age = 5 * 60
+    max_items = 5
+    lead_time = 60
+
+    _lock = threading.Lock()
+
+
+    @classmethod
+    def _get_cached(cls, item_id):
+
+        cached = (window('emby_prefetch.json') or {}).get(item_id)
+        if cached and time.time() - cached['time'] < cls.max_age:
+            return cached['item']
+
+        return None
+
+    @classmethod
+    def get_item(cls, item_id):
+
+        item = cls._get_cached(item_id)
+        if item is not None:
+            log.info("Using prefetched item: %s", item_id)
+
+        return item
+
+    @classmethod
+    def get_item_id(cls, path):
+        # Emby id of a plugin path, i.e. a playlist entry
+        if path.startswith("plugin://plugin.video.emby") and "mode=play" in path:
+            return urlparse.parse_qs(urlparse.urlparse(path).query).get('id', [None])[0]
+
+        return None
+
+    @classmethod
+    def _fetch(cls, item_id):
+
+        import read_embyserver as embyserver
+
+        try:
+            item = embyserver.Read_EmbyServer().getItem(item_id)
+        except Exception as error:
+            log.info("Failed to prefetch item %s: %s", item_id, error)
+            return
+
+        if not item:
+            return
+
+        with cls._lock:
+            prefetched = window('emby_prefetch.json') or {}
+            prefetched[item_id] = {'time': time.time(), 'item': item}
+            for expired in sorted(prefetched, key=lambda key: prefetched[key]['time'],
+                                  reverse=True)[cls.max_items:]:
+                del prefetched[expired]
+
+            window('emby_prefetch.json', value=prefetched)
+
+        log.debug("Prefetched item: %s", item_id)
+
+    @classmethod
+    def forget(cls, item_ids):
+        # The user data of the items changed (played, marked watched), fetch them again
+        with cls._lock:
+            prefetched = window('emby_prefetch.json') or {}
+            removed = [item_id for item_id in item_ids if prefetched.pop(item_id, None)]
+            if removed:
+                window('emby_prefetch.json', value=prefetched)
+                log.debug("Dropped prefetched items: %s", removed)
+
+    @classmethod
+    def prefetch(cls, item_id):
+        # Service side, does not block the caller
+        if cls._get_cached(item_id) is None:
+            PrepTask(cls._fetch, item_id)
@@ -2,22 +2,20 @@
 
 #################################################################################################
 
-import json
 import logging
-import requests
-import os
 import shutil
 import sys
 
 import xbmc
 import xbmcgui
 import xbmcplugin
-import xbmcvfs
 
 import api
 import artwork
 import downloadutils
 import playutils as putils
+from playback_prep import PrepTask, PlaybackTimer
+from subtitle_cache import SubtitleCache
 import playlist
 import read_embyserver as embyserver
 import shutil
@@ -33,10 +31,12 @@ log = logging.getLogger("EMBY."+__name__)
 class PlaybackUtils():
     
     
-    def __init__(self, item):
+    def __init__(self, item, timer=None):
 
         self.item = item
         self.API = api.API(self.item)
+        self.timer = timer or PlaybackTimer()
+        self.subtitles = None
 
         self.doUtils = downloadutils.DownloadUtils().downloadUrl
 
@@ -54,14 +54,39 @@ class PlaybackUtils():
         playutils = putils.PlayUtils(self.item)
 
         log.info("Play called.")
+        # Independent requests run while the play url is verified
+        userdata = self.API.get_userdata()
+        seektime = self.API.adjust_resume(userdata['Resume'])
+        intros_task = None
+        parts_task = None
+        # Read once, intros and parts are added below only if their requests were started
+        propertiesPlayback = window('emby_playbackProps') == "true"
+
+        if dbid is not None and not propertiesPlayback:
+            if settings('enableCinema') == "true" and not seektime:
+                intros_task = PrepTask(self.doUtils,
+                                       "{server}/emby/Users/{UserId}/Items/%s/Intros?format=json" % itemid)
+            if self.item.get('PartCount'):
+                parts_task = PrepTask(self.doUtils,
+                                      "{server}/emby/Videos/%s/AdditionalParts?format=json" % itemid)
+
         playurl = playutils.getPlayUrl()
+        self.timer.stage("playurl")
         if not playurl:
             return xbmcplugin.setResolvedUrl(int(sys.argv[1]), False, listitem)
 
+        if (window('emby_%s.playmethod' % playurl) == "DirectStream" and
+                settings('enableExternalSubs') == "true"):
+            # External subtitles download while the playlist is set up
+            self.subtitles = SubtitleCache(self.item)
+            self.subtitles.start()
+
         if dbid is None:
             # Item is not in Kodi database
             listitem.setPath(playurl)
             self.setProperties(playurl, listitem)
+            self.timer.stage("properties")
+            self.timer.save()
             return xbmcplugin.setResolvedUrl(int(sys.argv[1]), True, listitem)
 
         # TODO: Review once Krypton is RC, no need for workaround.
@@ -74,7 +99,6 @@ class PlaybackUtils():
         sizePlaylist = playlist.size()
         currentPosition = startPos
 
-        propertiesPlayback = window('emby_playbackProps') == "true"
         introsPlaylist = False
         dummyPlaylist = False
 
@@ -82,11 +106,6 @@ class PlaybackUtils():
         log.debug("Playlist plugin position: %s" % currentPosition)
         log.debug("Playlist size: %s" % sizePlaylist)
 
-        ############### RESUME POINT ################
-        
-        userdata = self.API.get_userdata()
-        seektime = self.API.adjust_resume(userdata['Resume'])
-
         # We need to ensure we add the intro and additional parts only once.
         # Otherwise we get a loop.
         if not propertiesPlayback:
@@ -99,18 +118,18 @@ class PlaybackUtils():
                 log.debug("Adding dummy file to playlist.")
                 dummyPlaylist = True
                 playlist.add(playurl, listitem, index=startPos)
-                # Remove the original item from playlist 
-                self.pl.remove_from_playlist(startPos+1)
-                # Readd the original item to playlist - via jsonrpc so we have full metadata
-                self.pl.insert_to_playlist(currentPosition+1, dbid, self.item['Type'].lower())
+                # Remove the original item from playlist and readd it
+                # via jsonrpc so we have full metadata, in one batch
+                self.pl.replace_in_playlist(startPos+1, currentPosition+1, dbid,
+                                            self.item['Type'].lower())
                 currentPosition += 1
             
             ############### -- CHECK FOR INTROS ################
 
-            if settings('enableCinema') == "true" and not seektime:
+            if intros_task is not None:
                 # if we have any play them when the movie/show is not being resumed
-                url = "{server}/emby/Users/{UserId}/Items/%s/Intros?format=json" % itemid    
-                intros = self.doUtils(url)
+                intros = intros_task.get()
+                self.timer.stage("intros")
 
                 if intros['TotalRecordCount'] != 0:
                     getTrailers = True
@@ -123,6 +142,7 @@ class PlaybackUtils():
                             log.info("Skip trailers.")
                     
                     if getTrailers:
+                        introPlayurls = []
                         for intro in intros['Items']:
                             # The server randomly returns intros, process them.
                             introListItem = xbmcgui.ListItem()
@@ -133,9 +153,12 @@ class PlaybackUtils():
                             pbutils = PlaybackUtils(intro)
                             pbutils.setProperties(introPlayurl, introListItem)
 
-                            self.pl.insert_to_playlist(currentPosition, url=introPlayurl)
-                            introsPlaylist = True
-                            currentPosition += 1
+                            introPlayurls.append(introPlayurl)
+
+                        # Inserted together, ahead of the main item
+                        self.pl.insert_urls_to_playlist(currentPosition, introPlayurls)
+                        introsPlaylist = bool(introPlayurls)
+                        currentPosition += len(introPlayurls)
 
 
             ############### -- ADD MAIN ITEM ONLY FOR HOMESCREEN ###############
@@ -151,11 +174,11 @@ class PlaybackUtils():
 
             ############### -- CHECK FOR ADDITIONAL PARTS ################
             
-            if self.item.get('PartCount'):
+            if parts_task is not None:
                 # Only add to the playlist after intros have played
                 partcount = self.item['PartCount']
-                url = "{server}/emby/Videos/%s/AdditionalParts?format=json" % itemid
-                parts = self.doUtils(url)
+                parts = parts_task.get()
+                self.timer.stage("parts")
                 for part in parts['Items']:
 
                     additionalListItem = xbmcgui.ListItem()
@@ -168,13 +191,15 @@ class PlaybackUtils():
                     pbutils.setArtwork(additionalListItem)
 
                     playlist.add(additionalPlayurl, additionalListItem, index=currentPosition)
-                    self.pl.verify_playlist()
                     currentPosition += 1
 
+                self.pl.verify_playlist()
+
             if dummyPlaylist:
                 # Added a dummy file to the playlist,
                 # because the first item is going to fail automatically.
                 log.info("Processed as a playlist. First item is skipped.")
+                self.timer.save()
                 return xbmcplugin.setResolvedUrl(int(sys.argv[1]), False, listitem)
                 
 
@@ -197,6 +222,8 @@ class PlaybackUtils():
 
         listitem.setPath(playurl)
         self.setProperties(playurl, listitem)
+        self.timer.stage("properties")
+        self.timer.save()
 
         ############### PLAYBACK ################
 
@@ -242,72 +269,11 @@ class PlaybackUtils():
         self.setArtwork(listitem)
 
     def externalSubs(self, playurl):
+        # Downloads started with the play request are picked up here
+        if self.subtitles is None:
+            self.subtitles = SubtitleCache(self.item)
 
-        externalsubs = []
-        mapping = {}
-
-        itemid = self.item['Id']
-        try:
-            mediastreams = self.item['MediaSources'][0]['MediaStreams']
-        except (TypeError, KeyError, IndexError):
-            return
-
-        temp = xbmc.translatePath(
-               "special://profile/addon_data/plugin.video.emby/temp/").decode('utf-8')
-
-        kodiindex = 0
-        for stream in mediastreams:
-
-            index = stream['Index']
-            # Since Emby returns all possible tracks together, have to pull only external subtitles.
-            # IsTextSubtitleStream if true, is available to download from emby.
-            if (stream['Type'] == "Subtitle" and 
-                    stream['IsExternal'] and stream['IsTextSubtitleStream']):
-
-                # Direct stream
-                url = ("%s/Videos/%s/%s/Subtitles/%s/Stream.srt"
-                        % (self.server, itemid, itemid, index))
-
-                if "Language" in stream:
-                    
-                    filename = "Stream.%s.srt" % stream['Language']
-                    try:
-                        path = self._download_external_subs(url, temp, filename)
-                        externalsubs.append(path)
-                    except Exception as e:
-                        log.error(e)
-                        externalsubs.append(url)
-                else:
-                    externalsubs.append(url)
-                
-                # map external subtitles for mapping
-                mapping[kodiindex] = index
-                kodiindex += 1
-        
-        mapping = json.dumps(mapping)
-        window('emby_%s.indexMapping' % playurl, value=mapping)
-
-        return externalsubs
-
-    def _download_external_subs(self, src, dst, filename):
-
-        if not xbmcvfs.exists(dst):
-            xbmcvfs.mkdir(dst)
-
-        path = os.path.join(dst, filename)
-
-        try:
-            response = requests.get(src, stream=True)
-            response.raise_for_status()
-        except Exception as e:
-            raise
-        else:
-            response.encoding = 'utf-8'
-            with open(path, 'wb') as f:
-                f.write(response.content)
-                del response
-
-            return path
+        return self.subtitles.get_subtitles(playurl)
 
     def setArtwork(self, listItem):
         # Set up item and item info
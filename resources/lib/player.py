@@ -12,6 +12,8 @@ import xbmcgui
 import clientinfo
 import downloadutils
 import websocket_client as wsc
+from playback_prep import PlaybackTimer, Prefetch
+from player_state import PlayerState
 from utils import window, settings, language as lang
 from ga_client import GoogleAnalytics, log_error
 
@@ -29,6 +31,7 @@ class Player(xbmc.Player):
 
     played_info = {}
     currentFile = None
+    prefetchedFile = None
 
 
     def __init__(self):
@@ -87,6 +90,7 @@ class Player(xbmc.Player):
 
         else:
             log.info("ONPLAYBACK_STARTED: %s itemid: %s" % (currentFile, itemId))
+            PlaybackTimer.report(currentFile)
 
             # Only proceed if an itemId was found.
             embyitem = "emby_%s" % currentFile
@@ -110,22 +114,8 @@ class Player(xbmc.Player):
                 return
 
             # Get playback volume
-            volume_query = {
-
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "Application.GetProperties",
-                "params": {
-
-                    "properties": ["volume", "muted"]
-                }
-            }
-            result = xbmc.executeJSONRPC(json.dumps(volume_query))
-            result = json.loads(result)
-            result = result.get('result')
-
-            volume = result.get('volume')
-            muted = result.get('muted')
+            PlayerState.reset()
+            volume, muted = PlayerState.get_volume()
 
             # Postdata structure to send to Emby server
             url = "{server}/emby/Sessions/Playing"
@@ -148,67 +138,9 @@ class Player(xbmc.Player):
                 postdata['SubtitleStreamIndex'] = window("%sSubtitleStreamIndex" % currentFile)
             else:
                 # Get the current kodi audio and subtitles and convert to Emby equivalent
-                tracks_query = {
-
-                    "jsonrpc": "2.0",
-                    "id": 1,
-                    "method": "Player.GetProperties",
-                    "params": {
-
-                        "playerid": 1,
-                        "properties": ["currentsubtitle","currentaudiostream","subtitleenabled"]
-                    }
-                }
-                result = xbmc.executeJSONRPC(json.dumps(tracks_query))
-                tracks_data = None
-                try:
-                    tracks_data = json.loads(result)
-                    tracks_data = tracks_data.get('result')
-                except:
-                    tracks_data = None
-
-                try: # Audio tracks
-                    indexAudio = tracks_data['currentaudiostream']['index']
-                except:
-                    indexAudio = 0
-
-                try: # Subtitles tracks
-                    indexSubs = tracks_data['currentsubtitle']['index']
-                except:
-                    indexSubs = 0
-
-                try: # If subtitles are enabled
-                    subsEnabled = tracks_data['subtitleenabled']
-                except:
-                    subsEnabled = ""
-
-                # Postdata for the audio
-                postdata['AudioStreamIndex'] = indexAudio + 1
-
-                # Postdata for the subtitles
-                if subsEnabled and len(xbmc.Player().getAvailableSubtitleStreams()) > 0:
-
-                    # Number of audiotracks to help get Emby Index
-                    audioTracks = len(xbmc.Player().getAvailableAudioStreams())
-                    mapping = window("%s.indexMapping" % embyitem)
-
-                    if mapping: # Set in playbackutils.py
-
-                        log.debug("Mapping for external subtitles index: %s" % mapping)
-                        externalIndex = json.loads(mapping)
-
-                        if externalIndex.get(str(indexSubs)):
-                            # If the current subtitle is in the mapping
-                            postdata['SubtitleStreamIndex'] = externalIndex[str(indexSubs)]
-                        else:
-                            # Internal subtitle currently selected
-                            subindex = indexSubs - len(externalIndex) + audioTracks + 1
-                            postdata['SubtitleStreamIndex'] = subindex
-
-                    else: # Direct paths enabled scenario or no external subtitles set
-                        postdata['SubtitleStreamIndex'] = indexSubs + audioTracks + 1
-                else:
-                    postdata['SubtitleStreamIndex'] = ""
+                audioIndex, subtitleIndex = self.getStreamIndexes(currentFile)
+                postdata['AudioStreamIndex'] = audioIndex
+                postdata['SubtitleStreamIndex'] = subtitleIndex
 
 
             # Post playback to server
@@ -266,23 +198,8 @@ class Player(xbmc.Player):
             paused = data.get('paused', False)
 
 
-            # Get playback volume
-            volume_query = {
-
-                    "jsonrpc": "2.0",
-                    "id": 1,
-                    "method": "Application.GetProperties",
-                    "params": {
-
-                        "properties": ["volume", "muted"] 
-                    }
-            }
-            result = xbmc.executeJSONRPC(json.dumps(volume_query))
-            result = json.loads(result)
-            result = result.get('result')
-
-            volume = result.get('volume')
-            muted = result.get('muted')
+            # Cached, updated by kodimonitor
+            volume, muted = PlayerState.get_volume()
 
             # Postdata for the websocketclient report
             postdata = {
@@ -301,81 +218,83 @@ class Player(xbmc.Player):
             if playMethod == "Transcode":
                 # Track can't be changed, keep reporting the same index
                 postdata['AudioStreamIndex'] = audioindex
-                postdata['AudioStreamIndex'] = subtitleindex
+                postdata['SubtitleStreamIndex'] = subtitleindex
 
             else:
                 # Get current audio and subtitles track
-                tracks_query = {
-
-                        "jsonrpc": "2.0",
-                        "id": 1,
-                        "method": "Player.GetProperties",
-                        "params": {
-
-                            "playerid": 1,
-                            "properties": ["currentsubtitle","currentaudiostream","subtitleenabled"]
-                        }
-                    }
-                result = xbmc.executeJSONRPC(json.dumps(tracks_query))
-                result = json.loads(result)
-                result = result.get('result')
-
-                try: # Audio tracks
-                    indexAudio = result['currentaudiostream']['index']
-                except (KeyError, TypeError):
-                    indexAudio = 0
-                
-                try: # Subtitles tracks
-                    indexSubs = result['currentsubtitle']['index']
-                except (KeyError, TypeError):
-                    indexSubs = 0
-
-                try: # If subtitles are enabled
-                    subsEnabled = result['subtitleenabled']
-                except (KeyError, TypeError):
-                    subsEnabled = ""
-
-                # Postdata for the audio
-                data['AudioStreamIndex'], postdata['AudioStreamIndex'] = [indexAudio + 1] * 2
-                
-                # Postdata for the subtitles
-                if subsEnabled and len(xbmc.Player().getAvailableSubtitleStreams()) > 0:
-                    
-                    # Number of audiotracks to help get Emby Index
-                    audioTracks = len(xbmc.Player().getAvailableAudioStreams())
-                    mapping = window("emby_%s.indexMapping" % currentFile)
-
-                    if mapping: # Set in PlaybackUtils.py
-                        
-                        log.debug("Mapping for external subtitles index: %s" % mapping)
-                        externalIndex = json.loads(mapping)
-
-                        if externalIndex.get(str(indexSubs)):
-                            # If the current subtitle is in the mapping
-                            subindex = [externalIndex[str(indexSubs)]] * 2
-                            data['SubtitleStreamIndex'], postdata['SubtitleStreamIndex'] = subindex
-                        else:
-                            # Internal subtitle currently selected
-                            subindex = [indexSubs - len(externalIndex) + audioTracks + 1] * 2
-                            data['SubtitleStreamIndex'], postdata['SubtitleStreamIndex'] = subindex
-                    
-                    else: # Direct paths enabled scenario or no external subtitles set
-                        subindex = [indexSubs + audioTracks + 1] * 2
-                        data['SubtitleStreamIndex'], postdata['SubtitleStreamIndex'] = subindex
-                else:
-                    data['SubtitleStreamIndex'], postdata['SubtitleStreamIndex'] = [""] * 2
+                audioindex, subtitleindex = self.getStreamIndexes(currentFile)
+                data['AudioStreamIndex'], postdata['AudioStreamIndex'] = [audioindex] * 2
+                data['SubtitleStreamIndex'], postdata['SubtitleStreamIndex'] = [subtitleindex] * 2
 
             # Report progress via websocketclient
             postdata = json.dumps(postdata)
             log.debug("Report: %s" % postdata)
             self.ws.send_progress_update(postdata)
 
+    def getStreamIndexes(self, currentFile):
+        # Emby audio and subtitle index of the current kodi tracks
+        tracks = PlayerState.get_tracks()
+        indexSubs = tracks['subtitle']
+
+        # Postdata for the audio
+        audioIndex = tracks['audio'] + 1
+
+        # Postdata for the subtitles
+        if tracks['subtitles_enabled'] and tracks['subtitle_count'] > 0:
+
+            # Number of audiotracks to help get Emby Index
+            audioTracks = tracks['audio_count']
+            mapping = window("emby_%s.indexMapping" % currentFile)
+
+            if mapping: # Set in PlaybackUtils.py
+
+                log.debug("Mapping for external subtitles index: %s" % mapping)
+                externalIndex = json.loads(mapping)
+
+                if externalIndex.get(str(indexSubs)):
+                    # If the current subtitle is in the mapping
+                    subtitleIndex = externalIndex[str(indexSubs)]
+                else:
+                    # Internal subtitle currently selected
+                    subtitleIndex = indexSubs - len(externalIndex) + audioTracks + 1
+
+            else: # Direct paths enabled scenario or no external subtitles set
+                subtitleIndex = indexSubs + audioTracks + 1
+        else:
+            subtitleIndex = ""
+
+        return audioIndex, subtitleIndex
+
+    def prefetchNext(self):
+        # Get the next playlist entry ready shortly before the current one ends
+        currentFile = self.currentFile
+        if not currentFile or self.prefetchedFile == currentFile:
+            return
+
+        try:
+            remaining = self.xbmcplayer.getTotalTime() - self.xbmcplayer.getTime()
+        except RuntimeError:
+            return
+
+        if remaining > Prefetch.lead_time:
+            return
+
+        self.prefetchedFile = currentFile
+        playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
+        position = playlist.getposition() + 1
+        if 0 < position < playlist.size():
+            itemId = Prefetch.get_item_id(playlist[position].getfilename())
+            if itemId:
+                log.info("Prefetching next playlist item: %s" % itemId)
+                Prefetch.prefetch(itemId)
+
     @log_error()
     def onPlayBackPaused(self):
 
         currentFile = self.currentFile
         log.debug("PLAYBACK_PAUSED: %s" % currentFile)
 
+        PlayerState.changed()
         if self.played_info.get(currentFile):
             self.played_info[currentFile]['paused'] = True
         
@@ -387,6 +306,7 @@ class Player(xbmc.Player):
         currentFile = self.currentFile
         log.debug("PLAYBACK_RESUMED: %s" % currentFile)
 
+        PlayerState.changed()
         if self.played_info.get(currentFile):
             self.played_info[currentFile]['paused'] = False
         
@@ -397,6 +317,7 @@ class Player(xbmc.Player):
         # Make position when seeking a bit more accurate
         currentFile = self.currentFile
         log.debug("PLAYBACK_SEEK: %s" % currentFile)
+        PlayerState.changed()
 
         if self.played_info.get(currentFile):
             position = None
@@ -499,7 +420,9 @@ class Player(xbmc.Player):
                 dirs, files = xbmcvfs.listdir(path)
                 for file in files:
                     xbmcvfs.delete("%s%s" % (path, file))
-    
+
+        # The resume point changed, a prefetched copy is out of date
+        Prefetch.forget([data['item_id'] for data in self.played_info.values() if data])
         self.played_info.clear()
         
         ga = GoogleAnalytics()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import logging
+import threading
+import time
+
+import xbmc
+
+from utils import JSONRPC
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+
+
+class PlayerState(object):
+    # Kodi player properties reported to the server. They are kept up to date from Kodi
+    # notifications (see kodimonitor), a progress report only queries Kodi after a change.
+    # Tracks are queried again after max_tracks_age for Kodi versions without Player.OnAVChange.
+
+    min_interval = 3
+    max_interval = 30
+    max_tracks_age = 30
+
+    volume = None
+    muted = None
+    tracks = None
+    tracks_time = 0
+    last_change = 0
+
+    _lock = threading.Lock()
+
+
+    @classmethod
+    def reset(cls):
+        # New file playing
+        with cls._lock:
+            cls.volume = None
+            cls.muted = None
+            cls.tracks = None
+            cls.changed()
+
+    @classmethod
+    def changed(cls):
+        cls.last_change = time.time()
+
+    @classmethod
+    def set_volume(cls, volume, muted):
+
+        cls.volume = volume
+        cls.muted = muted
+        cls.changed()
+
+    @classmethod
+    def tracks_changed(cls):
+
+        cls.tracks = None
+        cls.changed()
+
+    @classmethod
+    def get_volume(cls):
+
+        with cls._lock:
+            if cls.volume is None:
+                # Tracks are unknown as well at the start of playback, both in one batch
+                cls._update(tracks=cls.tracks is None)
+
+            return cls.volume, cls.muted
+
+    @classmethod
+    def get_tracks(cls):
+
+        with cls._lock:
+            if cls.tracks is None or time.time() - cls.tracks_time > cls.max_tracks_age:
+                cls._update(volume=cls.volume is None)
+
+            return cls.tracks
+
+    @classmethod
+    def _update(cls, volume=True, tracks=True):
+
+        calls = []
+        if volume:
+            calls.append(('Application.GetProperties', {'properties': ["volume", "muted"]}))
+        if tracks:
+            calls.append(('Player.GetProperties', {
+
+                'playerid': 1,
+                'properties': ["currentsubtitle", "currentaudiostream", "subtitleenabled"]
+            }))
+        results = [response.get('result') or {} for response in JSONRPC.execute_batch(calls)]
+
+        if volume:
+            result = results.pop(0)
+            cls.volume = result.get('volume')
+            cls.muted = result.get('muted')
+
+        if tracks:
+            tracks = cls._get_tracks(results.pop(0))
+            if cls.tracks is not None and tracks != cls.tracks:
+                # Changed without notification
+                cls.changed()
+
+            cls.tracks = tracks
+            cls.tracks_time = time.time()
+
+    @classmethod
+    def _get_tracks(cls, result):
+
+        player = xbmc.Player()
+
+        try: # Audio tracks
+            audio = result['currentaudiostream']['index']
+        except (KeyError, TypeError):
+            audio = 0
+
+        try: # Subtitles tracks
+            subtitle = result['currentsubtitle']['index']
+        except (KeyError, TypeError):
+            subtitle = 0
+
+        return {
+
+            'audio': audio,
+            'subtitle': subtitle,
+            'subtitles_enabled': result.get('subtitleenabled', ""),
+            'audio_count': len(player.getAvailableAudioStreams()),
+            'subtitle_count': len(player.getAvailableSubtitleStreams())
+        }
+
+    @classmethod
+    def get_report_interval(cls):
+        # Frequent reports around a change, sparse during steady playback
+        steady = time.time() - cls.last_change
+        return min(cls.max_interval, max(cls.min_interval, steady / 2))
@@ -47,6 +47,8 @@ class Playlist(object):
                 # Seek to the starting position
                 window('emby_customplaylist.seektime', str(start_at))
 
+            # Library items are added in batches, flushed before a manual add to keep the order
+            pending = []
             for item_id in item_ids:
 
                 log.info("Adding %s to playlist", item_id)
@@ -58,16 +60,21 @@ class Playlist(object):
                 except TypeError:
                     # Item is not found in our database, add item manually
                     log.info("Item was not found in the database, manually adding item")
+                    self.add_items_to_playlist(pending)
+                    pending = []
                     item = self.emby.getItem(item_id)
                     self.add_to_xbmc_playlist(playlist, item)
 
                 else: # Add to playlist
-                    self.add_to_playlist(db_id, media_type)
+                    pending.append((db_id, media_type))
 
                 if not started:
                     started = True
+                    self.add_items_to_playlist(pending)
+                    pending = []
                     player.play(playlist)
 
+            self.add_items_to_playlist(pending)
             self.verify_playlist()
 
     def modify_playlist(self, item_ids):
@@ -80,6 +87,7 @@ class Playlist(object):
 
             playlist = xbmc.PlayList(xbmc.PLAYLIST_VIDEO)
 
+            pending = []
             for item_id in item_ids:
 
                 log.info("Adding %s to playlist", item_id)
@@ -90,12 +98,15 @@ class Playlist(object):
 
                 except TypeError:
                     # Item is not found in our database, add item manually
+                    self.add_items_to_playlist(pending)
+                    pending = []
                     item = self.emby.getItem(item_id)
                     self.add_to_xbmc_playlist(playlist, item)
 
                 else: # Add to playlist
-                    self.add_to_playlist(db_id, media_type)
+                    pending.append((db_id, media_type))
 
+            self.add_items_to_playlist(pending)
             self.verify_playlist()
             
         return playlist
@@ -115,7 +126,7 @@ class Playlist(object):
         playlist.add(playurl, listitem)
 
     @classmethod
-    def add_to_playlist(cls, db_id=None, media_type=None, url=None):
+    def _get_add_params(cls, db_id=None, media_type=None, url=None):
 
         params = {
 
@@ -126,23 +137,40 @@ class Playlist(object):
         else:
             params['item'] = {'file': url}
 
-        log.debug(JSONRPC('Playlist.Add').execute(params))
+        return params
 
     @classmethod
-    def insert_to_playlist(cls, position, db_id=None, media_type=None, url=None):
+    def _get_insert_params(cls, position, db_id=None, media_type=None, url=None):
 
-        params = {
+        params = cls._get_add_params(db_id, media_type, url)
+        params['position'] = position
 
-            'playlistid': 1,
-            'position': position
-        }
-        if db_id is not None:
-            params['item'] = {'%sid' % media_type: int(db_id)}
-        else:
-            params['item'] = {'file': url}
+        return params
+
+    @classmethod
+    def add_to_playlist(cls, db_id=None, media_type=None, url=None):
+        log.debug(JSONRPC('Playlist.Add').execute(cls._get_add_params(db_id, media_type, url)))
+
+    @classmethod
+    def add_items_to_playlist(cls, items):
+        # items is a list of (db_id, media_type), added with a single JSON-RPC batch
+        calls = [('Playlist.Add', cls._get_add_params(db_id, media_type))
+                 for db_id, media_type in items]
+        log.debug(JSONRPC.execute_batch(calls))
 
+    @classmethod
+    def insert_to_playlist(cls, position, db_id=None, media_type=None, url=None):
+
+        params = cls._get_insert_params(position, db_id, media_type, url)
         log.debug(JSONRPC('Playlist.Insert').execute(params))
 
+    @classmethod
+    def insert_urls_to_playlist(cls, position, urls):
+        # Consecutive entries from position, with a single JSON-RPC batch
+        calls = [('Playlist.Insert', cls._get_insert_params(position + i, url=url))
+                 for i, url in enumerate(urls)]
+        log.debug(JSONRPC.execute_batch(calls))
+
     @classmethod
     def verify_playlist(cls):
         log.debug(JSONRPC('Playlist.GetItems').execute({'playlistid': 1}))
@@ -156,3 +184,13 @@ class Playlist(object):
             'position': position
         }
         log.debug(JSONRPC('Playlist.Remove').execute(params))
+
+    @classmethod
+    def replace_in_playlist(cls, position, insert_position, db_id, media_type):
+        # Remove and insert again in one JSON-RPC batch
+        calls = [
+
+            ('Playlist.Remove', {'playlistid': 1, 'position': position}),
+            ('Playlist.Insert', cls._get_insert_params(insert_position, db_id, media_type))
+        ]
+        log.debug(JSONRPC.execute_batch(calls))
@@ -541,9 +541,19 @@ class PlayUtils():
             return None
     
     def getDeviceProfile(self):
+        # Built once per bitrate setting, kept in a window property for the plugin invocations
+        bitrate = self.getBitrate()
+        profile = window('emby_deviceProfile.json')
+        if not profile or profile["MaxStreamingBitrate"] != bitrate*1000:
+            profile = self._build_device_profile(bitrate)
+            window('emby_deviceProfile.json', value=profile)
+
+        return profile
+
+    def _build_device_profile(self, bitrate):
         return {
             "Name": "Kodi",
-            "MaxStreamingBitrate": self.getBitrate()*1000,
+            "MaxStreamingBitrate": bitrate*1000,
             "MusicStreamingTranscodingBitrate": 1280000,
             "TimelineOffsetSeconds": 5,
             
@@ -53,12 +53,13 @@ class DownloadThreader(threading.Thread):
 
 class Read_EmbyServer():
 
-    limitIndex = min(int(settings('limitIndex')), 50)
-    download_limit = int(settings('downloadThreads'))
     download_threads = list()
 
     def __init__(self):
 
+        # Read per instance to follow changes of the settings
+        self.limitIndex = min(int(settings('limitIndex')), 50)
+        self.download_limit = int(settings('downloadThreads'))
         self.doUtils = downloadutils.DownloadUtils()
         self.userId = window('emby_currUser')
         self.server = window('emby_server%s' % self.userId)
@@ -163,7 +164,8 @@ class Read_EmbyServer():
         return items
     
     def getFilteredSection(self, parentid, itemtype=None, sortby="SortName", recursive=True,
-                        limit=None, sortorder="Ascending", filter_type=""):
+                        limit=None, sortorder="Ascending", filter_type="", startindex=None,
+                        basic=False):
         params = {
 
             'ParentId': parentid,
@@ -172,6 +174,7 @@ class Read_EmbyServer():
             'IsVirtualUnaired': False,
             'IsMissing': False,
             'Recursive': recursive,
+            'StartIndex': startindex,
             'Limit': limit,
             'SortBy': sortby,
             'SortOrder': sortorder,
@@ -182,29 +185,58 @@ class Read_EmbyServer():
                 "CommunityRating,OfficialRating,CumulativeRunTimeTicks,"
                 "Metascore,AirTime,DateCreated,MediaStreams,People,Overview,"
                 "CriticRating,CriticRatingSummary,Etag,ShortOverview,ProductionLocations,"
-                "Tags,ProviderIds,ParentId,RemoteTrailers,SpecialEpisodeNumbers"
+                "Tags,ProviderIds,ParentId,RemoteTrailers,SpecialEpisodeNumbers,DateLastSaved"
             )
         }
+        if basic:
+            # Only what is needed to tell if the listing changed
+            params['Fields'] = "Etag,DateLastSaved"
+            params['EnableImages'] = False
+
         return self.doUtils.downloadUrl("{server}/emby/Users/{UserId}/Items?format=json", parameters=params)
     
-    def getTvChannels(self):
-        
+    def getChangedItems(self, min_date, userdata=False):
+        # Ids of the library items saved since min_date, or whose user data changed
         params = {
 
-            'EnableImages': True,
-            'Fields': (
+            'IncludeItemTypes': (
 
-                "Path,Genres,SortName,Studios,Writer,ProductionYear,Taglines,"
-                "CommunityRating,OfficialRating,CumulativeRunTimeTicks,"
-                "Metascore,AirTime,DateCreated,MediaStreams,People,Overview,"
-                "CriticRating,CriticRatingSummary,Etag,ShortOverview,ProductionLocations,"
-                "Tags,ProviderIds,ParentId,RemoteTrailers,SpecialEpisodeNumbers"
-            )
+                "Movie,BoxSet,MusicVideo,Series,Season,Episode,"
+                "MusicArtist,MusicAlbum,Audio"
+            ),
+            'IsVirtualUnaired': False,
+            'IsMissing': False,
+            'Recursive': True,
+            'Fields': "Etag",
+            'EnableImages': False,
+            'EnableUserData': False
+        }
+        if userdata:
+            params['MinDateLastSavedForUser'] = min_date
+        else:
+            params['MinDateLastSaved'] = min_date
+
+        result = self.doUtils.downloadUrl("{server}/emby/Users/{UserId}/Items?format=json", parameters=params)
+        try:
+            return [item['Id'] for item in result['Items']]
+        except (KeyError, TypeError):
+            return []
+
+    def getTvChannels(self, startindex=None, limit=None):
+        # Only the fields shown in the channel listing, with the programme on air
+        params = {
+
+            'StartIndex': startindex,
+            'Limit': limit,
+            'AddCurrentProgram': True,
+            'EnableImages': True,
+            'ImageTypeLimit': 1,
+            'Fields': "Genres,SortName,Overview,DateCreated,MediaStreams,Etag"
         }
         url = "{server}/emby/LiveTv/Channels/?userid={UserId}&format=json"
         return self.doUtils.downloadUrl(url, parameters=params)
     
-    def getTvRecordings(self, groupid):
+    def getTvRecordings(self, groupid, startindex=None, limit=None):
         
         if groupid == "root":
             groupid = ""
@@ -212,18 +244,33 @@ class Read_EmbyServer():
         params = {
 
             'GroupId': groupid,
+            'StartIndex': startindex,
+            'Limit': limit,
             'EnableImages': True,
+            'ImageTypeLimit': 1,
             'Fields': (
                 
-                "Path,Genres,SortName,Studios,Writer,ProductionYear,Taglines,"
-                "CommunityRating,OfficialRating,CumulativeRunTimeTicks,"
-                "Metascore,AirTime,DateCreated,MediaStreams,People,Overview,"
-                "CriticRating,CriticRatingSummary,Etag,ShortOverview,ProductionLocations,"
-                "Tags,ProviderIds,ParentId,RemoteTrailers,SpecialEpisodeNumbers"
+                "Genres,SortName,ProductionYear,CommunityRating,OfficialRating,"
+                "DateCreated,MediaStreams,Overview,ShortOverview,Etag"
             )
         }
         url = "{server}/emby/LiveTv/Recordings/?userid={UserId}&format=json"
         return self.doUtils.downloadUrl(url, parameters=params)
+
+    def getTvPrograms(self, min_start_date, max_start_date, startindex=None, limit=None):
+        # Guide entries of all channels, only name and times
+        params = {
+
+            'MinStartDate': min_start_date,
+            'MaxStartDate': max_start_date,
+            'SortBy': "StartDate",
+            'StartIndex': startindex,
+            'Limit': limit,
+            'EnableImages': False,
+            'EnableUserData': False
+        }
+        url = "{server}/emby/LiveTv/Programs?UserId={UserId}&format=json"
+        return self.doUtils.downloadUrl(url, parameters=params)
     
     def getSection(self, parentid, itemtype=None, sortby="SortName", artist_id=None, basic=False, dialog=None):
 
@@ -320,7 +367,7 @@ class Read_EmbyServer():
         try:
             items = self.get_views(root)['Items']
         except Exception as error:
-            log.debug("Error retrieving views for type: %s error:%s" % (mediatype, error))
+            log.debug("Error retrieving views for type: %s error:%s", mediatype, error)
         else:
             for item in items:
 
@@ -550,7 +597,7 @@ class Read_EmbyServer():
         else:
             log.info("Error processing user rating.")
 
-        log.info("Update user rating to emby for itemid: %s | favourite: %s" % (itemid, favourite))
+        log.info("Update user rating to emby for itemid: %s | favourite: %s", itemid, favourite)
 
     def refreshItem(self, itemid):
 
@@ -14,13 +14,17 @@ import xbmc
 import userclient
 import clientinfo
 import initialsetup
+import ipc
 import kodimonitor
+import loghandler
 import librarysync
+import livetv
 import player
+from player_state import PlayerState
 import websocket_client as wsc
 from views import VideoNodes
-from utils import window, settings, dialog, language as lang
-from ga_client import GoogleAnalytics
+from utils import window, settings, dialog, language as lang, cancel_token
+from ga_client import GoogleAnalytics, Telemetry
 import hashlib
 
 #################################################################################################
@@ -42,6 +46,9 @@ class Service(object):
     websocket_thread = None
     library_running = False
     library_thread = None
+    livetv_running = False
+    livetv_thread = None
+    ipc_thread = None
 
     last_progress = datetime.today()
     lastMetricPing = time.time()
@@ -53,6 +60,7 @@ class Service(object):
         log_level = settings('logLevel')
 
         window('emby_logLevel', value=str(log_level))
+        loghandler.set_level(log_level)
         window('emby_kodiProfile', value=xbmc.translatePath('special://profile'))
         context_menu = "true" if settings('enableContext') == "true" else ""
         window('emby_context', value=context_menu)
@@ -72,7 +80,8 @@ class Service(object):
             "emby_online", "emby_state.json", "emby_serverStatus", "emby_onWake",
             "emby_syncRunning", "emby_dbCheck", "emby_kodiScan",
             "emby_shouldStop", "emby_currUser", "emby_dbScan", "emby_sessionId",
-            "emby_initialScan", "emby_customplaylist", "emby_playbackProps"
+            "emby_initialScan", "emby_customplaylist", "emby_playbackProps",
+            "emby_ipc.port", "emby_ipc.token"
         ]
         for prop in properties:
             window(prop, clear=True)
@@ -100,6 +109,18 @@ class Service(object):
         user_client = self.userclient_thread
         self.websocket_thread = wsc.WebSocketClient()
         self.library_thread = librarysync.LibrarySync()
+        self.livetv_thread = livetv.LiveTVThread()
+
+        # Sync cancellation from Kodi exiting or another process
+        cancel_token.start_watch()
+
+        # Answer plugin invocations from this process
+        try:
+            self.ipc_thread = ipc.IPCServer()
+            self.ipc_thread.start()
+        except Exception as error:
+            log.error("Unable to start the IPC endpoint: %s", error)
+            self.ipc_thread = None
 
         while not self.monitor.abortRequested():
 
@@ -133,9 +154,13 @@ class Service(object):
                             ga.sendEventData("PlayAction", "PlayPing")
 
                         self._report_progress()
+                        self.kodi_player.prefetchNext()
 
                     elif not self.startup:
                         self.startup = self._startup()
+                    else:
+                        # Get the focused item ready for playback
+                        self.monitor.prefetch_focused()
 
                     if not self.websocket_running:
                         # Start the Websocket Client
@@ -145,6 +170,10 @@ class Service(object):
                         # Start the syncing thread
                         self.library_running = True
                         self.library_thread.start()
+                    if not self.livetv_running:
+                        # Start refreshing the live tv listings
+                        self.livetv_running = True
+                        self.livetv_thread.start()
                 else:
 
                     if (user_client.get_user() is None) and self.warn_auth:
@@ -296,8 +325,8 @@ class Service(object):
             difference = datetime.today() - self.last_progress
             difference_seconds = difference.seconds
 
-            # Report progress to Emby server
-            if difference_seconds > 3:
+            # Report progress to Emby server, more often after a change in the player state
+            if difference_seconds > PlayerState.get_report_interval():
                 kodi_player.reportPlayback()
                 self.last_progress = datetime.today()
 
@@ -305,6 +334,7 @@ class Service(object):
                 # Received a remote control command that
                 # requires updating immediately
                 window('emby_command', clear=True)
+                PlayerState.changed()
                 kodi_player.reportPlayback()
                 self.last_progress = datetime.today()
 
@@ -316,6 +346,9 @@ class Service(object):
         #ga = GoogleAnalytics()
         #ga.sendEventData("Application", "Shutdown")     
 
+        # Running syncs stop at their next item
+        cancel_token.cancel()
+
         if self.userclient_running:
             self.userclient_thread.stop_client()
 
@@ -325,4 +358,14 @@ class Service(object):
         if self.websocket_running:
             self.websocket_thread.stop_client()
 
+        if self.livetv_running:
+            self.livetv_thread.stop_thread()
+
+        if self.ipc_thread is not None:
+            self.ipc_thread.stop()
+
+        cancel_token.stop_watch()
+        # Queued GA hits, waits a moment at most
+        Telemetry.stop()
+
         log.warn("======== STOP %s ========", self.addon_name)
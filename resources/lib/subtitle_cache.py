@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import Queue
+
+import requests
+import xbmc
+import xbmcvfs
+
+from utils import window, JSONRPC
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+
+
+class SubtitleDownloadThread(threading.Thread):
+
+    def __init__(self, queue):
+
+        self.queue = queue
+        self.session = requests.Session()
+        threading.Thread.__init__(self)
+
+    def run(self):
+
+        while True:
+            try:
+                stream = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+
+            try:
+                response = self.session.get(stream['url'], timeout=(5, 30))
+                response.raise_for_status()
+
+                temp_file = "%s.tmp" % stream['path']
+                with open(temp_file, 'wb') as subtitle:
+                    subtitle.write(response.content)
+                os.rename(temp_file, stream['path'])
+            except Exception as error:
+                log.error("Failed to download subtitle %s: %s", stream['url'], error)
+
+            stream['done'] = True
+            self.queue.task_done()
+
+
+class SubtitleAttachThread(threading.Thread):
+    # Adds the subtitles that were not ready in time once the file is playing. Best effort,
+    # a daemon so the plugin invocation is not kept alive while it waits for playback.
+
+    def __init__(self, cache, playurl, streams):
+
+        self.cache = cache
+        self.playurl = playurl
+        self.streams = streams
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+    def _is_playing(self, player):
+
+        try:
+            return player.isPlayingVideo() and player.getPlayingFile() == self.playurl
+        except RuntimeError:
+            return False
+
+    def run(self):
+
+        self.cache.wait()
+        player = xbmc.Player()
+        monitor = xbmc.Monitor()
+
+        waited = 0
+        while not self._is_playing(player):
+
+            if waited >= self.cache.attach_timeout or monitor.waitForAbort(1):
+                log.info("Playback not started, late subtitles dropped: %s", self.playurl)
+                return
+            waited += 1
+
+        # Adding a subtitle selects it, the current selection is restored afterwards
+        current = JSONRPC('Player.GetProperties').execute({
+
+            'playerid': 1,
+            'properties': ["currentsubtitle", "subtitleenabled"]
+        }).get('result') or {}
+
+        for stream in self.streams:
+            player.setSubtitles(self.cache.get_subtitle(stream))
+        log.info("Attached %s subtitles after playback started", len(self.streams))
+
+        if current.get('subtitleenabled') and current.get('currentsubtitle'):
+            JSONRPC('Player.SetSubtitle').execute({
+
+                'playerid': 1,
+                'subtitle': current['currentsubtitle']['index']
+            })
+        else:
+            player.showSubtitles(False)
+
+
+class SubtitleCache(object):
+    # External text subtitles of an emby item, downloaded in parallel as soon as the item
+    # is known. Files are kept per item, etag and stream index so playing again reuses them.
+
+    download_limit = 4
+    max_items = 50
+    wait_time = 1
+    attach_timeout = 30
+
+
+    def __init__(self, item):
+
+        self.item = item
+        self.path = xbmc.translatePath("special://temp/emby/subtitles/").decode('utf-8')
+        self.item_path = os.path.join(self.path, item['Id'])
+        self.etag_path = os.path.join(self.item_path, item.get('Etag') or "none")
+
+        self.started = False
+        self.threads = []
+        self.streams = []
+        self._get_streams()
+
+    def _get_streams(self):
+
+        userid = window('emby_currUser')
+        server = window('emby_server%s' % userid)
+        itemid = self.item['Id']
+        try:
+            mediastreams = self.item['MediaSources'][0]['MediaStreams']
+        except (TypeError, KeyError, IndexError):
+            return
+
+        for stream in mediastreams:
+            # Since Emby returns all possible tracks together, have to pull only external subtitles.
+            # IsTextSubtitleStream if true, is available to download from emby.
+            if (stream['Type'] == "Subtitle" and
+                    stream['IsExternal'] and stream['IsTextSubtitleStream']):
+
+                index = stream['Index']
+                url = ("%s/Videos/%s/%s/Subtitles/%s/Stream.srt"
+                       % (server, itemid, itemid, index))
+                path = None
+                if "Language" in stream:
+                    # Kodi reads the language from the file name
+                    path = os.path.join(self.etag_path, "Stream.%s.%s.srt" % (index, stream['Language']))
+
+                self.streams.append({
+
+                    'index': index,
+                    'url': url,
+                    'path': path,
+                    'done': path is None or os.path.exists(path)
+                })
+
+    def _clean(self):
+        # Subtitles of a previous etag and of the least recently played items
+        if os.path.isdir(self.item_path):
+            for etag in os.listdir(self.item_path):
+                if os.path.join(self.item_path, etag) != self.etag_path:
+                    shutil.rmtree(os.path.join(self.item_path, etag), ignore_errors=True)
+
+        items = [os.path.join(self.path, item) for item in os.listdir(self.path)]
+        for item_path in sorted(items, key=os.path.getmtime, reverse=True)[self.max_items:]:
+            shutil.rmtree(item_path, ignore_errors=True)
+
+    def start(self):
+        # Download the missing subtitles in the background
+        if self.started or not self.streams:
+            return
+
+        self.started = True
+        if not xbmcvfs.exists(self.etag_path + "/"):
+            xbmcvfs.mkdirs(self.etag_path)
+        self._clean()
+        os.utime(self.item_path, None)
+
+        queue = Queue.Queue()
+        for stream in self.streams:
+            if not stream['done']:
+                queue.put(stream)
+
+        if not queue.empty():
+            log.info("Downloading %s subtitles for: %s", queue.qsize(), self.item['Id'])
+            self.threads = [SubtitleDownloadThread(queue)
+                            for i in range(min(self.download_limit, queue.qsize()))]
+            for thread in self.threads:
+                thread.start()
+
+    def wait(self, timeout=None):
+
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0, deadline - time.time()))
+
+    def get_subtitle(self, stream):
+        # The local file, the server url if there is none
+        if stream['path'] and os.path.exists(stream['path']):
+            return stream['path']
+
+        return stream['url']
+
+    def get_subtitles(self, playurl):
+        # Returns the subtitles ready within wait_time, the others are attached once playing
+        self.start()
+        self.wait(self.wait_time)
+
+        ready = [stream for stream in self.streams if stream['done']]
+        pending = [stream for stream in self.streams if not stream['done']]
+
+        # Kodi index of the external subtitles, in the order they are added
+        mapping = {}
+        for kodiindex, stream in enumerate(ready + pending):
+            mapping[kodiindex] = stream['index']
+        window('emby_%s.indexMapping' % playurl, value=json.dumps(mapping))
+
+        if pending:
+            log.info("%s subtitles will be attached after playback started", len(pending))
+            SubtitleAttachThread(self, playurl, pending).start()
+
+        return [self.get_subtitle(stream) for stream in ready]
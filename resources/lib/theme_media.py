@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import Queue
+
+import xbmc
+import xbmcvfs
+
+import api
+import database
+import downloadutils
+import embydb_functions as embydb
+import playutils
+import utils
+from utils import settings
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+
+
+class ThemeMediaThread(threading.Thread):
+
+    def __init__(self, queue, function):
+
+        self.queue = queue
+        self.function = function
+        threading.Thread.__init__(self)
+
+    def run(self):
+
+        while True:
+            try:
+                args = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+
+            try:
+                self.function(*args)
+            except Exception as error:
+                log.error(error)
+
+            self.queue.task_done()
+
+
+class ThemeMedia(object):
+    # Export emby theme videos and theme songs as tvtunes.nfo files for TV Tunes.
+    # The md5 of each nfo is kept in themes.json so unchanged nfos are not rewritten.
+
+    def __init__(self, playback):
+
+        self.playback = playback
+        self.thread_limit = int(settings('downloadThreads') or 3)
+
+        self.library = xbmc.translatePath(
+                        "special://profile/addon_data/plugin.video.emby/library/").decode('utf-8')
+        self.hashes_file = os.path.join(self.library, "themes.json")
+
+        self.lock = threading.Lock()
+        self.items = {}
+        self.hashes = {}
+        self.written = 0
+
+    def _run_threaded(self, function, jobs):
+        # Run function for each args tuple in jobs with at most thread_limit threads
+        queue = Queue.Queue()
+        for args in jobs:
+            queue.put(args)
+
+        threads = [ThemeMediaThread(queue, function)
+                   for i in range(min(self.thread_limit, queue.qsize()))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def export(self):
+
+        # Create library directory
+        if not xbmcvfs.exists(self.library):
+            xbmcvfs.mkdir(self.library)
+
+        try:
+            with open(self.hashes_file, 'r') as hashes:
+                self.hashes = json.load(hashes)
+        except (IOError, ValueError):
+            self.hashes = {}
+
+        # Get every user view Id
+        with database.DatabaseConn('emby') as cursor:
+            emby_db = embydb.Embydb_Functions(cursor)
+            viewids = emby_db.getViews()
+
+        # Get Ids with Theme Videos or Theme Songs
+        self._run_threaded(self._get_items, [(view, theme_filter)
+                                             for view in viewids
+                                             for theme_filter in ("HasThemeVideo", "HasThemeSong")])
+        log.info("Found %s items with theme media", len(self.items))
+
+        self._run_threaded(self._export_item, self.items.items())
+
+        with open(self.hashes_file, 'w') as hashes:
+            json.dump(self.hashes, hashes)
+
+        log.info("Theme media nfo files written: %s/%s", self.written, len(self.items))
+
+    def _get_items(self, view, theme_filter):
+
+        url = "{server}/emby/Users/{UserId}/Items?format=json"
+        params = {
+
+            'ParentId': view,
+            theme_filter: True
+        }
+        result = downloadutils.DownloadUtils().downloadUrl(url, parameters=params)
+        if result and result['TotalRecordCount']:
+            with self.lock:
+                for item in result['Items']:
+                    self.items[item['Id']] = utils.normalize_string(item['Name'].encode('utf-8'))
+
+    def _get_play_url(self, theme):
+
+        if self.playback == "DirectPlay":
+            if theme['Type'] == "Audio":
+                return api.API(theme).get_file_path()
+            return playutils.PlayUtils(theme).directPlay()
+
+        return playutils.PlayUtils(theme).directStream()
+
+    def _export_item(self, item_id, folder_name):
+
+        # Theme videos and songs in a single request
+        url = "{server}/emby/Items/%s/ThemeMedia?UserId={UserId}&format=json" % item_id
+        result = downloadutils.DownloadUtils().downloadUrl(url)
+        if not result:
+            return
+
+        themes = (result['ThemeVideosResult']['Items'] +
+                  result['ThemeSongsResult']['Items'])
+        pathstowrite = ""
+        # May be more than one theme
+        for theme in themes:
+            pathstowrite += ('<file>%s</file>' % self._get_play_url(theme).encode('utf-8'))
+
+        content = '<tvtunes>%s</tvtunes>' % pathstowrite
+        content_hash = hashlib.md5(content).hexdigest()
+
+        nfo_path = xbmc.translatePath(
+            "special://profile/addon_data/plugin.video.emby/library/%s/" % folder_name)
+        # Where to put the nfos
+        nfo_file = "%s%s" % (nfo_path, "tvtunes.nfo")
+
+        if self.hashes.get(item_id) == content_hash and xbmcvfs.exists(nfo_file):
+            return
+
+        # Create folders for each content
+        if not xbmcvfs.exists(nfo_path):
+            xbmcvfs.mkdir(nfo_path)
+
+        # Create nfo and write themes to it
+        nfo = xbmcvfs.File(nfo_file, 'w')
+        nfo.write(content)
+        nfo.close()
+
+        with self.lock:
+            self.hashes[item_id] = content_hash
+            self.written += 1
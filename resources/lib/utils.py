@@ -5,10 +5,12 @@
 import inspect
 import json
 import logging
+import re
 import sqlite3
 import StringIO
 import os
 import sys
+import threading
 import time
 import unicodedata
 import xml.etree.ElementTree as etree
@@ -28,34 +30,138 @@ log = logging.getLogger("EMBY."+__name__)
 #################################################################################################
 # Main methods
 
+class Snapshot(object):
+    # In process cache of the addon settings and of the window properties read per item,
+    # request or log record. Settings are read through one Addon object per snapshot, older
+    # Kodi versions don't see changes through an existing one. The snapshot is dropped by
+    # invalidate() (KodiMonitor.onSettingsChanged), after max_age, and per entry when this
+    # process changes it. Cached properties are set by the service, other processes only
+    # read them. Decoded .json values are shared, callers must not modify them.
+
+    max_age = 10
+    properties = re.compile(r"^emby_(currUser|logLevel|accessToken|server(?!Status))")
+
+    _time = 0
+    _addon = None
+    _settings = {}
+    _properties = {}
+    _windows = {}
+    _matched = {}
+
+
+    @classmethod
+    def invalidate(cls):
+
+        cls._time = time.time()
+        cls._addon = None
+        cls._settings = {}
+        cls._properties = {}
+
+    @classmethod
+    def _check_age(cls):
+
+        if time.time() - cls._time > cls.max_age:
+            cls.invalidate()
+
+    @classmethod
+    def get_addon(cls):
+
+        addon = cls._addon
+        if addon is None:
+            addon = cls._addon = xbmcaddon.Addon(id='plugin.video.emby')
+
+        return addon
+
+    @classmethod
+    def get_setting(cls, setting):
+
+        cls._check_age()
+        try:
+            return cls._settings[setting]
+        except KeyError:
+            value = cls._settings[setting] = cls.get_addon().getSetting(setting)
+            return value
+
+    @classmethod
+    def set_setting(cls, setting, value):
+
+        xbmcaddon.Addon(id='plugin.video.emby').setSetting(setting, value)
+        cls._settings.pop(setting, None)
+
+    @classmethod
+    def get_window(cls, window_id):
+
+        try:
+            return cls._windows[window_id]
+        except KeyError:
+            window_ = cls._windows[window_id] = xbmcgui.Window(window_id)
+            return window_
+
+    @classmethod
+    def is_cached(cls, property_, window_id):
+
+        if window_id != 10000:
+            return False
+        try:
+            return cls._matched[property_]
+        except KeyError:
+            matched = cls._matched[property_] = cls.properties.match(property_) is not None
+            return matched
+
+    @classmethod
+    def get_property(cls, property_):
+
+        cls._check_age()
+        return cls._properties[property_]
+
+    @classmethod
+    def set_property(cls, property_, value):
+        cls._properties[property_] = value
+
+    @classmethod
+    def forget_property(cls, property_):
+        cls._properties.pop(property_, None)
+
+
 def window(property_, value=None, clear=False, window_id=10000):
     # Get or set window property
-    WINDOW = xbmcgui.Window(window_id)
+    WINDOW = Snapshot.get_window(window_id)
+    cached = Snapshot.is_cached(property_, window_id)
 
     if clear:
         WINDOW.clearProperty(property_)
+        if cached:
+            Snapshot.forget_property(property_)
     elif value is not None:
         if ".json" in property_:
             value = json.dumps(value)
         WINDOW.setProperty(property_, value)
+        if cached:
+            Snapshot.forget_property(property_)
     else:
+        if cached:
+            try:
+                return Snapshot.get_property(property_)
+            except KeyError:
+                pass
+
         result = WINDOW.getProperty(property_)
         if result and ".json" in property_:
             result = json.loads(result)
+        if cached:
+            Snapshot.set_property(property_, result)
         return result
 
 def settings(setting, value=None):
     # Get or add addon setting
-    addon = xbmcaddon.Addon(id='plugin.video.emby')
-
     if value is not None:
-        addon.setSetting(setting, value)
+        Snapshot.set_setting(setting, value)
     else: # returns unicode object
-        return addon.getSetting(setting)
+        return Snapshot.get_setting(setting)
 
 def language(string_id):
     # Central string retrieval - unicode
-    return xbmcaddon.Addon(id='plugin.video.emby').getLocalizedString(string_id)
+    return Snapshot.get_addon().getLocalizedString(string_id)
 
 def dialog(type_, *args, **kwargs):
 
@@ -108,17 +214,101 @@ class JSONRPC(object):
         self.params = params
         return json.loads(xbmc.executeJSONRPC(self._query()))
 
+    @classmethod
+    def execute_batch(cls, calls):
+        # Several methods in a single request, calls is a list of (method, params).
+        # Responses are matched by id and returned in the order of the calls.
+        if not calls:
+            return []
+
+        batch = []
+        for id_, (method, params) in enumerate(calls, 1):
+            query = {
+
+                'jsonrpc': cls.jsonrpc,
+                'id': id_,
+                'method': method
+            }
+            if params is not None:
+                query['params'] = params
+
+            batch.append(query)
+
+        results = json.loads(xbmc.executeJSONRPC(json.dumps(batch)))
+        if isinstance(results, dict):
+            # Single response, the batch itself was rejected
+            results = [results]
+
+        responses = dict((result.get('id'), result) for result in results)
+        return [responses.get(id_, responses.get(None, {})) for id_ in range(1, len(calls)+1)]
+
 #################################################################################################
 # Database related methods
 
+class CancelWatcher(threading.Thread):
+    # Sets the token when Kodi exits or another process sets emby_shouldStop
+
+    interval = 0.5
+
+    def __init__(self, token):
+
+        self.token = token
+        self.stop_event = threading.Event()
+        threading.Thread.__init__(self)
+
+    def run(self):
+
+        monitor = xbmc.Monitor()
+        while not self.stop_event.is_set() and not self.token.cancelled:
+
+            if monitor.waitForAbort(self.interval) or window('emby_shouldStop') == "true":
+                self.token.cancel()
+
+
+class CancelToken(object):
+    # Cancellation of the sync shared by the threads of a process. Set by the service,
+    # KodiMonitor and db_reset, checked by the sync loops with a single attribute read.
+    # emby_shouldStop carries it to the other processes, where a CancelWatcher picks it up
+    # while the service or a sync run from the plugin is watching. A cancelled token stays
+    # cancelled, the service clears emby_shouldStop when it starts.
+
+    def __init__(self):
+
+        self.cancelled = False
+        self._event = threading.Event()
+        self._watcher = None
+
+    def cancel(self):
+
+        if not self.cancelled:
+            log.info("Sync cancelled")
+        self.cancelled = True
+        self._event.set()
+        window('emby_shouldStop', value="true")
+
+    def wait(self, timeout=None):
+        # Returns True if cancelled within timeout
+        self._event.wait(timeout)
+        return self.cancelled
+
+    def start_watch(self):
+
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = CancelWatcher(self)
+            self._watcher.start()
+
+    def stop_watch(self):
+
+        if self._watcher is not None:
+            self._watcher.stop_event.set()
+            self._watcher.join()
+            self._watcher = None
+
+cancel_token = CancelToken()
+
 def should_stop():
     # Checkpoint during the syncing process
-    if xbmc.Monitor().abortRequested():
-        return True
-    elif window('emby_shouldStop') == "true":
-        return True
-    else: # Keep going
-        return False
+    return cancel_token.cancelled
 
 #################################################################################################
 # Utility methods
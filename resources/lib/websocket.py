@@ -45,6 +45,13 @@ import time
 import logging
 import traceback
 import sys
+import zlib
+
+try:
+    # optional C implementation of the payload masking
+    from wsaccel.xormask import XorMaskerSimple
+except ImportError:
+    XorMaskerSimple = None
 
 """
 websocket python client.
@@ -196,7 +203,8 @@ def create_connection(url, timeout=None, **options):
     """
     sockopt = options.get("sockopt", [])
     sslopt = options.get("sslopt", {})
-    websock = WebSocket(sockopt=sockopt, sslopt=sslopt)
+    enable_compression = options.get("enable_compression", True)
+    websock = WebSocket(sockopt=sockopt, sslopt=sslopt, enable_compression=enable_compression)
     websock.settimeout(timeout if timeout is not None else default_timeout)
     websock.connect(url, **options)
     return websock
@@ -220,6 +228,86 @@ _HEADERS_TO_CHECK = {
     }
 
 
+class PerMessageDeflate(object):
+    """
+    permessage-deflate extension.
+    see http://tools.ietf.org/html/rfc7692
+
+    params: parameters of the extension accepted by the server.
+    """
+
+    # header offered in the handshake. the server may limit the window of
+    # our compressor with client_max_window_bits.
+    OFFER = "permessage-deflate; client_max_window_bits"
+
+    # messages shorter than this are sent uncompressed.
+    min_length = 128
+    compression_level = 6
+
+    def __init__(self, params):
+        self.server_no_context_takeover = "server_no_context_takeover" in params
+        self.client_no_context_takeover = "client_no_context_takeover" in params
+        self.client_max_window_bits = int(params.get("client_max_window_bits") or 15)
+        self._compressor = None
+        self._decompressor = None
+
+    @classmethod
+    def from_header(cls, header):
+        """
+        parse the sec-websocket-extensions response header.
+        return value: PerMessageDeflate object, None if the server declined it.
+        """
+        if not header:
+            return None
+
+        extensions = [extension.strip() for extension in header.split(",")]
+        if len(extensions) > 1:
+            raise WebSocketException("Unexpected extensions: %s" % header)
+
+        values = [value.strip() for value in extensions[0].split(";")]
+        if values[0] != "permessage-deflate":
+            raise WebSocketException("Unexpected extension: %s" % values[0])
+
+        params = {}
+        for value in values[1:]:
+            name, _, param = value.partition("=")
+            name = name.strip()
+            if name not in ("server_no_context_takeover", "client_no_context_takeover",
+                            "server_max_window_bits", "client_max_window_bits"):
+                raise WebSocketException("Unexpected permessage-deflate parameter: %s" % name)
+            params[name] = param.strip().strip('"')
+
+        return cls(params)
+
+    def compress(self, data):
+        """
+        compress a message.
+        return value: compressed data, None to send the message as is.
+        """
+        if len(data) < self.min_length or self.client_max_window_bits < 9:
+            # zlib can't compress with a window of 256 bytes
+            return None
+
+        if self._compressor is None or self.client_no_context_takeover:
+            self._compressor = zlib.compressobj(self.compression_level, zlib.DEFLATED,
+                                                -self.client_max_window_bits)
+        data = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        # The tail of the sync flush is implied, see section 7.2.1
+        return data[:-4]
+
+    def decompress(self, data):
+        """
+        decompress a message received with rsv1 set.
+        """
+        if self._decompressor is None or self.server_no_context_takeover:
+            # The largest window decodes any window used by the server
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        try:
+            return self._decompressor.decompress(data + "\x00\x00\xff\xff")
+        except zlib.error as e:
+            raise WebSocketException("Invalid compressed message: %s" % e)
+
+
 class ABNF(object):
     """
     ABNF frame class.
@@ -322,7 +410,18 @@ class ABNF(object):
 
     def _get_masked(self, mask_key):
         s = ABNF.mask(mask_key, self.data)
-        return mask_key + "".join(s)
+        return mask_key + s
+
+    # translate tables xoring every byte with a given byte, built on first use.
+    _xor_tables = {}
+
+    @staticmethod
+    def _get_xor_table(key):
+        table = ABNF._xor_tables.get(key)
+        if table is None:
+            table = "".join(chr(i ^ ord(key)) for i in xrange(256))
+            ABNF._xor_tables[key] = table
+        return table
 
     @staticmethod
     def mask(mask_key, data):
@@ -333,6 +432,23 @@ class ABNF(object):
 
         data: data to mask/unmask.
         """
+        if XorMaskerSimple is not None:
+            return XorMaskerSimple(mask_key).process(data)
+
+        # Every 4th byte uses the same key byte, so each of the 4 strides is
+        # xored at once with a translate table instead of byte by byte.
+        if isinstance(data, bytearray):
+            data = str(data)
+        masked = bytearray(len(data))
+        for i in xrange(min(4, len(data))):
+            masked[i::4] = data[i::4].translate(ABNF._get_xor_table(mask_key[i]))
+        return str(masked)
+
+    @staticmethod
+    def mask_simple(mask_key, data):
+        """
+        mask or unmask data, byte by byte. reference for ABNF.mask.
+        """
         _m = array.array("B", mask_key)
         _d = array.array("B", data)
         for i in xrange(len(_d)):
@@ -363,9 +479,13 @@ class WebSocket(object):
     sockopt: values for socket.setsockopt.
         sockopt must be tuple and each element is argument of sock.setscokopt.
     sslopt: dict object for ssl socket option.
+    enable_compression: offer the permessage-deflate extension to the server.
     """
 
-    def __init__(self, get_mask_key=None, sockopt=None, sslopt=None):
+    # size of the receive buffer, the socket is read by chunks of up to this size.
+    recv_bufsize = 65536
+
+    def __init__(self, get_mask_key=None, sockopt=None, sslopt=None, enable_compression=True):
         """
         Initalize WebSocket object.
         """
@@ -379,9 +499,20 @@ class WebSocket(object):
             self.sock.setsockopt(*opts)
         self.sslopt = sslopt
         self.get_mask_key = get_mask_key
+        self.enable_compression = enable_compression
+        # PerMessageDeflate object once negotiated
+        self.compression = None
+        # Messages have to reach the socket in the order they are compressed
+        self._send_lock = threading.Lock()
         # Buffers over the packets from the layer beneath until desired amount
-        # bytes of bytes are received.
-        self._recv_buffer = []
+        # bytes of bytes are received. Bytes from _recv_start to _recv_end are
+        # pending, the buffer is never resized so views on it stay valid.
+        self._recv_buffer = bytearray(self.recv_bufsize)
+        self._recv_view = memoryview(self._recv_buffer)
+        self._recv_start = 0
+        self._recv_end = 0
+        # Payload larger than the buffer, read in place: [buffer, view, received]
+        self._recv_large = None
         # These buffer over the build-up of a single frame.
         self._frame_header = None
         self._frame_length = None
@@ -473,6 +604,8 @@ class WebSocket(object):
         key = _create_sec_websocket_key()
         headers.append("Sec-WebSocket-Key: %s" % key)
         headers.append("Sec-WebSocket-Version: %s" % VERSION)
+        if self.enable_compression:
+            headers.append("Sec-WebSocket-Extensions: %s" % PerMessageDeflate.OFFER)
         if "header" in options:
             headers.extend(options["header"])
 
@@ -496,6 +629,18 @@ class WebSocket(object):
             self.close()
             raise WebSocketException("Invalid WebSocket Header")
 
+        extensions = resp_headers.get("sec-websocket-extensions")
+        if extensions and not self.enable_compression:
+            self.close()
+            raise WebSocketException("Extension not requested: %s" % extensions)
+        try:
+            self.compression = PerMessageDeflate.from_header(extensions)
+        except WebSocketException:
+            self.close()
+            raise
+        if traceEnabled:
+            logger.debug("permessage-deflate: %s" % (self.compression is not None))
+
         self.connected = True
 
     def _validate_header(self, headers, key):
@@ -558,13 +703,19 @@ class WebSocket(object):
         frame = ABNF.create_frame(payload, opcode)
         if self.get_mask_key:
             frame.get_mask_key = self.get_mask_key
-        data = frame.format()
-        length = len(data)
-        if traceEnabled:
-            logger.debug("send: " + repr(data))
-        while data:
-            l = self._send(data)
-            data = data[l:]
+        with self._send_lock:
+            if self.compression and opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
+                compressed = self.compression.compress(frame.data)
+                if compressed is not None:
+                    frame.data = compressed
+                    frame.rsv1 = 1
+            data = frame.format()
+            length = len(data)
+            if traceEnabled:
+                logger.debug("send: " + repr(data))
+            while data:
+                l = self._send(data)
+                data = data[l:]
         return length
 
     def send_binary(self, payload):
@@ -611,14 +762,26 @@ class WebSocket(object):
                 if frame.opcode == ABNF.OPCODE_CONT and not self._cont_data:
                     raise WebSocketException("Illegal frame")
                 if self._cont_data:
-                    self._cont_data[1] += frame.data
+                    if frame.rsv1:
+                        raise WebSocketException("Illegal frame")
+                    self._cont_data[1].append(frame.data)
                 else:
-                    self._cont_data = [frame.opcode, frame.data]
+                    if frame.rsv1 and not self.compression:
+                        raise WebSocketException("Compressed frame without extension")
+                    # rsv1 of the first frame marks a compressed message
+                    self._cont_data = [frame.opcode, [frame.data], frame.rsv1]
                 
                 if frame.fin:
-                    data = self._cont_data
+                    # Fragments are joined once, into a buffer of the message size
+                    opcode, fragments, compressed = self._cont_data
                     self._cont_data = None
-                    return data
+                    if len(fragments) == 1:
+                        data = fragments[0]
+                    else:
+                        data = "".join(fragments)
+                    if compressed:
+                        data = self.compression.decompress(data)
+                    return [opcode, data]
             elif frame.opcode == ABNF.OPCODE_CLOSE:
                 self.send_close()
                 return (frame.opcode, None)
@@ -746,30 +909,82 @@ class WebSocket(object):
             raise WebSocketConnectionClosedException()
         return bytes
 
+    def _recv_into(self, view):
+        try:
+            length = self.sock.recv_into(view)
+        except socket.timeout as e:
+            raise WebSocketTimeoutException(e.args[0])
+        except SSLError as e:
+            if e.args[0] == "The read operation timed out":
+                raise WebSocketTimeoutException(e.args[0])
+            else:
+                raise
+        if not length:
+            raise WebSocketConnectionClosedException()
+        return length
+
+    def _compact_buffer(self):
+        """
+        move the pending bytes to the front of the receive buffer.
+        """
+        pending = self._recv_end - self._recv_start
+        self._recv_buffer[:pending] = self._recv_buffer[self._recv_start:self._recv_end]
+        self._recv_start = 0
+        self._recv_end = pending
+
+    def _fill_buffer(self):
+        """
+        read as much as the socket has into the free end of the receive buffer.
+        """
+        if self._recv_end == len(self._recv_buffer):
+            self._compact_buffer()
+        self._recv_end += self._recv_into(self._recv_view[self._recv_end:])
 
     def _recv_strict(self, bufsize):
-        shortage = bufsize - sum(len(x) for x in self._recv_buffer)
-        while shortage > 0:
-            bytes = self._recv(shortage)
-            self._recv_buffer.append(bytes)
-            shortage -= len(bytes)
-        unified = "".join(self._recv_buffer)
-        if shortage == 0:
-            self._recv_buffer = []
-            return unified
-        else:
-            self._recv_buffer = [unified[bufsize:]]
-            return unified[:bufsize]
+        if bufsize > len(self._recv_buffer):
+            return self._recv_large_payload(bufsize)
+
+        while self._recv_end - self._recv_start < bufsize:
+            if self._recv_start + bufsize > len(self._recv_buffer):
+                # Not enough room behind the pending bytes
+                self._compact_buffer()
+            self._fill_buffer()
+
+        data = self._recv_view[self._recv_start:self._recv_start + bufsize].tobytes()
+        self._recv_start += bufsize
+        if self._recv_start == self._recv_end:
+            self._recv_start = self._recv_end = 0
+        return data
 
+    def _recv_large_payload(self, bufsize):
+        """
+        receive a payload larger than the receive buffer straight into a buffer
+        of its size. progress is kept when the socket times out.
+        """
+        if self._recv_large is None:
+            payload = bytearray(bufsize)
+            view = memoryview(payload)
+            pending = min(self._recv_end - self._recv_start, bufsize)
+            view[:pending] = self._recv_view[self._recv_start:self._recv_start + pending]
+            self._recv_start = self._recv_end = 0
+            self._recv_large = [payload, view, pending]
+
+        payload, view, received = self._recv_large
+        while received < bufsize:
+            received += self._recv_into(view[received:])
+            self._recv_large[2] = received
+
+        self._recv_large = None
+        return str(payload)
 
     def _recv_line(self):
-        line = []
         while True:
-            c = self._recv(1)
-            line.append(c)
-            if c == "\n":
-                break
-        return "".join(line)
+            end = self._recv_buffer.find("\n", self._recv_start, self._recv_end)
+            if end != -1:
+                return self._recv_strict(end + 1 - self._recv_start)
+            if self._recv_start == 0 and self._recv_end == len(self._recv_buffer):
+                raise WebSocketException("Header line too long")
+            self._fill_buffer()
 
 
 class WebSocketApp(object):
@@ -779,7 +994,8 @@ class WebSocketApp(object):
     """
     def __init__(self, url, header=[],
                  on_open=None, on_message=None, on_error=None,
-                 on_close=None, keep_running=True, get_mask_key=None):
+                 on_close=None, keep_running=True, get_mask_key=None,
+                 enable_compression=True):
         """
         url: websocket url.
         header: custom header for websocket handshake.
@@ -799,6 +1015,7 @@ class WebSocketApp(object):
          keep running, defaults to True
        get_mask_key: a callable to produce new mask keys, see the WebSocket.set_mask_key's
          docstring for more information
+       enable_compression: offer the permessage-deflate extension to the server.
         """
         self.url = url
         self.header = header
@@ -808,6 +1025,7 @@ class WebSocketApp(object):
         self.on_close = on_close
         self.keep_running = keep_running
         self.get_mask_key = get_mask_key
+        self.enable_compression = enable_compression
         self.sock = None
 
     def send(self, data, opcode=ABNF.OPCODE_TEXT):
@@ -855,7 +1073,8 @@ class WebSocketApp(object):
         self.keep_running = True
 
         try:
-            self.sock = WebSocket(self.get_mask_key, sockopt=sockopt, sslopt=sslopt)
+            self.sock = WebSocket(self.get_mask_key, sockopt=sockopt, sslopt=sslopt,
+                                  enable_compression=self.enable_compression)
             self.sock.settimeout(default_timeout)
             self.sock.connect(self.url, header=self.header)
             self._callback(self.on_open)
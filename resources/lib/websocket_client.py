@@ -4,16 +4,22 @@
 
 import json
 import logging
+import random
 import threading
+import time
+import Queue
 import websocket
+from datetime import datetime
 
 import xbmc
 
 import clientinfo
 import downloadutils
 import librarysync
+import livetv
 import playlist
 import userclient
+from playback_prep import Prefetch
 from utils import window, settings, dialog, language as lang, JSONRPC
 from ga_client import log_error
 
@@ -24,12 +30,71 @@ log = logging.getLogger("EMBY."+__name__)
 ##################################################################################################
 
 
+class DispatchWorker(threading.Thread):
+    # Handles one kind of server messages, away from the socket thread
+
+    def __init__(self, name, handler, size):
+
+        self.queue = Queue.Queue(size)
+        self.handler = handler
+        threading.Thread.__init__(self, name="EMBY.websocket.%s" % name)
+        self.daemon = True
+
+    def run(self):
+
+        while True:
+            message = self.queue.get()
+            if message is None:
+                break
+
+            try:
+                self.handler(message)
+            except Exception:
+                # Logged by the handler
+                pass
+
+    def stop(self):
+
+        try:
+            self.queue.put_nowait(None)
+        except Queue.Full:
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
 class WebSocketClient(threading.Thread):
 
     _shared_state = {}
 
     _client = None
     _stop_websocket = False
+    # Last connection or message, changes since then are caught up after a reconnect
+    _last_seen = None
+
+    # Reconnect delay in seconds, doubled after each failed connection
+    retry_min = 1
+    retry_max = 5 * 60
+    # A connection open for this long resets the delay
+    stable_time = 60
+    # Catch up from slightly before the last message, the server clock may differ
+    catch_up_overlap = 2 * 60
+
+    # Messages are handled by a worker per kind, remote control commands are never
+    # queued behind library changes. Other message types go to the library worker.
+    dispatch_types = {
+
+        'control': ("Playstate", "GeneralCommand", "ServerRestarting", "ServerShuttingDown",
+                    "TimerCreated", "TimerCancelled", "SeriesTimerCreated",
+                    "SeriesTimerCancelled", "ScheduledTaskEnded"),
+        'play': ("Play",)
+    }
+    dispatch_size = {
+
+        'control': 50,
+        'play': 10,
+        'library': 500
+    }
+    _workers = {}
 
 
     def __init__(self):
@@ -61,8 +126,10 @@ class WebSocketClient(threading.Thread):
         except Exception as error:
             log.exception(error)
 
-    @log_error()
     def on_message(self, ws, message):
+        # Socket thread, only routes the message to its worker
+        self._last_seen = time.time()
+        self.health['messages'] += 1
 
         result = json.loads(message)
         message_type = result['MessageType']
@@ -72,6 +139,43 @@ class WebSocketClient(threading.Thread):
             # Mute certain events
             log.info("Message: %s", message)
 
+        for kind, message_types in self.dispatch_types.items():
+            if message_type in message_types:
+                break
+        else:
+            kind = 'library'
+
+        try:
+            self._workers[kind].queue.put_nowait(result)
+        except Queue.Full:
+            log.warn("Dispatch queue %s is full, message dropped: %s", kind, message_type)
+            if kind == 'library':
+                # The library changes are requested again by the library sync
+                self._request_catch_up(time.time())
+
+    def _start_workers(self):
+
+        for kind, size in self.dispatch_size.items():
+            self._workers[kind] = DispatchWorker(kind, self._process_message, size)
+            self._workers[kind].start()
+
+    def _stop_workers(self):
+
+        for worker in self._workers.values():
+            worker.stop()
+
+    def _request_catch_up(self, last_seen):
+
+        since = datetime.utcfromtimestamp(last_seen - self.catch_up_overlap)
+        since = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+        pending = self.library_sync.catch_up_since
+        self.library_sync.catch_up_since = min(pending, since) if pending else since
+
+    @log_error()
+    def _process_message(self, result):
+
+        message_type = result['MessageType']
+
         if message_type == 'Play':
             # A remote control play command has been sent from the server.
             data = result['Data']
@@ -86,6 +190,7 @@ class WebSocketClient(threading.Thread):
             # A user changed their personal rating for an item, or their playstate was updated
             data = result['Data']
             userdata_list = data['UserDataList']
+            Prefetch.forget([userdata['ItemId'] for userdata in userdata_list])
             self.library_sync.triage_items("userdata", userdata_list)
 
         elif message_type == "LibraryChanged":
@@ -96,6 +201,14 @@ class WebSocketClient(threading.Thread):
             data = result['Data']
             self._general_commands(data)
 
+        elif message_type in ("TimerCreated", "TimerCancelled",
+                              "SeriesTimerCreated", "SeriesTimerCancelled"):
+            # Recordings changed, the cached live tv listings are refreshed
+            livetv.LiveTV.request_refresh()
+
+        elif message_type == "ScheduledTaskEnded" and result['Data'].get('Key') == "RefreshGuide":
+            livetv.LiveTV.request_refresh()
+
         elif message_type == "ServerRestarting":
             self._server_restarting()
 
@@ -303,10 +416,21 @@ class WebSocketClient(threading.Thread):
         log.debug("closed")
 
     def on_open(self, ws):
+
+        if self._last_seen is not None:
+            # Reconnected, the events sent in between are requested by the library sync
+            self._request_catch_up(self._last_seen)
+
+        self._last_seen = time.time()
+        self.health['connects'] += 1
+        self.health['connected_since'] = self._last_seen
+        window('emby_websocketHealth.json', value=self.health)
+
         self.doutils.post_capabilities(self.device_id)
 
     def on_error(self, ws, error):
 
+        self.health['last_error'] = str(error)
         if "10061" in str(error):
             # Server is offline
             pass
@@ -328,27 +452,78 @@ class WebSocketClient(threading.Thread):
         websocket_url = "%s?api_key=%s&deviceId=%s" % (server, token, self.device_id)
         log.info("websocket url: %s", websocket_url)
 
+        # Can be turned off for servers or proxies mishandling compressed frames
+        compression = settings('websocketCompression') != "false"
         self._client = websocket.WebSocketApp(websocket_url,
                                               on_message=self.on_message,
                                               on_error=self.on_error,
-                                              on_close=self.on_close)
+                                              on_close=self.on_close,
+                                              enable_compression=compression)
         self._client.on_open = self.on_open
         log.warn("----===## Starting WebSocketClient ##===----")
 
+        self.health = {
+
+            'connects': 0,
+            'disconnects': 0,
+            'failures': 0,
+            'messages': 0,
+            'connected_since': None,
+            'last_error': None,
+            'retry_delay': None
+        }
+        self._start_workers()
+
         while not self.monitor.abortRequested():
 
             if window('emby_online') == "true":
                 self._client.run_forever(ping_interval=10)
+                delay = self._disconnected()
+            else:
+                delay = 5
 
-            if self._stop_websocket:
-                break
-
-            if self.monitor.waitForAbort(5):
-                # Abort was requested, exit
+            if self._stop_websocket or self._wait(delay):
                 break
 
+        self._stop_workers()
         log.warn("##===---- WebSocketClient Stopped ----===##")
 
+    def _disconnected(self):
+        # Returns the delay before connecting again, with jitter so clients
+        # don't all reconnect at the same time after a server restart
+        health = self.health
+        connected = health['connected_since']
+        if connected is not None:
+            health['disconnects'] += 1
+            duration = time.time() - connected
+            health['connected_since'] = None
+        else:
+            duration = 0
+
+        if duration >= self.stable_time:
+            health['failures'] = 0
+        else:
+            health['failures'] += 1
+
+        delay = min(self.retry_max, self.retry_min * 2 ** health['failures'])
+        health['retry_delay'] = random.uniform(delay / 2.0, delay)
+        window('emby_websocketHealth.json', value=health)
+
+        if not self._stop_websocket:
+            log.info("Websocket disconnected after %ss, %s messages received, retry in %.1fs (%s failed)",
+                     int(duration), health['messages'], health['retry_delay'], health['failures'])
+
+        return health['retry_delay']
+
+    def _wait(self, delay):
+        # Returns True if Kodi is exiting or the client was stopped while waiting
+        deadline = time.time() + delay
+        while time.time() < deadline:
+            if self._stop_websocket or self.monitor.waitForAbort(min(1, deadline - time.time())):
+                return True
+
+        return self._stop_websocket
+
     def stop_client(self):
 
         self._stop_websocket = True
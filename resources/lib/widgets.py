@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+
+import logging
+import time
+
+import xbmc
+
+from database import DatabaseConn
+from utils import window, settings, JSONRPC
+
+#################################################################################################
+
+log = logging.getLogger("EMBY."+__name__)
+
+#################################################################################################
+
+
+class Widgets(object):
+    # Episode widgets for a video node tag. The episode ids are selected with one query
+    # against MyVideos, the details are then fetched in a single batched JSON-RPC call.
+    # Results are cached in window properties, the service refreshes every widget
+    # requested so far (emby_widgets.json) after each incremental sync.
+
+    cache_max_age = 15 * 60
+
+    properties = [
+        "title", "playcount", "season", "episode", "showtitle", "plot",
+        "file", "rating", "resume", "tvshowid", "art", "cast",
+        "streamdetails", "firstaired", "runtime", "writer",
+        "dateadded", "lastplayed"
+    ]
+    episode_view = "episode_view"
+    tag_shows = ' '.join((
+
+        "SELECT tag_link.media_id",
+        "FROM tag_link",
+        "JOIN tag ON tag.tag_id = tag_link.tag_id",
+        "WHERE tag.name = ?",
+        "AND tag_link.media_type = 'tvshow'"
+    ))
+    # TODO: Remove Helix code when Krypton is RC
+    tag_shows_old = ' '.join((
+
+        "SELECT taglinks.idMedia",
+        "FROM taglinks",
+        "JOIN tag ON tag.idTag = taglinks.idTag",
+        "WHERE tag.strTag = ?",
+        "AND taglinks.media_type = 'tvshow'"
+    ))
+
+
+    def __init__(self):
+
+        self.kodi_version = int(xbmc.getInfoLabel('System.BuildVersion')[:2])
+        if self.kodi_version <= 14:
+            self.episode_view = "episodeview"
+            self.tag_shows = self.tag_shows_old
+
+    def get(self, widget, tagname, limit):
+        # Served from the cache, computed live if it is missing or stale
+        key = self._cache_key(widget, tagname, limit)
+        cached = window(key)
+        if cached and time.time() - cached['time'] < self.cache_max_age:
+            log.debug("Widget served from cache: %s", key)
+            return cached['episodes']
+
+        registered = window('emby_widgets.json') or []
+        if [widget, tagname, limit] not in registered:
+            registered.append([widget, tagname, limit])
+            window('emby_widgets.json', value=registered)
+
+        return self._update_cache(widget, tagname, limit)
+
+    def refresh_cache(self):
+        # Called by the service once the Kodi database was updated
+        for widget, tagname, limit in window('emby_widgets.json') or []:
+            try:
+                self._update_cache(widget, tagname, limit)
+            except Exception as error:
+                log.error("Failed to refresh widget %s %s: %s", widget, tagname, error)
+
+    @classmethod
+    def _cache_key(cls, widget, tagname, limit):
+        return "emby_widget.%s.%s.%s.json" % (widget, tagname, limit)
+
+    def _update_cache(self, widget, tagname, limit):
+
+        episodes = getattr(self, widget)(tagname, limit)
+        window(self._cache_key(widget, tagname, limit),
+               value={'time': time.time(), 'episodes': episodes})
+
+        return episodes
+
+    def next_up(self, tagname, limit):
+        # First unwatched episode of each in progress show, most recently played show first
+        ignore_specials = settings('ignoreSpecialsNextEpisodes') == "true"
+        query = ' '.join((
+
+            "SELECT e.idEpisode,",
+                "MIN(CAST(e.c12 AS INTEGER) * 100000 + CAST(e.c13 AS INTEGER))",
+            "FROM %s e" % self.episode_view,
+            "JOIN (",
+                "SELECT idShow, MAX(lastPlayed) AS showLastPlayed",
+                "FROM %s" % self.episode_view,
+                "WHERE idShow IN (%s)" % self.tag_shows,
+                "GROUP BY idShow",
+                "HAVING SUM(playCount > 0) > 0",
+            ") s ON s.idShow = e.idShow",
+            "WHERE IFNULL(e.playCount, 0) = 0",
+            "AND CAST(e.c12 AS INTEGER) > 0" if ignore_specials else "",
+            "GROUP BY e.idShow",
+            "ORDER BY s.showLastPlayed DESC",
+            "LIMIT ?"
+        ))
+        return self._get_episodes(query, (tagname, limit))
+
+    def in_progress(self, tagname, limit):
+        # Partially watched episodes, most recently played show first
+        query = ' '.join((
+
+            "SELECT e.idEpisode",
+            "FROM %s e" % self.episode_view,
+            "JOIN (",
+                "SELECT idShow, MAX(lastPlayed) AS showLastPlayed",
+                "FROM %s" % self.episode_view,
+                "WHERE idShow IN (%s)" % self.tag_shows,
+                "GROUP BY idShow",
+            ") s ON s.idShow = e.idShow",
+            "WHERE e.resumeTimeInSeconds > 0",
+            "ORDER BY s.showLastPlayed DESC,",
+                "CAST(e.c12 AS INTEGER), CAST(e.c13 AS INTEGER)",
+            "LIMIT ?"
+        ))
+        return self._get_episodes(query, (tagname, limit))
+
+    def recent(self, tagname, limit):
+        # Unwatched episodes, most recently added first
+        query = ' '.join((
+
+            "SELECT idEpisode",
+            "FROM %s" % self.episode_view,
+            "WHERE idShow IN (%s)" % self.tag_shows,
+            "AND IFNULL(playCount, 0) = 0",
+            "ORDER BY dateAdded DESC",
+            "LIMIT ?"
+        ))
+        return self._get_episodes(query, (tagname, limit))
+
+    def _get_episodes(self, query, args):
+
+        with DatabaseConn('video', commit_on_close=False) as cursor:
+            cursor.execute(query, args)
+            episode_ids = [row[0] for row in cursor.fetchall()]
+
+        return self.get_episode_details(episode_ids)
+
+    def get_episode_details(self, episode_ids):
+        # One JSON-RPC batch, results are matched back by id to keep the order
+        if not episode_ids:
+            return []
+
+        results = JSONRPC.execute_batch([("VideoLibrary.GetEpisodeDetails", {
+
+            'episodeid': episode_id,
+            'properties': self.properties
+
+        }) for episode_id in episode_ids])
+
+        episodes = []
+        for result in results:
+            try:
+                episodes.append(result['result']['episodedetails'])
+            except (KeyError, TypeError):
+                log.debug("Episode details missing: %s", result)
+
+        return episodes
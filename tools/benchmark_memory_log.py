@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+# Per call cost of a disabled debug log call: level gated logger, the same with the memory log
+# (EmbyLogger) and a logger kept at DEBUG that stores every LogRecord.
+# Run from Kodi: RunScript(special://home/addons/plugin.video.emby/tools/benchmark_memory_log.py[,calls])
+# The report goes to the log.
+
+import collections
+import logging
+import os
+import sys
+import time
+
+import xbmc
+import xbmcaddon
+
+#################################################################################################
+
+_ADDON = xbmcaddon.Addon(id='plugin.video.emby')
+_CWD = _ADDON.getAddonInfo('path').decode('utf-8')
+_BASE_LIB = xbmc.translatePath(os.path.join(_CWD, 'resources', 'lib')).decode('utf-8')
+sys.path.append(_BASE_LIB)
+
+#################################################################################################
+
+import loghandler
+from loghandler import Payload
+
+#################################################################################################
+
+loghandler.config()
+log = logging.getLogger("EMBY.benchmark_memory_log")
+
+
+class RecordBuffer(logging.Handler):
+    # Stores the records, like a memory log attached as a handler
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = collections.deque(maxlen=loghandler.MemoryLog.capacity)
+
+    def handle(self, record):
+        self.records.append(record)
+
+
+def get_logger(logger_class, level, handler=None):
+    # Outside of the EMBY hierarchy, the kodi.log handler is not involved
+    logger = logger_class("benchmark.%s" % logger_class.__name__)
+    logger.memory = True
+    logger.setLevel(level)
+    if handler is not None:
+        logger.addHandler(handler)
+    return logger
+
+def measure(logger, calls):
+
+    items = [{'Id': str(i)} for i in range(100)]
+    start = time.time()
+    for i in xrange(calls):
+        logger.debug("Processing %s: %s", "added", Payload(items))
+        logger.debug("Item %s of %s", i, calls)
+
+    return (time.time() - start) / (calls * 2)
+
+
+if __name__ == "__main__":
+
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    gated = measure(get_logger(logging.Logger, logging.WARNING), calls)
+    memory = measure(get_logger(loghandler.EmbyLogger, logging.WARNING), calls)
+    records = measure(get_logger(logging.Logger, logging.DEBUG, RecordBuffer()), calls)
+    log.info("Disabled debug call over %s calls: gated %.2f us, memory log %.2f us, "
+             "records kept %.2f us", calls * 2, gated * 1000000, memory * 1000000, records * 1000000)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+# Per item cost of the settings and window property reads done by the sync, the download
+# helpers and the log handler, with and without the utils.Snapshot cache.
+# Run from Kodi: RunScript(special://home/addons/plugin.video.emby/tools/benchmark_settings_cache.py[,items])
+# The report goes to the log.
+
+import json
+import logging
+import os
+import sys
+import time
+
+import xbmc
+import xbmcaddon
+import xbmcgui
+
+#################################################################################################
+
+_ADDON = xbmcaddon.Addon(id='plugin.video.emby')
+_CWD = _ADDON.getAddonInfo('path').decode('utf-8')
+_BASE_LIB = xbmc.translatePath(os.path.join(_CWD, 'resources', 'lib')).decode('utf-8')
+sys.path.append(_BASE_LIB)
+
+#################################################################################################
+
+import loghandler
+from utils import window, settings
+
+#################################################################################################
+
+loghandler.config()
+log = logging.getLogger("EMBY.benchmark_settings_cache")
+
+# Reads done for every item: Items.__init__, Read_EmbyServer, DownloadUtils, LogHandler
+SETTINGS = ["enableMusic", "limitIndex", "downloadThreads"]
+PROPERTIES = ["emby_currUser", "emby_server.json", "emby_logLevel"]
+
+
+def uncached_window(property_):
+
+    result = xbmcgui.Window(10000).getProperty(property_)
+    if result and ".json" in property_:
+        result = json.loads(result)
+    return result
+
+def uncached_settings(setting):
+    return xbmcaddon.Addon(id='plugin.video.emby').getSetting(setting)
+
+def measure(get_setting, get_property, items):
+
+    start = time.time()
+    for i in xrange(items):
+        for setting in SETTINGS:
+            get_setting(setting)
+        for property_ in PROPERTIES:
+            get_property(property_)
+
+    return (time.time() - start) / items
+
+
+if __name__ == "__main__":
+
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    uncached = measure(uncached_settings, uncached_window, items)
+    cached = measure(settings, window, items)
+    log.info("Settings and properties per item over %s items: uncached %.1f us, cached %.1f us",
+             items, uncached * 1000000, cached * 1000000)
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+# Microbenchmark of the websocket payload masking, every frame sent to the server is masked.
+# Run with python 2 from the addon folder: python tools/benchmark_websocket_mask.py
+# Compares ABNF.mask with the byte by byte reference for payloads from 64 bytes to 1MB.
+
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources", "lib"))
+
+import websocket
+
+#################################################################################################
+
+SIZES = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576]
+# Total bytes masked per measurement, small payloads are repeated more often
+VOLUME = 4 * 1048576
+
+
+def measure(function, mask_key, data):
+
+    number = max(1, VOLUME // len(data))
+    timer = timeit.Timer(lambda: function(mask_key, data))
+    best = min(timer.repeat(repeat=3, number=number))
+    return best / number
+
+
+def main():
+
+    mask_key = os.urandom(4)
+    implementation = "wsaccel" if websocket.XorMaskerSimple is not None else "translate"
+    print("ABNF.mask implementation: %s" % implementation)
+    print("%10s %14s %14s %10s" % ("size", "mask (us)", "simple (us)", "speedup"))
+
+    for size in SIZES:
+        data = os.urandom(size)
+        if websocket.ABNF.mask(mask_key, data) != websocket.ABNF.mask_simple(mask_key, data):
+            raise AssertionError("Masking mismatch for %s bytes" % size)
+
+        fast = measure(websocket.ABNF.mask, mask_key, data)
+        simple = measure(websocket.ABNF.mask_simple, mask_key, data)
+        print("%10s %14.1f %14.1f %9.1fx" % (size, fast * 1000000, simple * 1000000, simple / fast))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+# In-memory stand-ins for the Kodi python modules, so the tests next to this file can import
+# resources/lib with a plain python 2 interpreter. Window properties and settings are dicts,
+# special:// paths are mapped to a temporary folder.
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+#################################################################################################
+
+LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources", "lib")
+
+properties = {}
+settings = {}
+info_labels = {'System.BuildVersion': "17.6 Git:20171114-a9a7a20"}
+# Answers of executeJSONRPC by method, a callable receiving the params
+jsonrpc = {}
+root = None
+
+
+def _module(name, **attributes):
+
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def _translate_path(path):
+
+    if "://" in path:
+        path = os.path.join(root, path.split("://", 1)[1])
+    return path
+
+
+def _execute_jsonrpc(query):
+
+    def answer(request):
+        result = jsonrpc.get(request['method'], lambda params: {})(request.get('params', {}))
+        return {'id': request.get('id'), 'jsonrpc': "2.0", 'result': result}
+
+    request = json.loads(query)
+    if isinstance(request, list):
+        return json.dumps([answer(entry) for entry in request])
+    return json.dumps(answer(request))
+
+
+class Monitor(object):
+
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        return False
+
+
+class Window(object):
+
+    def __init__(self, window_id=None):
+        pass
+
+    def getProperty(self, key):
+        return properties.get(key, "")
+
+    def setProperty(self, key, value):
+        properties[key] = value
+
+    def clearProperty(self, key):
+        properties.pop(key, None)
+
+
+class Addon(object):
+
+    def __init__(self, id=None):
+        pass
+
+    def getSetting(self, key):
+        return settings.get(key, "")
+
+    def setSetting(self, key, value):
+        settings[key] = value
+
+    def getLocalizedString(self, string_id):
+        return u"%s" % string_id
+
+    def getAddonInfo(self, key):
+        return os.path.join(LIB, "..", "..") if key == 'path' else ""
+
+
+class Dialog(object):
+
+    def ok(self, *args, **kwargs):
+        return True
+
+    def notification(self, *args, **kwargs):
+        pass
+
+
+def _mkdirs(path):
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return True
+
+
+def install():
+    # Registers the modules and returns the temporary folder behind special://
+    global root
+
+    root = tempfile.mkdtemp(prefix="emby_test_")
+    _module('xbmc', LOGNOTICE=2, LOGDEBUG=0, log=lambda msg, level=0: None,
+            translatePath=_translate_path, getInfoLabel=lambda label: info_labels.get(label, ""),
+            getCondVisibility=lambda condition: False, executeJSONRPC=_execute_jsonrpc,
+            executebuiltin=lambda function: None, sleep=lambda time: None,
+            Monitor=Monitor, Player=object, PlayList=object, PLAYLIST_VIDEO=1)
+    _module('xbmcgui', Window=Window, Dialog=Dialog, ListItem=object, DialogProgressBG=object)
+    _module('xbmcaddon', Addon=Addon)
+    _module('xbmcplugin', endOfDirectory=lambda *args, **kwargs: None)
+    _module('xbmcvfs', exists=os.path.exists, mkdirs=_mkdirs, mkdir=_mkdirs,
+            delete=lambda path: os.remove(path) or True,
+            copy=lambda source, target: shutil.copy(source, target) or True)
+
+    if LIB not in sys.path:
+        sys.path.append(LIB)
+    return root
+
+
+def uninstall():
+
+    if root is not None:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+# Import time report for the plugin entry points.
+# Run from Kodi: RunScript(special://home/addons/plugin.video.emby/tools/profile_imports.py[,mode])
+# where mode is one of the default.py modes or "contextmenu". Without a mode every entry point
+# is profiled. Each one is measured in a clean interpreter state, the report goes to the log.
+
+import __builtin__
+import logging
+import os
+import sys
+import time
+
+import xbmc
+import xbmcaddon
+
+#################################################################################################
+
+_ADDON = xbmcaddon.Addon(id='plugin.video.emby')
+_CWD = _ADDON.getAddonInfo('path').decode('utf-8')
+_BASE_LIB = xbmc.translatePath(os.path.join(_CWD, 'resources', 'lib')).decode('utf-8')
+sys.path.append(_BASE_LIB)
+sys.path.append(_CWD)
+
+#################################################################################################
+
+import loghandler
+
+#################################################################################################
+
+loghandler.config()
+log = logging.getLogger("EMBY.profile_imports")
+
+# Modules imported to reach each entry point
+ENTRY_POINTS = {
+
+    'listing': ["default"],
+    'play': ["default", "entrypoint", "playbackutils"],
+    'browsecontent': ["default", "entrypoint", "read_embyserver", "api", "artwork"],
+    'nextup': ["default", "entrypoint", "widgets"],
+    'extrafanart': ["default", "entrypoint", "image_cache"],
+    'reset': ["default", "database"],
+    'contextmenu': ["contextmenu", "context_entry"]
+}
+_PURGED = []
+
+#################################################################################################
+
+
+class ImportTimer(object):
+    # __import__ hook, cumulative and self time per module
+
+    def __init__(self):
+
+        self.times = {}
+        self.stack = []
+        self._import = __builtin__.__import__
+
+    def __enter__(self):
+        __builtin__.__import__ = self._timed_import
+        return self
+
+    def __exit__(self, *args):
+        __builtin__.__import__ = self._import
+
+    def _timed_import(self, name, *args, **kwargs):
+
+        if name in sys.modules:
+            return self._import(name, *args, **kwargs)
+
+        self.stack.append(0)
+        start = time.time()
+        try:
+            return self._import(name, *args, **kwargs)
+        finally:
+            total = time.time() - start
+            children = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += total
+            if name in sys.modules:
+                self.times[name] = (total, total - children)
+
+    def report(self, title, elapsed, limit=20):
+
+        lines = ["%s: %.1f ms" % (title, elapsed * 1000),
+                 "%10s %10s  %s" % ("total ms", "self ms", "module")]
+        for name, (total, self_) in sorted(self.times.items(),
+                                           key=lambda item: item[1][1], reverse=True)[:limit]:
+            lines.append("%10.1f %10.1f  %s" % (total * 1000, self_ * 1000, name))
+
+        return "\n".join(lines)
+
+
+def profile(mode):
+
+    # Forget the addon modules so every entry point pays its own cost. References are kept,
+    # python 2 clears the globals of collected modules and the log handler still uses them.
+    for name in sys.modules.keys():
+        module = sys.modules[name]
+        if (name != "__main__" and getattr(module, '__file__', None) and
+                module.__file__.startswith(_CWD)):
+            _PURGED.append(sys.modules.pop(name))
+
+    start = time.time()
+    with ImportTimer() as timer:
+        for name in ENTRY_POINTS[mode]:
+            __import__(name)
+
+    return timer.report(mode, time.time() - start)
+
+
+if __name__ == "__main__":
+
+    modes = sys.argv[1:] or sorted(ENTRY_POINTS)
+    for mode in modes:
+        try:
+            log.info("Import profile\n%s", profile(mode))
+        except Exception as error:
+            log.exception(error)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+# Tests of the plugin to service calls over the loopback IPC server: the plugin side helpers
+# reach the service methods, and fall back to doing the work themselves without the service.
+# Run with python 2 from the addon folder: python tools/test_ipc.py
+
+import os
+import sys
+import threading
+import types
+import unittest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import fake_kodi
+
+#################################################################################################
+
+
+class Read_EmbyServer(object):
+    # Stand-in for read_embyserver, records the calls and the thread they ran in
+    calls = []
+
+    def getItem(self, item_id):
+
+        self.calls.append(('getItem', item_id, threading.current_thread().name))
+        return {'Id': item_id, 'Name': u"Caf\xe9"}
+
+    def getViews(self, media_type="", root=False, sortedlist=False):
+
+        self.calls.append(('getViews', (media_type, root, sortedlist),
+                           threading.current_thread().name))
+        return [{'id': "1", 'type': media_type}]
+
+
+class IPCTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        fake_kodi.install()
+        module = types.ModuleType('read_embyserver')
+        module.Read_EmbyServer = Read_EmbyServer
+        sys.modules['read_embyserver'] = module
+
+        import entrypoint
+        import ipc
+        cls.entrypoint = entrypoint
+        cls.ipc = ipc
+
+    @classmethod
+    def tearDownClass(cls):
+        fake_kodi.uninstall()
+
+    def setUp(self):
+
+        del Read_EmbyServer.calls[:]
+        self.server = self.ipc.IPCServer()
+        self.server.name = "ipc"
+        self.server.start()
+        # Published by the server thread
+        for i in range(100):
+            if fake_kodi.properties.get('emby_ipc.port'):
+                break
+            threading.Event().wait(0.01)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_emby_server(self):
+
+        item = self.entrypoint._embyServer('getItem', "abc")
+        self.assertEqual(item, {'Id': "abc", 'Name': u"Caf\xe9"})
+        # Answered by the service, in a request thread of the server
+        name, args, thread = Read_EmbyServer.calls[0]
+        self.assertEqual((name, args), ('getItem', "abc"))
+        self.assertNotEqual(thread, threading.current_thread().name)
+
+    def test_emby_server_kwargs(self):
+
+        views = self.entrypoint._embyServer('getViews', "movies", sortedlist=True)
+        self.assertEqual(views, [{'id': "1", 'type': "movies"}])
+        self.assertEqual(Read_EmbyServer.calls[0][1], ("movies", False, True))
+
+    def test_method_not_allowed(self):
+        self.assertRaises(self.ipc.IPCError, self.ipc.call, 'emby', method="deleteItem")
+
+    def test_wrong_token(self):
+
+        fake_kodi.properties['emby_ipc.token'] = "wrong"
+        self.assertRaises(self.ipc.IPCError, self.ipc.call, 'emby', method="getItem",
+                          args=["abc"])
+        self.assertEqual(Read_EmbyServer.calls, [])
+
+    def test_fallback(self):
+        # Service not running, the plugin reads the server itself
+        self.server.stop()
+        item = self.entrypoint._embyServer('getItem', "abc")
+        self.assertEqual(item['Id'], "abc")
+        self.assertEqual(Read_EmbyServer.calls[0][2], threading.current_thread().name)
+
+
+if __name__ == "__main__":
+    unittest.main()
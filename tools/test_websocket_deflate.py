@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+# Tests of the websocket client against a local stand-in server, in particular the
+# permessage-deflate extension: plain frames, negotiated compression with and without context
+# takeover, fragmented compressed messages, messages larger than the receive buffer and
+# compressed messages sent by the client.
+# Run with python 2 from the addon folder: python tools/test_websocket_deflate.py
+
+import base64
+import hashlib
+import os
+import socket
+import struct
+import sys
+import threading
+import unittest
+import zlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources", "lib"))
+
+import websocket
+
+#################################################################################################
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+TAIL = "\x00\x00\xff\xff"
+
+
+def sample(size, seed=0):
+    # Compressible, but not trivially
+    words = ["emby", "kodi", "library", "userdata", "playstate", "%08d" % seed]
+    text = []
+    length = 0
+    i = seed
+    while length < size:
+        word = words[i % len(words)] + str(i % 97)
+        text.append(word)
+        length += len(word) + 1
+        i = i * 7 + 3
+    return " ".join(text)[:size]
+
+
+class StandInServer(threading.Thread):
+    # Accepts one client, answers the handshake with the given extensions header and
+    # runs script(server) in its own thread.
+
+    def __init__(self, extensions=None, script=None):
+
+        self.extensions = extensions
+        self.script = script
+        self.request_headers = {}
+        self.error = None
+        self.listener = socket.socket()
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.url = "ws://127.0.0.1:%s/" % self.listener.getsockname()[1]
+
+        self.server_no_context_takeover = "server_no_context_takeover" in (extensions or "")
+        self.client_no_context_takeover = "client_no_context_takeover" in (extensions or "")
+        self.compressor = None
+        self.decompressor = None
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.start()
+
+    def run(self):
+
+        try:
+            self.conn, _ = self.listener.accept()
+            self.conn.settimeout(10)
+            self._handshake()
+            if self.script:
+                self.script(self)
+        except Exception as error:
+            self.error = error
+        finally:
+            self.listener.close()
+
+    def _recv_exact(self, length):
+
+        data = []
+        while length:
+            chunk = self.conn.recv(min(length, 65536))
+            if not chunk:
+                raise IOError("connection closed")
+            data.append(chunk)
+            length -= len(chunk)
+        return "".join(data)
+
+    def _handshake(self):
+
+        request = ""
+        while "\r\n\r\n" not in request:
+            request += self.conn.recv(4096)
+
+        for line in request.split("\r\n")[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                self.request_headers[key.strip().lower()] = value.strip()
+
+        accept = base64.b64encode(hashlib.sha1(self.request_headers['sec-websocket-key'] + GUID).digest())
+        response = ["HTTP/1.1 101 Switching Protocols",
+                    "Upgrade: websocket",
+                    "Connection: Upgrade",
+                    "Sec-WebSocket-Accept: %s" % accept]
+        if self.extensions:
+            response.append("Sec-WebSocket-Extensions: %s" % self.extensions)
+        self.conn.sendall("\r\n".join(response) + "\r\n\r\n")
+
+    def send_frame(self, payload, opcode=websocket.ABNF.OPCODE_TEXT, fin=1, rsv1=0):
+
+        header = chr(fin << 7 | rsv1 << 6 | opcode)
+        length = len(payload)
+        if length < 126:
+            header += chr(length)
+        elif length < 1 << 16:
+            header += chr(126) + struct.pack("!H", length)
+        else:
+            header += chr(127) + struct.pack("!Q", length)
+        self.conn.sendall(header + payload)
+
+    def compress(self, data):
+
+        if self.compressor is None or self.server_no_context_takeover:
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        data = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        assert data.endswith(TAIL)
+        return data[:-4]
+
+    def send_message(self, data, compressed=False, fragments=1):
+
+        if compressed:
+            data = self.compress(data)
+        size = max(1, -(-len(data) // fragments))
+        parts = [data[i:i + size] for i in range(0, len(data), size)] or [""]
+        for i, part in enumerate(parts):
+            self.send_frame(part,
+                            opcode=websocket.ABNF.OPCODE_TEXT if i == 0 else websocket.ABNF.OPCODE_CONT,
+                            fin=int(i == len(parts) - 1),
+                            rsv1=int(compressed and i == 0))
+
+    def recv_message(self):
+        # Returns (rsv1, payload) of a client frame, decompressed
+        b1, b2 = [ord(char) for char in self._recv_exact(2)]
+        assert b1 & 0x80, "client fragments are not expected"
+        assert b2 & 0x80, "client frames must be masked"
+        rsv1 = b1 >> 6 & 1
+        length = b2 & 0x7f
+        if length == 126:
+            length = struct.unpack("!H", self._recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._recv_exact(8))[0]
+        mask = self._recv_exact(4)
+        payload = websocket.ABNF.mask_simple(mask, self._recv_exact(length))
+
+        if rsv1:
+            if self.decompressor is None or self.client_no_context_takeover:
+                # A client keeping its context would fail to decode with a fresh one
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            payload = self.decompressor.decompress(payload + TAIL)
+
+        return rsv1, payload
+
+
+class DeflateTest(unittest.TestCase):
+
+    def connect(self, server, enable_compression=True):
+
+        ws = websocket.WebSocket(enable_compression=enable_compression)
+        ws.settimeout(10)
+        ws.connect(server.url)
+        self.addCleanup(ws.sock.close)
+        return ws
+
+    def finish(self, server):
+
+        server.join(10)
+        self.assertFalse(server.is_alive(), "stand-in server did not finish")
+        if server.error is not None:
+            raise server.error
+
+    def test_plain(self):
+
+        messages = ["hello", sample(1000), sample(70000)]
+        received = []
+
+        def script(server):
+            for message in messages:
+                server.send_message(message)
+            for i in range(len(messages)):
+                received.append(server.recv_message())
+
+        server = StandInServer(script=script)
+        ws = self.connect(server, enable_compression=False)
+        self.assertIsNone(ws.compression)
+        for message in messages:
+            self.assertEqual(ws.recv(), message)
+            ws.send(message)
+
+        self.finish(server)
+        self.assertNotIn('sec-websocket-extensions', server.request_headers)
+        self.assertEqual(received, [(0, message) for message in messages])
+
+    def test_declined(self):
+        # Offered, the server answers without the extension
+        server = StandInServer(script=lambda server: server.send_message("plain"))
+        ws = self.connect(server)
+        self.assertIn("permessage-deflate", server.request_headers['sec-websocket-extensions'])
+        self.assertIsNone(ws.compression)
+        self.assertEqual(ws.recv(), "plain")
+        self.finish(server)
+
+    def _deflate(self, extensions):
+
+        messages = [sample(2000, seed) for seed in (1, 1, 2)] + ["short"]
+        received = []
+
+        def script(server):
+            for message in messages:
+                server.send_message(message, compressed=True)
+            for i in range(len(messages)):
+                received.append(server.recv_message())
+
+        server = StandInServer(extensions=extensions, script=script)
+        ws = self.connect(server)
+        self.assertIsNotNone(ws.compression)
+        for message in messages:
+            self.assertEqual(ws.recv(), message)
+            ws.send(message)
+
+        self.finish(server)
+        # Below min_length the client sends the message as is
+        self.assertEqual(received, [(int(len(message) >= ws.compression.min_length), message)
+                                    for message in messages])
+
+    def test_deflate(self):
+        self._deflate("permessage-deflate")
+
+    def test_deflate_client_max_window_bits(self):
+        self._deflate("permessage-deflate; client_max_window_bits=10")
+
+    def test_deflate_no_context_takeover(self):
+        self._deflate("permessage-deflate; server_no_context_takeover; client_no_context_takeover")
+
+    def test_fragmented(self):
+
+        messages = [sample(5000, 3), sample(5000, 4)]
+
+        def script(server):
+            for message in messages:
+                server.send_message(message, compressed=True, fragments=3)
+
+        server = StandInServer(extensions="permessage-deflate", script=script)
+        ws = self.connect(server)
+        for message in messages:
+            self.assertEqual(ws.recv(), message)
+        self.finish(server)
+
+    def test_large(self):
+        # Larger than the receive buffer, compressed or not and both ways
+        messages = [sample(300000, 5), os.urandom(150000).encode('hex')]
+        received = []
+
+        def script(server):
+            for message in messages:
+                server.send_message(message, compressed=True)
+                server.send_message(message, fragments=4)
+            for message in messages:
+                received.append(server.recv_message())
+
+        server = StandInServer(extensions="permessage-deflate", script=script)
+        ws = self.connect(server)
+        for message in messages:
+            self.assertEqual(ws.recv(), message)
+            self.assertEqual(ws.recv(), message)
+        for message in messages:
+            ws.send(message)
+
+        self.finish(server)
+        self.assertEqual(received, [(1, message) for message in messages])
+
+    def test_compressed_without_extension(self):
+
+        server = StandInServer(script=lambda server: server.send_frame("x", rsv1=1))
+        ws = self.connect(server, enable_compression=False)
+        self.assertRaises(websocket.WebSocketException, ws.recv)
+        self.finish(server)
+
+
+if __name__ == "__main__":
+    unittest.main()
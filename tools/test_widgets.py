@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+#################################################################################################
+# Tests of the episode widget queries against the video database schemas of Kodi 17 and of
+# Helix (Kodi 14: taglinks, tag.strTag and episodeview).
+# Run with python 2 from the addon folder: python tools/test_widgets.py
+
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import fake_kodi
+
+#################################################################################################
+
+EPISODES = [
+    # idEpisode, idShow, season, episode, playCount, lastPlayed, dateAdded, resume
+    (1, 1, "1", "1", 1, "2020-01-02", "2020-01-01", 0),
+    (2, 1, "1", "2", None, None, "2020-01-03", 120),
+    (3, 1, "1", "3", None, None, "2020-01-04", 0),
+    (4, 2, "1", "1", 1, "2020-01-06", "2020-01-01", 0),
+    (5, 2, "1", "2", None, None, "2020-01-05", 60)
+]
+
+SCHEMAS = {
+
+    'krypton': """
+        CREATE TABLE tag (tag_id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE tag_link (tag_id INTEGER, media_id INTEGER, media_type TEXT);
+        INSERT INTO tag VALUES (1, 'Shows');
+        INSERT INTO tag_link VALUES (1, 1, 'tvshow');
+        CREATE VIEW episode_view AS SELECT * FROM episode;
+    """,
+    'helix': """
+        CREATE TABLE tag (idTag INTEGER PRIMARY KEY, strTag TEXT);
+        CREATE TABLE taglinks (idTag INTEGER, idMedia INTEGER, media_type TEXT);
+        INSERT INTO tag VALUES (1, 'Shows');
+        INSERT INTO taglinks VALUES (1, 1, 'tvshow');
+        CREATE VIEW episodeview AS SELECT * FROM episode;
+    """
+}
+
+
+class WidgetsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        root = fake_kodi.install()
+        fake_kodi.jsonrpc['VideoLibrary.GetEpisodeDetails'] = \
+            lambda params: {'episodedetails': {'episodeid': params['episodeid']}}
+
+        import database
+        import widgets
+        cls.widgets = widgets
+
+        cls.databases = {}
+        for version, schema in SCHEMAS.items():
+            path = os.path.join(root, "%s.db" % version)
+            conn = sqlite3.connect(path)
+            conn.execute(" ".join((
+                "CREATE TABLE episode (idEpisode INTEGER, idShow INTEGER, c12 TEXT, c13 TEXT,",
+                "playCount INTEGER, lastPlayed TEXT, dateAdded TEXT, resumeTimeInSeconds INTEGER)")))
+            conn.executemany("INSERT INTO episode VALUES (?, ?, ?, ?, ?, ?, ?, ?)", EPISODES)
+            conn.executescript(schema)
+            conn.commit()
+            conn.close()
+            cls.databases[version] = path
+
+        cls.connection = database.DatabaseConn
+
+    @classmethod
+    def tearDownClass(cls):
+        fake_kodi.uninstall()
+
+    def get_widgets(self, version, build):
+
+        fake_kodi.info_labels['System.BuildVersion'] = build
+        path = self.databases[version]
+        self.widgets.DatabaseConn = lambda database_file, commit_on_close=True: \
+            self.connection(path, commit_on_close)
+        return self.widgets.Widgets()
+
+    def check(self, widgets):
+
+        episode_ids = lambda episodes: [episode['episodeid'] for episode in episodes]
+        self.assertEqual(episode_ids(widgets.next_up("Shows", 10)), [2])
+        self.assertEqual(episode_ids(widgets.in_progress("Shows", 10)), [2])
+        self.assertEqual(episode_ids(widgets.recent("Shows", 10)), [3, 2])
+        self.assertEqual(episode_ids(widgets.recent("Shows", 1)), [3])
+
+    def test_krypton(self):
+        self.check(self.get_widgets('krypton', "17.6 Git:20171114-a9a7a20"))
+
+    def test_helix(self):
+
+        widgets = self.get_widgets('helix', "14.2 Git:20150326-7cc53a9")
+        self.assertEqual(widgets.episode_view, "episodeview")
+        self.check(widgets)
+
+
+if __name__ == "__main__":
+    unittest.main()